@@ -0,0 +1,128 @@
+"""
+Single-pass AST feature extraction versus the previous implementation.
+
+Run from the ML directory:
+    python -m benchmarks.ast_features_bench --chars 5000 20000 50000
+
+The previous implementation (recursive depth pass + five ast.walk passes)
+is kept here as a reference; the benchmark checks both produce identical
+features before timing them.
+"""
+from __future__ import annotations
+import argparse
+import ast
+import random
+import time
+from typing import Dict, Any
+
+import numpy as np
+
+from src.components.analysis_context import collect_ast_stats
+
+
+def legacy_ast_features(code: str) -> Dict[str, Any]:
+    """Feature dict as computed before the single-pass extractor."""
+    tree = ast.parse(code)
+    depths = []
+
+    def get_depth(node, depth=0):
+        depths.append(depth)
+        for child in ast.iter_child_nodes(node):
+            get_depth(child, depth + 1)
+
+    get_depth(tree)
+
+    return {
+        "max_depth": max(depths) if depths else 0,
+        "avg_depth": round(float(np.mean(depths)) if depths else 0.0, 2),
+        "depth_variance": round(float(np.var(depths)) if len(depths) > 1 else 0.0, 2),
+        "complexity": sum(
+            1 for node in ast.walk(tree)
+            if isinstance(node, (ast.If, ast.While, ast.For, ast.ExceptHandler))
+        ),
+        "node_diversity": len(set(type(node).__name__ for node in ast.walk(tree))),
+        "has_error_handling": any(isinstance(node, (ast.Try, ast.ExceptHandler)) for node in ast.walk(tree)),
+        "num_functions": sum(1 for node in ast.walk(tree) if isinstance(node, ast.FunctionDef)),
+        "num_classes": sum(1 for node in ast.walk(tree) if isinstance(node, ast.ClassDef)),
+    }
+
+
+def single_pass_ast_features(code: str) -> Dict[str, Any]:
+    """Same feature dict via collect_ast_stats (as AICodeDetector computes it)."""
+    stats = collect_ast_stats(ast.parse(code))
+    depths = stats.depths
+    return {
+        "max_depth": int(depths.max()) if depths.size else 0,
+        "avg_depth": round(float(depths.mean()) if depths.size else 0.0, 2),
+        "depth_variance": round(float(depths.var()) if depths.size > 1 else 0.0, 2),
+        "complexity": stats.decision_nodes,
+        "node_diversity": len(stats.node_types),
+        "has_error_handling": stats.has_error_handling,
+        "num_functions": stats.num_functions,
+        "num_classes": stats.num_classes,
+    }
+
+
+def synthetic_module(target_chars: int, seed: int = 0) -> str:
+    """Mix of classes, functions, loops and try blocks of roughly target_chars."""
+    rng = random.Random(seed)
+    parts = []
+    size = 0
+    i = 0
+    while size < target_chars:
+        body = [
+            f"class Worker{i}:",
+            f"    def run_{i}(self, items, limit={rng.randint(1, 50)}):",
+            "        total = 0",
+            "        for idx, item in enumerate(items):",
+            "            if item > limit and idx % 2 == 0:",
+            "                total += item * idx",
+            "            elif item < 0:",
+            "                try:",
+            "                    total -= abs(item) // (idx + 1)",
+            "                except ZeroDivisionError:",
+            "                    continue",
+            "        while total > limit:",
+            "            total //= 2",
+            "        return [x for x in range(total) if x % 3 == 0]",
+            "",
+            f"def helper_{i}(a, b):",
+            "    return {k: v for k, v in zip(a, b) if v is not None}",
+            "",
+        ]
+        chunk = "\n".join(body)
+        parts.append(chunk)
+        size += len(chunk) + 1
+        i += 1
+    return "\n".join(parts)
+
+
+def timed(fn, code: str, repeats: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn(code)
+    return (time.perf_counter() - start) * 1000 / repeats
+
+
+def run(sizes, repeats: int):
+    print(f"{'chars':>7} {'nodes':>7} {'legacy_ms':>10} {'single_ms':>10} {'speedup':>8}")
+    for chars in sizes:
+        code = synthetic_module(chars)
+        legacy = legacy_ast_features(code)
+        single = single_pass_ast_features(code)
+        if legacy != single:
+            raise AssertionError(f"Feature mismatch at {chars} chars: {legacy} != {single}")
+
+        nodes = len(collect_ast_stats(ast.parse(code)).depths)
+        legacy_ms = timed(legacy_ast_features, code, repeats)
+        single_ms = timed(single_pass_ast_features, code, repeats)
+        print(f"{len(code):>7} {nodes:>7} {legacy_ms:>10.2f} {single_ms:>10.2f} {legacy_ms / single_ms:>7.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chars", type=int, nargs="+", default=[5000, 20000, 50000])
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    run(args.chars, args.repeats)
@@ -0,0 +1,79 @@
+"""
+Vectorized batch style features versus the per-line implementation.
+
+Run from the ML directory:
+    python -m benchmarks.style_features_bench --batch-sizes 100 1000 5000
+
+The previous implementation (per-line Python loops and a regex scan per
+submission) is kept here as a reference; the benchmark checks both produce
+identical feature values before timing them.
+"""
+from __future__ import annotations
+import argparse
+import re
+import time
+from typing import Dict, Any, List
+
+import numpy as np
+
+from benchmarks.plagiarism_bench import synthetic_code
+from src.ml_core.style_features import style_feature_matrix
+
+
+def legacy_style_features(code: str) -> Dict[str, Any]:
+    """Unrounded feature values as computed before the batch engine."""
+    lines = code.split('\n')
+    non_empty_lines = [line for line in lines if line.strip()]
+
+    comment_lines = sum(1 for line in lines if line.strip().startswith('#'))
+    var_names = re.findall(r'\b[a-z_][a-z0-9_]*\b', code)
+    var_names = [v for v in var_names if not v.startswith('__') and v not in ['if', 'for', 'while', 'def', 'class', 'return', 'import']]
+    indents = [len(line) - len(line.lstrip()) for line in non_empty_lines if not line.strip().startswith('#')]
+    line_lengths = [len(line) for line in non_empty_lines]
+
+    return {
+        "comment_ratio": comment_lines / len(non_empty_lines),
+        "avg_var_length": float(np.mean([len(v) for v in var_names])) if var_names else 0.0,
+        "indent_variance": float(np.var(indents)) if len(indents) > 1 else 0.0,
+        "has_docstrings": '"""' in code or "'''" in code,
+        "avg_line_length": float(np.mean(line_lengths)),
+        "num_lines": len(non_empty_lines),
+        "line_length_std": float(np.std(line_lengths)),
+    }
+
+
+def check_equal(codes: List[str]):
+    matrix, _ = style_feature_matrix(codes)
+    for code, row in zip(codes, matrix):
+        legacy = list(legacy_style_features(code).values())
+        if not np.allclose(row, np.asarray(legacy, dtype=np.float64), rtol=0, atol=1e-9):
+            raise AssertionError(f"Feature mismatch: {legacy} != {row.tolist()}")
+
+
+def run(batch_sizes, repeats: int):
+    print(f"{'batch':>7} {'legacy_ms':>10} {'vector_ms':>10} {'speedup':>8}")
+    for batch_size in batch_sizes:
+        codes = [synthetic_code(seed) for seed in range(batch_size)]
+        check_equal(codes)
+
+        start = time.perf_counter()
+        for _ in range(repeats):
+            for code in codes:
+                legacy_style_features(code)
+        legacy_ms = (time.perf_counter() - start) * 1000 / repeats
+
+        start = time.perf_counter()
+        for _ in range(repeats):
+            style_feature_matrix(codes)
+        vector_ms = (time.perf_counter() - start) * 1000 / repeats
+
+        print(f"{batch_size:>7} {legacy_ms:>10.2f} {vector_ms:>10.2f} {legacy_ms / vector_ms:>7.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    run(args.batch_sizes, args.repeats)
@@ -0,0 +1,80 @@
+"""
+Batch tokenization and the token id cache versus per-string tokenization.
+
+Run from the ML directory:
+    python -m benchmarks.tokenization_bench --model-dir models/gpt2 --batch-sizes 32 256
+
+Times three ways of turning a batch of submissions into padded model
+inputs: one tokenizer call per string with immediate tensors (the previous
+path), one batched call plus pad_batch, and a repeat of the same batch
+served from TokenCache. All three must produce identical tensors.
+"""
+from __future__ import annotations
+import argparse
+import time
+from typing import List
+
+import torch
+
+from benchmarks.plagiarism_bench import synthetic_code
+from src.ml_core.model_loader import ModelLoaderConfig, _load_tokenizer
+from src.ml_core.perplexity_batcher import pad_batch
+from src.ml_core.result_cache import hash_text
+from src.ml_core.token_cache import TokenCache, encode_batch
+
+
+def legacy_inputs(tokenizer, codes: List[str], max_length: int) -> List[torch.Tensor]:
+    return [
+        tokenizer(code, return_tensors="pt", truncation=True, max_length=max_length, add_special_tokens=True)["input_ids"][0]
+        for code in codes
+    ]
+
+
+def run(model_dir: str, batch_sizes, repeats: int, max_length: int):
+    tokenizer = _load_tokenizer(model_dir)
+    pad_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else tokenizer.eos_token_id
+    device = torch.device("cpu")
+
+    print(f"{'batch':>7} {'legacy_ms':>10} {'batch_ms':>9} {'cached_ms':>10} {'speedup':>8}")
+    for batch_size in batch_sizes:
+        codes = [synthetic_code(seed) * 4 for seed in range(batch_size)]
+        hashes = [hash_text(code) for code in codes]
+
+        legacy = legacy_inputs(tokenizer, codes, max_length)
+        expected, _ = pad_batch([ids.tolist() for ids in legacy], pad_id, device)
+        batched, _ = pad_batch(encode_batch(tokenizer, codes, max_length), pad_id, device)
+        if not torch.equal(expected, batched):
+            raise AssertionError("Batched tokenization differs from per-string tokenization")
+
+        start = time.perf_counter()
+        for _ in range(repeats):
+            pad_batch([ids.tolist() for ids in legacy_inputs(tokenizer, codes, max_length)], pad_id, device)
+        legacy_ms = (time.perf_counter() - start) * 1000 / repeats
+
+        start = time.perf_counter()
+        for _ in range(repeats):
+            pad_batch(encode_batch(tokenizer, codes, max_length), pad_id, device)
+        batch_ms = (time.perf_counter() - start) * 1000 / repeats
+
+        cache = TokenCache(max_size=batch_size)
+        cache.encode(tokenizer, codes, hashes, max_length)
+        start = time.perf_counter()
+        for _ in range(repeats):
+            pad_batch(cache.encode(tokenizer, codes, hashes, max_length), pad_id, device)
+        cached_ms = (time.perf_counter() - start) * 1000 / repeats
+
+        print(
+            f"{batch_size:>7} {legacy_ms:>10.2f} {batch_ms:>9.2f} {cached_ms:>10.2f} "
+            f"{legacy_ms / cached_ms:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model-dir", default=ModelLoaderConfig.from_env().models_root)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[32, 256])
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--max-length", type=int, default=1024)
+    args = parser.parse_args()
+
+    run(args.model_dir, args.batch_sizes, args.repeats, args.max_length)
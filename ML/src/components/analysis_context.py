@@ -0,0 +1,120 @@
+import sys
+import ast
+import time
+from collections import Counter
+from dataclasses import dataclass, field, replace
+from typing import Optional, List
+
+import numpy as np
+
+from src.logger import logging
+from src.exception import CustomException
+from src.components.normalization import Normalizer, NormalizedForms
+
+
+# Decision nodes counted as (simplified) cyclomatic complexity
+DECISION_NODE_TYPES = ("If", "While", "For", "ExceptHandler")
+
+
+@dataclass
+class AstStats:
+    """Everything the AST features need, gathered in one traversal."""
+    depths: np.ndarray
+    node_types: Counter
+    decision_nodes: int
+    has_error_handling: bool
+    num_functions: int
+    num_classes: int
+
+
+def collect_ast_stats(tree: ast.AST) -> AstStats:
+    """
+    Single iterative pass over the tree.
+
+    Records the depth of every node (root = 0) and a node-type histogram;
+    decision-node, try/except and def/class counts are read off the
+    histogram. An explicit stack avoids the recursion limit on deeply
+    nested code.
+    """
+    depths: List[int] = []
+    node_types: Counter = Counter()
+
+    stack = [(tree, 0)]
+    while stack:
+        node, depth = stack.pop()
+        depths.append(depth)
+        node_types[type(node).__name__] += 1
+        for child in ast.iter_child_nodes(node):
+            stack.append((child, depth + 1))
+
+    return AstStats(
+        depths=np.asarray(depths, dtype=np.int32),
+        node_types=node_types,
+        decision_nodes=sum(node_types[name] for name in DECISION_NODE_TYPES),
+        has_error_handling=node_types["Try"] > 0 or node_types["ExceptHandler"] > 0,
+        num_functions=node_types["FunctionDef"],
+        num_classes=node_types["ClassDef"],
+    )
+
+
+@dataclass
+class AnalysisContext:
+    """
+    Per-submission artifacts shared by every detector.
+
+    Built once per request: the raw code is parsed a single time and one
+    traversal (collect_ast_stats) gathers the statistics that all
+    AST-derived features are computed from. `forms` holds the normalized
+    texts (the normalizer parses the light form separately, since comment
+    and docstring stripping changes the tree).
+    """
+    code: str
+    forms: NormalizedForms
+    tree: Optional[ast.AST] = None
+    syntax_error: Optional[str] = None
+    stats: Optional[AstStats] = None
+    _ast_dump: Optional[str] = field(default=None, repr=False)
+
+    @property
+    def ast_dump(self) -> Optional[str]:
+        """ast.dump of the raw tree, computed on first use."""
+        if self._ast_dump is None and self.tree is not None:
+            self._ast_dump = ast.dump(self.tree)
+        return self._ast_dump
+
+    def without_trees(self) -> "AnalysisContext":
+        """Copy without the parse trees (cheap to pickle across processes)."""
+        return replace(self, tree=None, forms=replace(self.forms, tree=None), _ast_dump=None)
+
+    @classmethod
+    def build(cls, code: str, normalizer: Normalizer) -> "AnalysisContext":
+        start_time = time.time()
+
+        try:
+            forms = normalizer.normalize_all(code)
+            context = cls(code=code, forms=forms)
+
+            try:
+                context.tree = ast.parse(code)
+            except SyntaxError as e:
+                context.syntax_error = str(e)
+                return context
+
+            context.stats = collect_ast_stats(context.tree)
+
+            logging.info(
+                "Analysis context built",
+                extra={
+                    "num_nodes": len(context.stats.depths),
+                    "latency_ms": int((time.time() - start_time) * 1000),
+                }
+            )
+
+            return context
+
+        except CustomException:
+            raise
+
+        except Exception as e:
+            logging.error(f"Failed to build analysis context: {e}")
+            raise CustomException(f"ANALYSIS_CONTEXT_ERROR: {str(e)}", sys)
@@ -2,6 +2,7 @@ import sys
 import re
 import ast
 import time
+from dataclasses import dataclass
 from typing import Optional, Literal
 
 from src.logger import logging
@@ -9,6 +10,26 @@ from src.exception import CustomException
 
 NormalizationLevel = Literal["light", "medium", "aggressive"]
 
+
+@dataclass
+class NormalizedForms:
+    """
+    All three normalization levels of one submission, computed once.
+
+    `tree` is the identifier-renamed AST behind `medium` (None when the
+    code does not parse and medium falls back to light).
+    """
+    light: str
+    medium: str
+    aggressive: str
+    tree: Optional[ast.AST] = None
+
+    def get(self, level: NormalizationLevel) -> str:
+        return getattr(self, level)
+
+    def as_dict(self) -> dict:
+        return {"light": self.light, "medium": self.medium, "aggressive": self.aggressive}
+
 class Normalizer:
     
     def __init__(
@@ -84,8 +105,10 @@ class Normalizer:
     def normalize_medium(self, code: str) -> str:
 
         # Start with light normalization
-        code = self.normalize_light(code)
-        
+        return self._rename_identifiers(self.normalize_light(code))[0]
+    
+    def _rename_identifiers(self, code: str) -> tuple[str, Optional[ast.AST]]:
+        """Medium step on light-normalized code: returns (code, renamed tree)."""
         try:
             tree = ast.parse(code)
             
@@ -138,20 +161,23 @@ class Normalizer:
             tree = renamer.visit(tree)
             code = ast.unparse(tree)
             
-            return code
+            return code, tree
         
         except SyntaxError as e:
             logging.warning(f"Syntax error during medium normalization: {e}")
-            return code  # Return light normalization
+            return code, None  # Return light normalization
         
         except Exception as e:
             logging.warning(f"Medium normalization failed: {e}")
-            return code
+            return code, None
     
     def normalize_aggressive(self, code: str) -> str:
 
-        code = self.normalize_medium(code)
-        
+        return self._strip_and_lower(self.normalize_medium(code))
+    
+    @staticmethod
+    def _strip_and_lower(code: str) -> str:
+        """Aggressive step on medium-normalized code."""
         try:
             code = re.sub(r'\s+', '', code)
             code = code.lower()
@@ -227,6 +253,59 @@ class Normalizer:
             raise CustomException(f"NORMALIZATION_ERROR: {str(e)}", sys)
     
     
+    def normalize_all(self, code: str) -> NormalizedForms:
+        """
+        Light, medium and aggressive forms in a single pass.
+        
+        Each level builds on the previous one, so the code is light-normalized
+        and parsed exactly once instead of once per level per caller.
+        """
+        start_time = time.time()
+        
+        try:
+            # Validate input
+            if not code or not isinstance(code, str):
+                raise ValueError("Code must be a non-empty string")
+            
+            if not code.strip():
+                logging.warning("Empty code provided")
+                return NormalizedForms(light="", medium="", aggressive="")
+            
+            # Check size limit
+            if self.max_code_size and len(code) > self.max_code_size:
+                logging.warning(
+                    f"Code exceeds max size ({len(code)} > {self.max_code_size}). Truncating."
+                )
+                code = code[:self.max_code_size]
+            
+            light = self.normalize_light(code)
+            medium, tree = self._rename_identifiers(light)
+            aggressive = self._strip_and_lower(medium)
+            
+            # Track metrics
+            latency_ms = int((time.time() - start_time) * 1000)
+            self.total_normalizations += 1
+            self.total_latency_ms += latency_ms
+            
+            logging.info(
+                f"Normalized all levels",
+                extra={
+                    "original_size": len(code),
+                    "aggressive_size": len(aggressive),
+                    "latency_ms": latency_ms
+                }
+            )
+            
+            return NormalizedForms(light=light, medium=medium, aggressive=aggressive, tree=tree)
+        
+        except ValueError as e:
+            logging.error(f"Validation error: {e}")
+            raise CustomException(f"NORMALIZATION_VALIDATION_ERROR: {str(e)}", sys)
+        
+        except Exception as e:
+            logging.error(f"Normalization error: {e}")
+            raise CustomException(f"NORMALIZATION_ERROR: {str(e)}", sys)
+    
     def normalize_batch(
         self,
         codes: list[str],
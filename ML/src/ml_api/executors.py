@@ -0,0 +1,318 @@
+from __future__ import annotations
+import os
+import sys
+import time
+import asyncio
+import multiprocessing
+from concurrent.futures import Executor, Future, ThreadPoolExecutor, ProcessPoolExecutor
+from dataclasses import dataclass, replace
+from functools import partial
+from typing import Optional, Callable, Any, Dict, Tuple, List
+
+from src.logger import logging
+from src.exception import CustomException
+from src.components.normalization import Normalizer
+from src.components.analysis_context import AnalysisContext
+from src.ml_core.plagiarism_detector import (
+    AlgorithmPattern,
+    PlagiarismDetector,
+    PlagiarismDetectorConfig,
+    PlagiarismResult,
+)
+
+
+@dataclass
+class ExecutorConfig:
+    """Worker pools used by the async API handlers."""
+    
+    # Threads calling the AI detector; they mostly wait on the perplexity
+    # micro-batcher, and each has at most one sequence in flight, so fewer
+    # threads than AIDetectorConfig.max_batch_size can never fill a batch.
+    # from_env defaults it to MAX_BATCH_SIZE for that reason.
+    model_workers: int = 8
+    
+    # Processes for normalization + plagiarism (0 = threads in this process)
+    plagiarism_workers: int = min(4, os.cpu_count() or 1)
+    process_start_method: str = "spawn"  # torch does not survive fork reliably; launch via src.ml_api.serve
+    
+    # Submissions per AICodeDetector.detect_batch call in /analyze-batch
+    batch_chunk_size: int = 32
+    
+    @classmethod
+    def from_env(cls) -> ExecutorConfig:
+        """Load from environment."""
+        return cls(
+            model_workers=int(os.getenv("MODEL_WORKERS", os.getenv("MAX_BATCH_SIZE", 8))),
+            plagiarism_workers=int(os.getenv("PLAGIARISM_WORKERS", min(4, os.cpu_count() or 1))),
+            process_start_method=os.getenv("PROCESS_START_METHOD", "spawn"),
+            batch_chunk_size=int(os.getenv("BATCH_CHUNK_SIZE", 32)),
+        )
+    
+    def validate(self):
+        """Validate config consistency."""
+        if self.model_workers < 1:
+            raise ValueError(f"model_workers must be >= 1, got {self.model_workers}")
+        if self.plagiarism_workers < 0:
+            raise ValueError(f"plagiarism_workers must be >= 0, got {self.plagiarism_workers}")
+        if self.batch_chunk_size < 1:
+            raise ValueError(f"batch_chunk_size must be >= 1, got {self.batch_chunk_size}")
+        if self.process_start_method not in multiprocessing.get_all_start_methods():
+            raise ValueError(f"Invalid process_start_method: {self.process_start_method}")
+    
+    def check_batching(self, max_batch_size: int):
+        """Warn when the model threads cannot fill a micro-batch of `max_batch_size`."""
+        if self.model_workers < max_batch_size:
+            logging.warning(
+                f"model_workers ({self.model_workers}) < max_batch_size ({max_batch_size}): "
+                f"perplexity micro-batches hold at most {self.model_workers} sequences"
+            )
+
+
+# Per-process state of plagiarism workers (set by _init_plagiarism_worker)
+_worker_detector: Optional[PlagiarismDetector] = None
+
+
+def _init_plagiarism_worker(config: PlagiarismDetectorConfig, patterns: List[AlgorithmPattern]):
+    global _worker_detector
+    # Same corpus as the parent detector; results are cached by the parent's
+    # shared ResultCache, not per worker
+    _worker_detector = PlagiarismDetector(
+        config=replace(config, enable_caching=False),
+        normalizer=Normalizer(),
+        patterns=patterns,
+    )
+
+
+def _warm_up_worker() -> str:
+    """Start a worker (pattern index included); returns its pattern fingerprint."""
+    AnalysisContext.build("pass", _worker_detector.normalizer)
+    return _worker_detector.patterns_fingerprint
+
+
+def _build_context(code: str) -> AnalysisContext:
+    """Normalize and parse in a worker; trees stay behind to keep the reply small."""
+    return AnalysisContext.build(code, _worker_detector.normalizer).without_trees()
+
+
+def _detect_plagiarism(code: str, context: Optional[AnalysisContext] = None) -> Tuple[PlagiarismResult, str]:
+    """
+    Plagiarism in a worker, plus the worker's pattern fingerprint.
+
+    A `context` from _build_context is reused instead of re-normalizing.
+    """
+    context = context or AnalysisContext.build(code, _worker_detector.normalizer)
+    return _worker_detector.detect(code, context=context), _worker_detector.patterns_fingerprint
+
+
+class AnalysisExecutors:
+    """
+    Bounded executors for the two detectors.
+
+    AI detection runs on a small dedicated thread pool so GIL-holding torch
+    calls never queue behind difflib work. Normalization and plagiarism run
+    in a process pool whose workers each hold their own PlagiarismDetector;
+    with plagiarism_workers=0 they run on threads against the in-process
+    detector instead (useful for development and tests). The same threads
+    serve requests that arrive while the worker processes are starting.
+    """
+    
+    def __init__(
+        self,
+        config: Optional[ExecutorConfig] = None,
+        plag_detector: Optional[PlagiarismDetector] = None,
+    ):
+        try:
+            self.config = config or ExecutorConfig.from_env()
+            self.config.validate()
+            self.plag_detector = plag_detector or PlagiarismDetector()
+            
+            self.model_executor = ThreadPoolExecutor(
+                max_workers=self.config.model_workers,
+                thread_name_prefix="model",
+            )
+            
+            # Threads against the in-process detector: the whole plagiarism
+            # pool without worker processes, else only until they have started
+            self.thread_executor = ThreadPoolExecutor(
+                max_workers=os.cpu_count() or 1,
+                thread_name_prefix="plagiarism",
+            )
+            
+            self.plagiarism_executor: Executor = self.thread_executor
+            self._warm_up_futures: List[Future] = []
+            if self.config.plagiarism_workers > 0:
+                self.plagiarism_executor = ProcessPoolExecutor(
+                    max_workers=self.config.plagiarism_workers,
+                    mp_context=multiprocessing.get_context(self.config.process_start_method),
+                    initializer=_init_plagiarism_worker,
+                    initargs=(self.plag_detector.config, self.plag_detector.patterns),
+                )
+                self._warm_up()
+            
+            # Metrics
+            self.total_ai_tasks = 0
+            self.total_plagiarism_tasks = 0
+            self.total_ai_time_ms = 0
+            self.total_plagiarism_time_ms = 0
+            
+            logging.info(
+                "Analysis executors started",
+                extra={
+                    "model_workers": self.config.model_workers,
+                    "plagiarism_workers": self.config.plagiarism_workers,
+                }
+            )
+        
+        except Exception as e:
+            logging.error(f"Failed to start analysis executors: {e}")
+            raise CustomException(f"EXECUTOR_INIT_ERROR: {str(e)}", sys)
+    
+    def _warm_up(self):
+        """
+        Start every worker (and load its pattern index) in the background.
+
+        Startup does not wait for it; requests are served on threads until
+        every warm-up task has succeeded.
+        """
+        self._warm_up_futures = [
+            self.plagiarism_executor.submit(_warm_up_worker)
+            for _ in range(self.config.plagiarism_workers)
+        ]
+        for future in self._warm_up_futures:
+            future.add_done_callback(self._log_warm_up)
+    
+    def _warm_up_ok(self, future: Future) -> bool:
+        """Finished without error, on the parent's pattern set."""
+        return (
+            future.done() and
+            not future.cancelled() and
+            future.exception() is None and
+            future.result() == self.plag_detector.patterns_fingerprint
+        )
+    
+    def _log_warm_up(self, future: Future):
+        if self._warm_up_ok(future):
+            return
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            logging.error(f"Plagiarism worker failed to start; staying on threads: {future.exception()}")
+        else:
+            logging.error(
+                f"Plagiarism worker pattern set {future.result()} differs from "
+                f"{self.plag_detector.patterns_fingerprint}; staying on threads"
+            )
+    
+    @property
+    def uses_processes(self) -> bool:
+        return self.config.plagiarism_workers > 0
+    
+    @property
+    def plagiarism_ready(self) -> bool:
+        """True once every plagiarism worker has started cleanly (always, without workers)."""
+        return all(self._warm_up_ok(future) for future in self._warm_up_futures)
+    
+    @property
+    def plagiarism_failed(self) -> bool:
+        """A worker warm-up failed: plagiarism stays on the in-process threads."""
+        return any(future.done() and not self._warm_up_ok(future) for future in self._warm_up_futures)
+    
+    @property
+    def _use_workers(self) -> bool:
+        return self.uses_processes and self.plagiarism_ready
+    
+    async def run_model(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run a model-bound call on the model executor."""
+        start_time = time.time()
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self.model_executor, partial(fn, *args, **kwargs))
+        finally:
+            self.total_ai_tasks += 1
+            self.total_ai_time_ms += int((time.time() - start_time) * 1000)
+    
+    async def build_context(self, code: str) -> AnalysisContext:
+        loop = asyncio.get_running_loop()
+        if self._use_workers:
+            return await loop.run_in_executor(self.plagiarism_executor, _build_context, code)
+        return await loop.run_in_executor(
+            self.thread_executor, AnalysisContext.build, code, self.plag_detector.normalizer
+        )
+    
+    async def detect_plagiarism(
+        self,
+        code: str,
+        context: Optional[AnalysisContext] = None,
+    ) -> PlagiarismResult:
+        """
+        Plagiarism detection off the event loop, reusing `context` when given.
+
+        Worker processes have no access to the shared result cache, so the
+        parent looks a submission up before sending it and stores the
+        worker's result. A context from a worker carries no parse trees;
+        the worker re-parses the raw code only for the structural score.
+        """
+        start_time = time.time()
+        loop = asyncio.get_running_loop()
+        try:
+            if self._use_workers:
+                cached = await loop.run_in_executor(
+                    self.thread_executor, self.plag_detector.get_cached, code, context
+                )
+                if cached is not None:
+                    return cached
+                result, patterns_fingerprint = await loop.run_in_executor(
+                    self.plagiarism_executor, _detect_plagiarism, code, context
+                )
+                # Never cache a result computed on another corpus under this one's key
+                if patterns_fingerprint == self.plag_detector.patterns_fingerprint:
+                    await loop.run_in_executor(
+                        self.thread_executor, self.plag_detector.put_cached, code, result, context
+                    )
+                else:
+                    logging.warning(
+                        f"Plagiarism worker pattern set {patterns_fingerprint} differs from "
+                        f"{self.plag_detector.patterns_fingerprint}; result not cached"
+                    )
+                return result
+            return await loop.run_in_executor(
+                self.thread_executor, partial(self.plag_detector.detect, code, context=context)
+            )
+        finally:
+            self.total_plagiarism_tasks += 1
+            self.total_plagiarism_time_ms += int((time.time() - start_time) * 1000)
+    
+    async def analyze(self, code: str, ai_detect: Callable[..., Any]) -> Tuple[Any, PlagiarismResult]:
+        """
+        Run AI and plagiarism detection for one submission concurrently.
+
+        The context is built once (in a worker process when available) and
+        shared by both detectors, so latency is context + max(AI, plagiarism).
+        """
+        context = await self.build_context(code)
+        return await asyncio.gather(
+            self.run_model(ai_detect, code, context=context),
+            self.detect_plagiarism(code, context=context),
+        )
+    
+    def shutdown(self):
+        self.model_executor.shutdown(wait=True)
+        self.plagiarism_executor.shutdown(wait=True, cancel_futures=True)
+        self.thread_executor.shutdown(wait=True)
+        logging.info("Analysis executors stopped")
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get executor metrics."""
+        return {
+            "model_workers": self.config.model_workers,
+            "plagiarism_workers": self.config.plagiarism_workers,
+            "total_ai_tasks": self.total_ai_tasks,
+            "total_plagiarism_tasks": self.total_plagiarism_tasks,
+            "avg_ai_time_ms": (
+                round(self.total_ai_time_ms / self.total_ai_tasks, 2) if self.total_ai_tasks else 0.0
+            ),
+            "avg_plagiarism_time_ms": (
+                round(self.total_plagiarism_time_ms / self.total_plagiarism_tasks, 2)
+                if self.total_plagiarism_tasks else 0.0
+            ),
+        }
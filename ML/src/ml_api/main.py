@@ -1,10 +1,14 @@
 from __future__ import annotations
+import os
 import sys
+import time
+import asyncio
+import functools
 from contextlib import asynccontextmanager
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, AsyncIterator
 
-import uvicorn
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 
 from src.logger import logging
@@ -12,9 +16,12 @@ from src.exception import CustomException
 from src.components.data_ingestion import DataIngestion
 from src.components.normalization import Normalizer
 from src.ml_core.model_loader import get_model_singleton
-from src.ml_core.code_detector import AICodeDetector
-from src.ml_core.plagiarism_detector import PlagiarismDetector
+from src.ml_core.code_detector import AICodeDetector, AIDetectorConfig, DetectionResult
+from src.ml_core.plagiarism_detector import PlagiarismDetector, PlagiarismDetectorConfig, PlagiarismResult
 from src.ml_core.decision_engine import DecisionEngine, DecisionConfig
+from src.ml_core.result_cache import ResultCache
+from src.ml_core.score_replay import ScoreLog
+from src.ml_api.executors import AnalysisExecutors, ExecutorConfig
 
 class AnalyzeRequest(BaseModel):
     code: str = Field(..., description="Raw source code to analyze")
@@ -22,6 +29,10 @@ class AnalyzeRequest(BaseModel):
     submission_id: Optional[str] = Field(default=None)
     mode: str = Field(default="practice", description="practice | coursework | contest")
     language: str = Field(default="python")
+    include_token_surprisal: bool = Field(
+        default=False,
+        description="Return per-token surprisal of the scored code (/analyze only)",
+    )
 
 
 class AnalyzeResponse(BaseModel):
@@ -33,10 +44,72 @@ class AnalyzeResponse(BaseModel):
     plagiarism_detection: Dict[str, Any]
     decision: Dict[str, Any]
 
+
+class BatchItemResponse(BaseModel):
+    """One /analyze-batch entry; failed items carry status="error" and no payloads."""
+    index: int
+    status: str = Field(..., description="ok | error")
+    error: Optional[str] = Field(default=None)
+
+    submission_id: str
+    user_id: str
+    mode: str
+
+    ai_detection: Optional[Dict[str, Any]] = None
+    plagiarism_detection: Optional[Dict[str, Any]] = None
+    decision: Optional[Dict[str, Any]] = None
+
 class HealthResponse(BaseModel):
-    status: str
+    status: str = Field(..., description="ok | degraded (AI results partial) | initializing")
     device: str
     model_loaded: bool
+    components: Dict[str, str] = Field(
+        default_factory=dict,
+        description="Per-component readiness: ready | starting | loading | failed",
+    )
+
+
+def _build_result_cache(*configs) -> Optional[ResultCache]:
+    """
+    One result cache for every detector config with caching enabled.
+
+    Keys are namespaced, so the size is the sum of the detectors' cache_size
+    and the TTL is the shortest configured one (None = no expiry).
+    """
+    enabled = [config for config in configs if config.enable_caching]
+    if not enabled:
+        return None
+    
+    ttls = [config.cache_ttl_seconds for config in enabled if config.cache_ttl_seconds is not None]
+    return ResultCache(
+        max_size=sum(config.cache_size for config in enabled),
+        ttl_seconds=min(ttls) if ttls else None,
+    )
+
+
+async def _load_model(app: FastAPI, strict: bool = False):
+    """
+    Load the perplexity model off the event loop and attach it to the AI detector.
+
+    Until then /analyze serves plagiarism plus partial (AST/style) AI
+    results. With `strict`, a load failure is raised instead of leaving
+    the service in that partial mode.
+    """
+    start_time = time.time()
+    try:
+        model, tokenizer, device = await asyncio.to_thread(get_model_singleton)
+        app.state.ai_detector.attach_model(model, tokenizer, device)
+        app.state.device = device
+        app.state.model_status = "ready"
+        logging.info(
+            "Perplexity model ready",
+            extra={"load_time_seconds": round(time.time() - start_time, 2)},
+        )
+    except Exception as e:
+        app.state.model_status = "failed"
+        logging.error(f"Model loading failed; serving partial AI results: {e}")
+        if strict:
+            raise
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -47,28 +120,58 @@ async def lifespan(app: FastAPI):
         data_ingestor = DataIngestion()
         normalizer = Normalizer()
 
-        model, tokenizer, device = get_model_singleton()
+        ai_config = AIDetectorConfig.from_env()
+        plag_config = PlagiarismDetectorConfig.from_env()
 
+        # One result cache shared by both detectors (keys are namespaced)
+        result_cache = _build_result_cache(ai_config, plag_config)
+
+        # The model is attached once _load_model finishes
         ai_detector = AICodeDetector(
-            model=model,
-            tokenizer=tokenizer,
-            device=device,
+            config=ai_config,
             normalizer=normalizer,
+            cache=result_cache,
+            load_model=False,
         )
 
         plag_detector = PlagiarismDetector(
+            config=plag_config,
             normalizer=normalizer,
+            cache=result_cache,
         )
 
         decision_engine = DecisionEngine(DecisionConfig(mode="practice"))
 
+        # Raw component scores for offline threshold replay (opt-in)
+        score_log_dir = os.getenv("SCORE_LOG_DIR")
+        score_log = (
+            ScoreLog(score_log_dir, flush_interval_seconds=float(os.getenv("SCORE_LOG_FLUSH_SECONDS", 10.0)))
+            if score_log_dir else None
+        )
+
+        # Bounded pools: model thread(s) for AI, worker processes for plagiarism
+        executor_config = ExecutorConfig.from_env()
+        if ai_config.enable_micro_batching:
+            executor_config.check_batching(ai_config.max_batch_size)
+        executors = AnalysisExecutors(executor_config, plag_detector=plag_detector)
+
         # Attach to app.state for access in routes
         app.state.data_ingestor = data_ingestor
         app.state.normalizer = normalizer
         app.state.ai_detector = ai_detector
         app.state.plag_detector = plag_detector
         app.state.decision_engine = decision_engine
-        app.state.device = device
+        app.state.result_cache = result_cache
+        app.state.executors = executors
+        app.state.score_log = score_log
+        app.state.device = None
+        app.state.model_status = "loading"
+
+        # Serve right away and load the model in the background (LAZY_MODEL_LOAD=false blocks instead)
+        if os.getenv("LAZY_MODEL_LOAD", "true").lower() == "true":
+            app.state.model_task = asyncio.create_task(_load_model(app))
+        else:
+            await _load_model(app, strict=True)
 
         logging.info("Startup complete: detectors and decision engine initialized.")
 
@@ -80,7 +183,18 @@ async def lifespan(app: FastAPI):
 
     finally:
         logging.info("Shutting down Code Analysis Engine")
-        # If you had resources to close (DB, clients), do it here.
+        model_task = getattr(app.state, "model_task", None)
+        if model_task is not None and not model_task.done():
+            model_task.cancel()
+        executors = getattr(app.state, "executors", None)
+        if executors is not None:
+            executors.shutdown()
+        score_log = getattr(app.state, "score_log", None)
+        if score_log is not None:
+            score_log.close()
+        ai_detector = getattr(app.state, "ai_detector", None)
+        if ai_detector is not None:
+            ai_detector.close()
 
 
 app = FastAPI(
@@ -93,59 +207,82 @@ app = FastAPI(
 @app.get("/health", response_model=HealthResponse)
 def health_check():
     try:
-        device = getattr(app.state, "device", None)
-        model_loaded = device is not None
-        device_str = str(device) if model_loaded else "uninitialized"
+        executors: Optional[AnalysisExecutors] = getattr(app.state, "executors", None)
+        if executors is None:
+            return HealthResponse(status="initializing", device="uninitialized", model_loaded=False)
+
+        device = app.state.device
+        model_loaded = app.state.model_status == "ready"
+        components = {
+            "plagiarism": (
+                "ready" if executors.plagiarism_ready
+                else "failed" if executors.plagiarism_failed
+                else "starting"
+            ),
+            "ai_model": app.state.model_status,
+        }
 
         return HealthResponse(
-            status="ok" if model_loaded else "initializing",
-            device=device_str,
+            status="ok" if all(state == "ready" for state in components.values()) else "degraded",
+            device=str(device) if device is not None else "uninitialized",
             model_loaded=model_loaded,
+            components=components,
         )
     except Exception as e:
         logging.error(f"Health check error: {e}")
         raise HTTPException(status_code=500, detail="Health check failed")
 
 
+def _build_response(
+    request: AnalyzeRequest,
+    ai_result: DetectionResult,
+    plag_result: PlagiarismResult,
+) -> AnalyzeResponse:
+    decision_engine: DecisionEngine = app.state.decision_engine
+
+    # Mode is per call; the shared engine is never mutated
+    decision = decision_engine.decide(ai_result, plag_result, mode=request.mode)
+    decision_payload = {
+        "action": decision.action,
+        "rationale": decision.rationale,
+        "combined_confidence": decision.combined_confidence,
+        "details": decision.details,
+    }
+
+    submission_id = request.submission_id or f"auto_{id(request)}"
+
+    # Partial AI results have no perplexity to replay
+    score_log: Optional[ScoreLog] = app.state.score_log
+    if score_log is not None and not ai_result.partial:
+        score_log.record(submission_id, request.mode, ai_result, plag_result, decision.action)
+
+    return AnalyzeResponse(
+        submission_id=submission_id,
+        user_id=request.user_id,
+        mode=request.mode,
+        ai_detection=ai_result.to_dict(),
+        plagiarism_detection=plag_result.to_dict(),
+        decision=decision_payload,
+    )
+
+
 @app.post("/analyze", response_model=AnalyzeResponse)
-def analyze_code(request: AnalyzeRequest):
+async def analyze_code(request: AnalyzeRequest):
     try:
         ai_detector: AICodeDetector = app.state.ai_detector
-        plag_detector: PlagiarismDetector = app.state.plag_detector
-        decision_engine: DecisionEngine = app.state.decision_engine
+        executors: AnalysisExecutors = app.state.executors
 
         raw_code = request.code
         if not raw_code or not raw_code.strip():
             raise HTTPException(status_code=400, detail="Code cannot be empty")
+        if request.mode not in app.state.decision_engine.modes:
+            raise HTTPException(status_code=400, detail=f"Invalid mode: {request.mode}")
 
-        # AI detection
-        ai_result = ai_detector.detect(raw_code)
-        ai_payload = ai_result.to_dict()
-
-        # Plagiarism detection
-        plag_result = plag_detector.detect(raw_code)
-        plag_payload = plag_result.to_dict()
-
-        # Decision: update mode per request
-        decision_engine.config = DecisionConfig(mode=request.mode)
-        decision = decision_engine.decide(ai_result, plag_result)
-        decision_payload = {
-            "action": decision.action,
-            "rationale": decision.rationale,
-            "combined_confidence": decision.combined_confidence,
-            "details": decision.details,
-        }
-
-        submission_id = request.submission_id or f"auto_{id(request)}"
+        # AI and plagiarism detection run concurrently off the event loop
+        detect = functools.partial(ai_detector.detect, token_surprisal=request.include_token_surprisal)
+        ai_result, plag_result = await executors.analyze(raw_code, detect)
 
-        return AnalyzeResponse(
-            submission_id=submission_id,
-            user_id=request.user_id,
-            mode=request.mode,
-            ai_detection=ai_payload,
-            plagiarism_detection=plag_payload,
-            decision=decision_payload,
-        )
+        return _build_response(request, ai_result, plag_result)
 
     except CustomException as e:
         logging.error(f"CustomException in /analyze: {e}")
@@ -157,22 +294,103 @@ def analyze_code(request: AnalyzeRequest):
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
-@app.post("/analyze-batch", response_model=List[AnalyzeResponse])
-def analyze_batch(requests: List[AnalyzeRequest]):
-    responses: List[AnalyzeResponse] = []
-    for req in requests:
-        resp = analyze_code(req)
-        responses.append(resp)
-    return responses
+def _batch_error(index: int, request: AnalyzeRequest, error: str) -> BatchItemResponse:
+    return BatchItemResponse(
+        index=index,
+        status="error",
+        error=error,
+        submission_id=request.submission_id or f"auto_{id(request)}",
+        user_id=request.user_id,
+        mode=request.mode,
+    )
+
+
+async def _iter_batch(requests: List[AnalyzeRequest]) -> AsyncIterator[BatchItemResponse]:
+    """
+    Analyze a batch, yielding items as they complete (not in input order).
+
+    Submissions are split into chunks that go through the batched
+    perplexity path (AICodeDetector.detect_batch) on the model executor,
+    while every submission is queued on the plagiarism pool. A failing
+    submission yields an error item instead of aborting the batch.
+    """
+    ai_detector: AICodeDetector = app.state.ai_detector
+    executors: AnalysisExecutors = app.state.executors
+    chunk_size = executors.config.batch_chunk_size
+
+    modes = app.state.decision_engine.modes
+
+    valid: List[int] = []
+    for i, req in enumerate(requests):
+        if not req.code or not req.code.strip():
+            yield _batch_error(i, req, "Code cannot be empty")
+        elif req.mode not in modes:
+            yield _batch_error(i, req, f"Invalid mode: {req.mode}")
+        else:
+            valid.append(i)
+
+    # One AI task per chunk; plagiarism tasks per submission
+    ai_chunks: Dict[int, asyncio.Task] = {}
+    for start in range(0, len(valid), chunk_size):
+        chunk = valid[start:start + chunk_size]
+        ai_chunks[start] = asyncio.ensure_future(
+            executors.run_model(ai_detector.detect_batch, [requests[i].code for i in chunk])
+        )
+    plag_tasks = {i: asyncio.ensure_future(executors.detect_plagiarism(requests[i].code)) for i in valid}
+
+    async def analyze_item(position: int, index: int) -> BatchItemResponse:
+        request = requests[index]
+        try:
+            start = position - position % chunk_size
+            ai_result = (await ai_chunks[start])[position - start]
+            plag_result = await plag_tasks[index]
+            if ai_result is None:
+                return _batch_error(index, request, "AI_DETECTION_ERROR")
+
+            response = _build_response(request, ai_result, plag_result)
+            return BatchItemResponse(index=index, status="ok", **response.model_dump())
+
+        except Exception as e:
+            logging.warning(f"Batch item {index} failed: {e}")
+            return _batch_error(index, request, str(e))
+
+    item_tasks = [asyncio.ensure_future(analyze_item(pos, idx)) for pos, idx in enumerate(valid)]
+    try:
+        for next_done in asyncio.as_completed(item_tasks):
+            yield await next_done
+    finally:
+        # Client went away or the batch failed: drop the remaining work
+        for task in [*item_tasks, *ai_chunks.values(), *plag_tasks.values()]:
+            task.cancel()
+
+
+@app.post("/analyze-batch", response_model=List[BatchItemResponse])
+async def analyze_batch(requests: List[AnalyzeRequest]):
+    try:
+        items = [item async for item in _iter_batch(requests)]
+        return sorted(items, key=lambda item: item.index)
+
+    except Exception as e:
+        logging.error(f"Unexpected error in /analyze-batch: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@app.post("/analyze-batch/stream")
+async def analyze_batch_stream(requests: List[AnalyzeRequest]):
+    """NDJSON stream of BatchItemResponse lines, emitted as each item completes."""
+    async def ndjson() -> AsyncIterator[str]:
+        async for item in _iter_batch(requests):
+            yield item.model_dump_json() + "\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
 
 if __name__ == "__main__":
     try:
-        uvicorn.run(
-            "src.ml_api.main:app",
-            host="0.0.0.0",
-            port=8000,
-            reload=True,
-        )
+        # Spawned plagiarism workers re-import __main__ (this whole app, torch
+        # included); prefer `python -m src.ml_api.serve`, see its docstring
+        logging.warning("Started as src.ml_api.main; use `python -m src.ml_api.serve` for fast worker start-up")
+        from src.ml_api.serve import main as serve
+        serve()
     except Exception as e:
         logging.error(f"Failed to start server: {e}")
         raise CustomException(e)
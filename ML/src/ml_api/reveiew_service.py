@@ -6,6 +6,14 @@ from src.ml_core.code_detector import DetectionResult
 from src.ml_core.plagiarism_detector import PlagiarismResult
 from src.ml_core.decision_engine import DecisionResult
 
+class LineEvidence(BaseModel):
+    """One source line with its mean token surprisal (lower = more predictable)."""
+    line: int
+    text: str
+    mean_surprisal: float
+    num_tokens: int
+
+
 class AIBreakdown(BaseModel):
     """Minimal AI detection breakdown."""
     is_ai_generated: bool
@@ -13,6 +21,7 @@ class AIBreakdown(BaseModel):
     risk_level: str
     perplexity: float
     reasoning: str
+    predictable_lines: List[LineEvidence] = Field(default_factory=list)
 
 
 class PlagiarismBreakdown(BaseModel):
@@ -54,6 +63,7 @@ class ReviewFormatter:
             risk_level=ai_result.risk_level,
             perplexity=ai_result.perplexity,
             reasoning=ai_result.reasoning,
+            predictable_lines=self._predictable_lines(ai_result),
         )
         
         # Plagiarism breakdown (minimal)
@@ -82,6 +92,21 @@ class ReviewFormatter:
             next_steps=next_steps,
         )
     
+    def _predictable_lines(self, ai_result: DetectionResult) -> List[LineEvidence]:
+        """Lowest-surprisal submission lines, when the result carries a token surprisal heatmap."""
+        # Line numbers of the normalized code would not point at the submission
+        if ai_result.token_surprisal is None or ai_result.token_surprisal.normalized:
+            return []
+        return [
+            LineEvidence(
+                line=line["line"],
+                text=line["text"],
+                mean_surprisal=line["mean_surprisal"],
+                num_tokens=line["num_tokens"],
+            )
+            for line in ai_result.token_surprisal.most_predictable_lines()
+        ]
+    
     def _build_summary(self, action: str) -> str:
         """One-line summary based on action."""
         summaries = {
@@ -157,6 +182,15 @@ class ReviewFormatter:
         md.append(f"- **Perplexity:** {review.ai_breakdown.perplexity:.1f}")
         md.append(f"- {review.ai_breakdown.reasoning}\n")
         
+        if review.ai_breakdown.predictable_lines:
+            md.append(f"#### Most Predictable Lines")
+            md.append("| Line | Mean surprisal | Code |")
+            md.append("|---:|---:|---|")
+            for evidence in review.ai_breakdown.predictable_lines:
+                text = evidence.text.strip().replace("|", "\\|")
+                md.append(f"| {evidence.line} | {evidence.mean_surprisal:.2f} | `{text}` |")
+            md.append("")
+        
         md.append(f"### Plagiarism Detection")
         md.append(f"- **Risk:** {review.plagiarism_breakdown.risk_level}")
         if review.plagiarism_breakdown.best_match:
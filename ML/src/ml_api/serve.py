@@ -0,0 +1,28 @@
+"""
+API server entry point.
+
+Run from the ML directory:
+    python -m src.ml_api.serve
+or
+    uvicorn src.ml_api.main:app --host 0.0.0.0 --port 8000
+
+Plagiarism workers are started with `spawn`, which re-imports the
+launching __main__ module in every worker process. This module only
+imports uvicorn, so workers start fast; launching with
+`python -m src.ml_api.main` would make each of them import torch and the
+whole app first.
+"""
+import uvicorn
+
+
+def main():
+    uvicorn.run(
+        "src.ml_api.main:app",
+        host="0.0.0.0",
+        port=8000,
+        reload=True,
+    )
+
+
+if __name__ == "__main__":
+    main()
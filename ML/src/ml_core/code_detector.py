@@ -1,12 +1,11 @@
 from __future__ import annotations
 import sys
 import ast
-import re
 import time
 import math
 import os
-from typing import Optional, List, Tuple, Dict, Any
-from dataclasses import dataclass, field, asdict
+from typing import Optional, List, Tuple, Dict, Any, Union
+from dataclasses import dataclass, field, asdict, replace
 
 import torch 
 import numpy as np
@@ -14,8 +13,20 @@ from transformers import PreTrainedModel, PreTrainedTokenizerBase
 
 from src.logger import logging
 from src.exception import CustomException
-from src.components.normalization import Normalizer
+from src.components.normalization import Normalizer, NormalizedForms
+from src.components.analysis_context import AnalysisContext, AstStats, collect_ast_stats
 from src.ml_core.model_loader import load_model_and_tokenizer, ModelLoaderConfig
+from src.ml_core.perplexity_batcher import (
+    PerplexityBatcher, BatchSchedulerConfig,
+    compute_sequence_losses, compute_window_token_losses, summarize_windows,
+    plan_windows, pad_batch, bucket_by_length,
+)
+from src.ml_core.result_cache import ResultCache, config_fingerprint, hash_text
+from src.ml_core.perplexity_store import PerplexityStore
+from src.ml_core.style_features import style_feature_matrix
+from src.ml_core.token_surprisal import TokenSurprisal, build_token_surprisal
+from src.ml_core.token_cache import TokenCache, encode_batch
+from src.ml_core.inference_backend import BACKENDS, LOSS_CHUNK_TOKENS, InferenceBackend, create_backend
 
 
 @dataclass
@@ -46,9 +57,29 @@ class DetectionResult:
     reasoning: str
     recommendations: List[str] = field(default_factory=list)
     
+    # Per-window perplexity when a long input was scored with sliding windows
+    window_perplexities: Optional[List[float]] = None
+    
+    # Per-token surprisal of the scored code (only when requested)
+    token_surprisal: Optional[TokenSurprisal] = None
+    
+    # True when the perplexity model was not loaded yet: AST/style signals only
+    partial: bool = False
+    
     def to_dict(self) -> Dict[str, Any]:
         """Convert to dictionary for serialization."""
-        return asdict(self)
+        result = asdict(replace(self, token_surprisal=None))
+        result["token_surprisal"] = self.token_surprisal.to_dict() if self.token_surprisal else None
+        return result
+
+
+@dataclass
+class PerplexityDetail:
+    """Model output for one submission (aggregate plus optional per-window / per-token values)."""
+    perplexity: float
+    window_perplexities: Optional[List[float]] = None
+    token_surprisal: Optional[TokenSurprisal] = None
+
 
 @dataclass
 class AIDetectorConfig:
@@ -85,9 +116,31 @@ class AIDetectorConfig:
     max_code_length: int = 50000
     max_tokens_for_perplexity: int = 1024
     
+    # Sliding-window perplexity for inputs longer than max_tokens_for_perplexity
+    enable_sliding_window: bool = False
+    sliding_window_stride: int = 512  # new tokens scored per extra window
+    max_windows: int = 8  # scores at most max_tokens + (max_windows - 1) * stride tokens
+    
     # Performance
     enable_caching: bool = True
     cache_size: int = 500
+    cache_ttl_seconds: Optional[float] = None  # None = no expiry
+    perplexity_cache_dir: Optional[str] = None  # None = no on-disk cache
+    token_cache_size: int = 2048  # normalized_hash -> token ids; 0 = disabled
+    
+    # Runtime for the perplexity forward pass: eager | compile | torchscript | onnx
+    inference_backend: str = "eager"
+    backend_dir: Optional[str] = None  # exported graphs; None = MODELS_ROOT
+    loss_chunk_tokens: int = LOSS_CHUNK_TOKENS  # LM head rows per chunk (eager / compile); 0 = full logits
+    
+    # Micro-batching of concurrent perplexity requests
+    enable_micro_batching: bool = True
+    max_batch_size: int = 8
+    max_batch_wait_ms: float = 5.0
+    
+    # Offline detect_batch bucketing
+    batch_bucket_size: int = 16
+    max_batch_tokens: int = 16384  # rows x padded length per forward pass
     
     def __post_init__(self):
         """Validate config after initialization."""
@@ -99,6 +152,18 @@ class AIDetectorConfig:
         return cls(
             perplexity_ai_threshold=float(os.getenv("PERPLEXITY_AI_THRESHOLD", 10.0)),
             high_confidence_threshold=float(os.getenv("HIGH_CONFIDENCE_THRESHOLD", 0.65)),
+            enable_micro_batching=os.getenv("ENABLE_MICRO_BATCHING", "true").lower() == "true",
+            max_batch_size=int(os.getenv("MAX_BATCH_SIZE", 8)),
+            max_batch_wait_ms=float(os.getenv("MAX_BATCH_WAIT_MS", 5.0)),
+            enable_caching=os.getenv("ENABLE_CACHING", "true").lower() == "true",
+            cache_size=int(os.getenv("CACHE_SIZE", 500)),
+            cache_ttl_seconds=float(os.environ["CACHE_TTL_SECONDS"]) if os.getenv("CACHE_TTL_SECONDS") else None,
+            perplexity_cache_dir=os.getenv("PERPLEXITY_CACHE_DIR") or None,
+            enable_sliding_window=os.getenv("ENABLE_SLIDING_WINDOW", "false").lower() == "true",
+            sliding_window_stride=int(os.getenv("SLIDING_WINDOW_STRIDE", 512)),
+            token_cache_size=int(os.getenv("TOKEN_CACHE_SIZE", 2048)),
+            inference_backend=os.getenv("INFERENCE_BACKEND", "eager"),
+            loss_chunk_tokens=int(os.getenv("LOSS_CHUNK_TOKENS", LOSS_CHUNK_TOKENS)),
         )
     
     def validate(self):
@@ -111,6 +176,24 @@ class AIDetectorConfig:
         # Check threshold ordering
         if not (0 <= self.low_confidence_threshold < self.medium_confidence_threshold < self.high_confidence_threshold <= 1.0):
             raise ValueError("Thresholds must be ordered: 0 <= low < medium < high <= 1.0")
+        
+        if not 0 < self.sliding_window_stride <= self.max_tokens_for_perplexity:
+            raise ValueError(
+                f"sliding_window_stride must be in (0, {self.max_tokens_for_perplexity}], "
+                f"got {self.sliding_window_stride}"
+            )
+        if self.max_windows < 1:
+            raise ValueError(f"max_windows must be >= 1, got {self.max_windows}")
+        if self.cache_size < 1:
+            raise ValueError(f"cache_size must be >= 1, got {self.cache_size}")
+        if self.cache_ttl_seconds is not None and self.cache_ttl_seconds <= 0:
+            raise ValueError(f"cache_ttl_seconds must be > 0 or None, got {self.cache_ttl_seconds}")
+        if self.token_cache_size < 0:
+            raise ValueError(f"token_cache_size must be >= 0, got {self.token_cache_size}")
+        if self.inference_backend not in BACKENDS:
+            raise ValueError(f"inference_backend must be one of {BACKENDS}, got {self.inference_backend}")
+        if self.loss_chunk_tokens < 0:
+            raise ValueError(f"loss_chunk_tokens must be >= 0, got {self.loss_chunk_tokens}")
 
 
 class AICodeDetector:
@@ -121,172 +204,354 @@ class AICodeDetector:
         model: Optional[PreTrainedModel] = None,
         tokenizer: Optional[PreTrainedTokenizerBase] = None,
         device: Optional[torch.device] = None,
-        normalizer: Optional[Normalizer] = None
+        normalizer: Optional[Normalizer] = None,
+        cache: Optional[ResultCache] = None,
+        load_model: bool = True,
     ):
+        """
+        With `load_model=False` and no model given, the detector starts
+        without one: detect() returns partial (AST/style only) results
+        until attach_model() is called.
+        """
         # Config
         self.config = config or AIDetectorConfig.from_env()
         
-        if model is None or tokenizer is None or device is None:
+        if (model is None or tokenizer is None or device is None) and load_model:
             logging.info("Loading model for AI detection...")
             model, tokenizer, device = load_model_and_tokenizer()
         
-        self.model = model
-        self.tokenizer = tokenizer
-        self.device = device
-        
-        # Set pad token if not set
-        if self.tokenizer.pad_token is None:
-            self.tokenizer.pad_token = self.tokenizer.eos_token
-        
         # Normalizer
         self.normalizer = normalizer or Normalizer()
         
+        # Result cache (may be shared with the plagiarism detector)
+        self.cache: Optional[ResultCache] = None
+        if self.config.enable_caching:
+            self.cache = cache if cache is not None else ResultCache(
+                max_size=self.config.cache_size,
+                ttl_seconds=self.config.cache_ttl_seconds,
+            )
+        
+        # Token budget per submission; windowed values never share store rows with truncated ones
+        self.max_scored_tokens = self.config.max_tokens_for_perplexity
+        if self.config.enable_sliding_window:
+            self.max_scored_tokens += (self.config.max_windows - 1) * self.config.sliding_window_stride
+        
+        # Token ids of recent submissions (skips re-tokenizing repeats)
+        self.token_cache: Optional[TokenCache] = None
+        if self.config.token_cache_size > 0:
+            self.token_cache = TokenCache(self.config.token_cache_size)
+        
+        # On-disk perplexity cache (optional)
+        self.perplexity_store: Optional[PerplexityStore] = None
+        if self.config.perplexity_cache_dir:
+            self.perplexity_store = PerplexityStore(self.config.perplexity_cache_dir)
+        
+        # Model-dependent state (set by attach_model)
+        self.model: Optional[PreTrainedModel] = None
+        self.backend: Optional[InferenceBackend] = None
+        self.tokenizer: Optional[PreTrainedTokenizerBase] = None
+        self.device: Optional[torch.device] = None
+        self.batcher: Optional[PerplexityBatcher] = None
+        self.model_id = ""
+        self.config_fingerprint = config_fingerprint(self.config, self.model_id)
+        self.perplexity_key = self.model_id
+        
         # Metrics
         self.total_detections = 0
+        self.total_partial_detections = 0
         self.total_processing_time_ms = 0
+        self.total_batch_real_tokens = 0
+        self.total_batch_padded_tokens = 0
+        self.last_batch_stats: Dict[str, Any] = {}
+        
+        if model is not None and tokenizer is not None and device is not None:
+            self.attach_model(model, tokenizer, device)
         
         logging.info(
             "AI Code Detector initialized",
             extra={
                 "device": str(device),
+                "model_ready": self.model_ready,
                 "perplexity_threshold": self.config.perplexity_ai_threshold,
                 "high_confidence_threshold": self.config.high_confidence_threshold,
             }
         )
     
+    def attach_model(
+        self,
+        model: PreTrainedModel,
+        tokenizer: PreTrainedTokenizerBase,
+        device: torch.device,
+    ):
+        """Install the perplexity model (e.g. once a background load finishes)."""
+        # Set pad token if not set
+        if tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
+        
+        model_id = getattr(model, "name_or_path", "") or type(model).__name__
+        quantization = getattr(model, "quantization", "none")
+        if quantization != "none":
+            model_id = f"{model_id}#{quantization}"
+        
+        backend = create_backend(
+            self.config.inference_backend,
+            model,
+            device,
+            self.config.backend_dir or ModelLoaderConfig.from_env().models_root,
+            self.config.loss_chunk_tokens,
+        )
+        
+        # Micro-batcher (worker thread starts on first submit)
+        batcher: Optional[PerplexityBatcher] = None
+        if self.config.enable_micro_batching:
+            batcher = PerplexityBatcher(
+                model=backend,
+                tokenizer=tokenizer,
+                device=device,
+                config=BatchSchedulerConfig(
+                    max_batch_size=self.config.max_batch_size,
+                    max_wait_ms=self.config.max_batch_wait_ms,
+                    max_tokens=self.config.max_tokens_for_perplexity,
+                ),
+            )
+        
+        self.tokenizer = tokenizer
+        self.device = device
+        self.backend = backend
+        self.batcher = batcher
+        self.model_id = model_id
+        self.config_fingerprint = config_fingerprint(self.config, model_id)
+        self.perplexity_key = model_id
+        if self.config.enable_sliding_window:
+            self.perplexity_key = f"{model_id}#sw{self.config.sliding_window_stride}"
+        
+        # Last: detect() switches to the full path once the model is visible
+        self.model = model
+        
+        logging.info(f"AI detector model attached ({backend.name} backend)", extra={"model_id": model_id, "device": str(device), "backend": backend.name})
+    
+    @property
+    def model_ready(self) -> bool:
+        return self.model is not None
+    
+    def _perplexity_to_score(self, perplexity: float) -> float:
+        """Map perplexity to a 0-1 score (lower perplexity = higher score)."""
+        if perplexity < self.config.perplexity_ai_threshold:
+            normalized_score = 1.0  # Very AI-like
+        elif perplexity > self.config.perplexity_human_threshold:
+            normalized_score = 0.0  # Very human-like
+        else:
+            # Linear interpolation between thresholds
+            range_size = self.config.perplexity_human_threshold - self.config.perplexity_ai_threshold
+            normalized_score = 1.0 - (perplexity - self.config.perplexity_ai_threshold) / range_size
+        
+        return max(0.0, min(1.0, normalized_score))
+    
+    def _loss_to_perplexity(self, loss: float) -> float:
+        """Perplexity = exp(loss), clamped to [1, 500]."""
+        perplexity = math.exp(min(loss, 700.0))
+        return max(1.0, min(perplexity, 500.0))
+    
+    def _window_perplexity(
+        self,
+        input_ids: Union[List[int], np.ndarray],
+        code: Optional[str] = None,
+        offsets: Optional[List[Tuple[int, int]]] = None,
+    ) -> PerplexityDetail:
+        """
+        Perplexity over strided sliding windows, all in one forward pass.
+
+        A sequence within max_tokens_for_perplexity is a single window (the
+        plain perplexity). With `code`, the per-token losses of the same
+        pass are kept as the token surprisal heatmap.
+        """
+        windows = plan_windows(
+            len(input_ids),
+            self.config.max_tokens_for_perplexity,
+            self.config.sliding_window_stride,
+        )
+        token_losses = compute_window_token_losses(
+            self.backend, input_ids, windows, self.tokenizer.pad_token_id, self.device
+        )
+        nll_sums, counts = summarize_windows(token_losses, windows)
+        
+        detail = PerplexityDetail(
+            perplexity=self._loss_to_perplexity(sum(nll_sums) / max(sum(counts), 1)),
+        )
+        if len(windows) > 1:
+            detail.window_perplexities = [
+                round(self._loss_to_perplexity(nll / count), 2) if count else None
+                for nll, count in zip(nll_sums, counts)
+            ]
+        if code is not None:
+            detail.token_surprisal = build_token_surprisal(code, token_losses, offsets)
+        
+        return detail
+    
+    def _surprisal_perplexity(self, code: str) -> Optional[PerplexityDetail]:
+        """Perplexity plus per-token surprisal from the same (unbatched) forward pass."""
+        encoded = self.tokenizer(
+            code,
+            truncation=True,
+            max_length=self.max_scored_tokens,
+            padding=False,
+            add_special_tokens=True,
+            return_offsets_mapping=self.tokenizer.is_fast,
+        )
+        
+        if len(encoded["input_ids"]) == 0:
+            return None
+        
+        return self._window_perplexity(
+            encoded["input_ids"], code=code, offsets=encoded.get("offset_mapping")
+        )
+    
+    def _encode(self, codes: List[str], normalized_hashes: List[str]) -> List[np.ndarray]:
+        """Token ids (int32 arrays) for many codes, via the token cache when enabled."""
+        if self.token_cache is not None:
+            return self.token_cache.encode(self.tokenizer, codes, normalized_hashes, self.max_scored_tokens)
+        return encode_batch(self.tokenizer, codes, self.max_scored_tokens)
+    
+    def _model_perplexity(
+        self,
+        code: str,
+        token_surprisal: bool = False,
+        normalized_hash: Optional[str] = None,
+    ) -> Optional[PerplexityDetail]:
+        """Run the model on one code string; None if it tokenizes to nothing."""
+        if token_surprisal:
+            return self._surprisal_perplexity(code)
+        
+        input_ids = self._encode([code], [normalized_hash or hash_text(code)])[0]
+        
+        # Check token count
+        if len(input_ids) == 0:
+            return None
+        
+        # Long inputs (sliding-window mode): every window of this submission in one batched pass
+        if len(input_ids) > self.config.max_tokens_for_perplexity:
+            return self._window_perplexity(input_ids)
+        
+        if self.batcher is not None:
+            # Queued with concurrent requests into one padded forward pass
+            loss = self.batcher.compute_loss(input_ids)
+            return PerplexityDetail(self._loss_to_perplexity(loss))
+        
+        # Single unpadded forward pass
+        inputs, attention_mask = pad_batch([input_ids], self.tokenizer.pad_token_id, self.device)
+        loss = compute_sequence_losses(self.backend, inputs, attention_mask).item()
+        
+        return PerplexityDetail(self._loss_to_perplexity(loss))
+    
     def _calculate_perplexity(self, code: str) -> Tuple[float, float]:
+        detail, perplexity_score = self._calculate_perplexity_detail(code)
+        return detail.perplexity, perplexity_score
+    
+    def _calculate_perplexity_detail(
+        self,
+        code: str,
+        token_surprisal: bool = False,
+    ) -> Tuple[PerplexityDetail, float]:
+        """
+        Perplexity (with per-window values when computed) and its score.
 
+        Store hits only carry the aggregate perplexity, so the store is not
+        read when `token_surprisal` asks for per-token values.
+        """
         try:
             # Handle empty code
             if not code or not code.strip():
                 logging.warning("Empty code provided for perplexity calculation")
-                return 50.0, 0.5  # Neutral
+                return PerplexityDetail(50.0), 0.5  # Neutral
             
-            inputs = self.tokenizer(
-                code,
-                return_tensors="pt",
-                truncation=True,
-                max_length=self.config.max_tokens_for_perplexity,
-                padding=False,
-                add_special_tokens=True
-            ).to(self.device)
+            # Persistent store first: survives restarts and redeploys
+            normalized_hash = hash_text(code)
+            if self.perplexity_store is not None and not token_surprisal:
+                stored = self.perplexity_store.get(
+                    normalized_hash, self.perplexity_key, self.max_scored_tokens
+                )
+                if stored is not None:
+                    return PerplexityDetail(stored), self._perplexity_to_score(stored)
             
-            # Check token count
-            if inputs["input_ids"].shape[1] == 0:
+            detail = self._model_perplexity(code, token_surprisal=token_surprisal, normalized_hash=normalized_hash)
+            if detail is None:
                 logging.warning("Tokenization produced empty sequence")
-                return 50.0, 0.5
-            
-            # Forward pass with proper labels
-            with torch.no_grad():
-                outputs = self.model(**inputs, labels=inputs["input_ids"])
-                loss = outputs.loss
-            
-            # Perplexity = exp(loss)
-            perplexity = torch.exp(loss).item()
-            
-            # Clamp extreme values
-            perplexity = max(1.0, min(perplexity, 500.0))
+                return PerplexityDetail(50.0), 0.5
             
-            # Normalize to 0-1 score (lower perplexity = higher score)
-            if perplexity < self.config.perplexity_ai_threshold:
-                normalized_score = 1.0  # Very AI-like
-            elif perplexity > self.config.perplexity_human_threshold:
-                normalized_score = 0.0  # Very human-like
-            else:
-                # Linear interpolation between thresholds
-                range_size = self.config.perplexity_human_threshold - self.config.perplexity_ai_threshold
-                normalized_score = 1.0 - (perplexity - self.config.perplexity_ai_threshold) / range_size
-            
-            normalized_score = max(0.0, min(1.0, normalized_score))
+            if self.perplexity_store is not None:
+                self.perplexity_store.put(
+                    normalized_hash, self.perplexity_key, self.max_scored_tokens, detail.perplexity
+                )
             
-            return perplexity, normalized_score
+            return detail, self._perplexity_to_score(detail.perplexity)
         
         except Exception as e:
             logging.warning(f"Perplexity calculation failed: {e}")
             # Return neutral values on failure
-            return 50.0, 0.5
+            return PerplexityDetail(50.0), 0.5
    
-    def _extract_ast_features(self, code: str) -> Tuple[Dict[str, Any], float]:
+    def _score_ast_features(self, features: Dict[str, Any]) -> float:
+        """Scoring: low variance + low complexity = AI-like."""
+        ast_score = 0.0
+        
+        # Low depth variance suggests uniform structure (AI-like)
+        if features["depth_variance"] < self.config.ast_depth_variance_threshold:
+            ast_score += 0.35
+        
+        # Low complexity suggests simple structure (AI-like)
+        if features["complexity"] < self.config.ast_complexity_threshold:
+            ast_score += 0.25
+        
+        # High node diversity suggests varied structure (human-like)
+        if features["node_diversity"] < 10:
+            ast_score += 0.20
+        
+        # Lack of error handling (AI sometimes skips this)
+        if not features["has_error_handling"] and features["num_functions"] > 0:
+            ast_score += 0.10
+        
+        # Simple structure (single function, no classes)
+        if features["num_functions"] <= 1 and features["num_classes"] == 0:
+            ast_score += 0.10
+        
+        return max(0.0, min(1.0, ast_score))
+    
+    def _ast_features_from_stats(self, stats: AstStats) -> Tuple[Dict[str, Any], float]:
+        """AST features from single-pass tree statistics."""
+        depths = stats.depths
+        
+        features = {
+            "max_depth": int(depths.max()) if depths.size else 0,
+            "avg_depth": round(float(depths.mean()) if depths.size else 0.0, 2),
+            "depth_variance": round(float(depths.var()) if depths.size > 1 else 0.0, 2),
+            "complexity": stats.decision_nodes,
+            "node_diversity": len(stats.node_types),
+            "has_error_handling": stats.has_error_handling,
+            "num_functions": stats.num_functions,
+            "num_classes": stats.num_classes,
+        }
+        
+        return features, self._score_ast_features(features)
+    
+    def _extract_ast_features(
+        self,
+        code: str,
+        context: Optional[AnalysisContext] = None
+    ) -> Tuple[Dict[str, Any], float]:
 
         try:
             # Handle empty code
             if not code or not code.strip():
                 return {"error": "empty_code"}, 0.5
             
-            tree = ast.parse(code)
-            
-            # Calculate node depths
-            depths = []
-            
-            def get_depth(node, depth=0):
-                depths.append(depth)
-                for child in ast.iter_child_nodes(node):
-                    get_depth(child, depth + 1)
+            # Reuse the shared parse when it was built from this exact code
+            if context is not None and context.code == code:
+                if context.stats is None:
+                    logging.warning(f"AST parsing failed (syntax error): {context.syntax_error}")
+                    return {"error": "syntax_error"}, 0.5  # Neutral on parse failure
+                return self._ast_features_from_stats(context.stats)
             
-            get_depth(tree)
-            
-            # Metrics with safe defaults
-            max_depth = max(depths) if depths else 0
-            avg_depth = float(np.mean(depths)) if depths else 0.0
-            depth_variance = float(np.var(depths)) if len(depths) > 1 else 0.0
-            
-            # Cyclomatic complexity (simplified: count decision nodes)
-            complexity = sum(
-                1 for node in ast.walk(tree)
-                if isinstance(node, (ast.If, ast.While, ast.For, ast.ExceptHandler))
-            )
-            
-            # Node diversity (unique node types)
-            node_types = set(type(node).__name__ for node in ast.walk(tree))
-            node_diversity = len(node_types)
-            
-            # Error handling presence
-            has_error_handling = any(
-                isinstance(node, (ast.Try, ast.ExceptHandler))
-                for node in ast.walk(tree)
-            )
-            
-            # Function and class counts
-            num_functions = sum(1 for node in ast.walk(tree) if isinstance(node, ast.FunctionDef))
-            num_classes = sum(1 for node in ast.walk(tree) if isinstance(node, ast.ClassDef))
-            
-            features = {
-                "max_depth": max_depth,
-                "avg_depth": round(avg_depth, 2),
-                "depth_variance": round(depth_variance, 2),
-                "complexity": complexity,
-                "node_diversity": node_diversity,
-                "has_error_handling": has_error_handling,
-                "num_functions": num_functions,
-                "num_classes": num_classes,
-            }
-            
-            # Scoring: low variance + low complexity = AI-like
-            ast_score = 0.0
-            
-            # Low depth variance suggests uniform structure (AI-like)
-            if depth_variance < self.config.ast_depth_variance_threshold:
-                ast_score += 0.35
-            
-            # Low complexity suggests simple structure (AI-like)
-            if complexity < self.config.ast_complexity_threshold:
-                ast_score += 0.25
-            
-            # High node diversity suggests varied structure (human-like)
-            if node_diversity < 10:
-                ast_score += 0.20
-            
-            # Lack of error handling (AI sometimes skips this)
-            if not has_error_handling and num_functions > 0:
-                ast_score += 0.10
-            
-            # Simple structure (single function, no classes)
-            if num_functions <= 1 and num_classes == 0:
-                ast_score += 0.10
-            
-            ast_score = max(0.0, min(1.0, ast_score))
-            
-            return features, ast_score
+            return self._ast_features_from_stats(collect_ast_stats(ast.parse(code)))
         
         except SyntaxError as e:
             logging.warning(f"AST parsing failed (syntax error): {e}")
@@ -296,224 +561,482 @@ class AICodeDetector:
             logging.warning(f"AST feature extraction failed: {e}")
             return {"error": str(e)}, 0.5
     
-    def _analyze_style_patterns(self, code: str) -> Tuple[Dict[str, Any], float]:
+    def _score_style_features(self, features: np.ndarray) -> np.ndarray:
+        """Vectorized style scoring over rows of STYLE_FEATURE_COLUMNS."""
+        comment_ratio = features[:, 0]
+        avg_var_length = features[:, 1]
+        indent_variance = features[:, 2]
+        has_docstrings = features[:, 3] > 0
+        line_length_std = features[:, 6]
+        
+        # Scoring: low comments + consistent formatting = AI-like
+        style_score = np.zeros(len(features), dtype=np.float64)
+        
+        # Low comment ratio (AI often lacks comments)
+        style_score += np.where(comment_ratio < self.config.comment_ratio_threshold, 0.30, 0.0)
+        
+        # Variable naming (longer descriptive names = potentially AI)
+        style_score += np.where(avg_var_length > self.config.naming_length_threshold, 0.20, -0.10)
+        
+        # Perfect indentation (AI is very consistent)
+        style_score += np.where(indent_variance < 0.5, 0.25, 0.0)
+        
+        # Has docstrings (AI often includes these)
+        style_score += np.where(has_docstrings, 0.15, 0.0)
+        
+        # Very consistent line lengths
+        style_score += np.where(line_length_std < 10.0, 0.10, 0.0)
+        
+        return np.clip(style_score, 0.0, 1.0)
+    
+    def analyze_style_batch(self, codes: List[str]) -> List[Tuple[Dict[str, Any], float]]:
+        """
+        Style features and scores for many submissions at once.
 
+        Features come from one vectorized pass (style_feature_matrix in
+        style_features); single-submission analysis goes through the same
+        path, so batch and per-item results are identical.
+        """
         try:
-            # Handle empty code
-            if not code or not code.strip():
-                return {"error": "empty_code"}, 0.5
-            
-            lines = code.split('\n')
-            non_empty_lines = [line for line in lines if line.strip()]
-            
-            if not non_empty_lines:
-                return {"error": "no_content"}, 0.5
-            
-            # Comment ratio
-            comment_lines = sum(1 for line in lines if line.strip().startswith('#'))
-            comment_ratio = comment_lines / len(non_empty_lines)
-            
-            # Variable naming patterns
-            var_names = re.findall(r'\b[a-z_][a-z0-9_]*\b', code)
-            var_names = [v for v in var_names if not v.startswith('__') and v not in ['if', 'for', 'while', 'def', 'class', 'return', 'import']]
-            avg_var_length = float(np.mean([len(v) for v in var_names])) if var_names else 0.0
+            matrix, valid = style_feature_matrix(codes)
+            scores = self._score_style_features(matrix)
             
-            # Indentation consistency
-            indents = [len(line) - len(line.lstrip()) for line in non_empty_lines if line.strip() and not line.strip().startswith('#')]
-            indent_variance = float(np.var(indents)) if len(indents) > 1 else 0.0
-            
-            # Docstring presence
-            has_docstrings = '"""' in code or "'''" in code
-            
-            # Line length consistency
-            line_lengths = [len(line) for line in non_empty_lines]
-            avg_line_length = float(np.mean(line_lengths)) if line_lengths else 0.0
-            
-            features = {
-                "comment_ratio": round(comment_ratio, 3),
-                "avg_var_length": round(avg_var_length, 2),
-                "indent_variance": round(indent_variance, 2),
-                "has_docstrings": has_docstrings,
-                "avg_line_length": round(avg_line_length, 1),
-                "num_lines": len(non_empty_lines),
-            }
-            
-            # Scoring: low comments + consistent formatting = AI-like
-            style_score = 0.0
-            
-            # Low comment ratio (AI often lacks comments)
-            if comment_ratio < self.config.comment_ratio_threshold:
-                style_score += 0.30
-            
-            # Variable naming (longer descriptive names = potentially AI)
-            if avg_var_length > self.config.naming_length_threshold:
-                style_score += 0.20
-            else:
-                style_score -= 0.10  # Short names reduce AI likelihood
-            
-            # Perfect indentation (AI is very consistent)
-            if indent_variance < 0.5:
-                style_score += 0.25
-            
-            # Has docstrings (AI often includes these)
-            if has_docstrings:
-                style_score += 0.15
-            
-            # Very consistent line lengths
-            if line_lengths and float(np.std(line_lengths)) < 10.0:
-                style_score += 0.10
-            
-            style_score = max(0.0, min(1.0, style_score))
+            results: List[Tuple[Dict[str, Any], float]] = []
+            for row, is_valid, score in zip(matrix, valid, scores):
+                if not is_valid:
+                    results.append(({"error": "empty_code"}, 0.5))
+                    continue
+                
+                features = {
+                    "comment_ratio": round(float(row[0]), 3),
+                    "avg_var_length": round(float(row[1]), 2),
+                    "indent_variance": round(float(row[2]), 2),
+                    "has_docstrings": bool(row[3]),
+                    "avg_line_length": round(float(row[4]), 1),
+                    "num_lines": int(row[5]),
+                }
+                results.append((features, float(score)))
             
-            return features, style_score
+            return results
         
         except Exception as e:
             logging.warning(f"Style analysis failed: {e}")
-            return {"error": str(e)}, 0.5
+            return [({"error": str(e)}, 0.5) for _ in codes]
+    
+    def _analyze_style_patterns(self, code: str) -> Tuple[Dict[str, Any], float]:
+        return self.analyze_style_batch([code])[0]
   
-    def detect(self, code: str) -> DetectionResult:
-
+    def _validate_code(self, code: str) -> str:
+        """Validate input and truncate to max_code_length."""
+        if not code or not isinstance(code, str):
+            raise ValueError("Code must be a non-empty string")
+        
+        if not code.strip():
+            raise ValueError("Code cannot be empty or whitespace-only")
+        
+        if len(code) > self.config.max_code_length:
+            logging.warning(f"Code truncated from {len(code)} to {self.config.max_code_length}")
+            code = code[:self.config.max_code_length]
+        
+        return code
+    
+    def detect(
+        self,
+        code: str,
+        forms: Optional[NormalizedForms] = None,
+        context: Optional[AnalysisContext] = None,
+        token_surprisal: bool = False,
+    ) -> DetectionResult:
+        """
+        Detect AI-generated code.
+        
+        `forms` may carry the submission's precomputed normalizations and
+        `context` its shared parse tree statistics (both built once in
+        /analyze); `context.forms` is used when `forms` is not given.
+        `token_surprisal` also returns the per-token surprisal heatmap.
+        """
         start_time = time.time()
         original_length = len(code)
         
         try:
-            # Validate input
-            if not code or not isinstance(code, str):
-                raise ValueError("Code must be a non-empty string")
+            code = self._validate_code(code)
             
-            if not code.strip():
-                raise ValueError("Code cannot be empty or whitespace-only")
+            if context is not None:
+                forms = forms or context.forms
             
-            if len(code) > self.config.max_code_length:
-                logging.warning(f"Code truncated from {len(code)} to {self.config.max_code_length}")
-                code = code[:self.config.max_code_length]
+            # Normalize code (light); shared forms are only valid if nothing was truncated
+            if forms is not None and len(code) == original_length:
+                normalized_code = forms.light
+            else:
+                normalized_code = self.normalizer.normalize(code, "light")
             
-            # Normalize code (light)
-            normalized_code = self.normalizer.normalize(code, "light")
-            normalized_length = len(normalized_code)
+            # Model still loading: AST/style verdict, never cached
+            if not self.model_ready:
+                return self._build_result(
+                    code,
+                    normalized_code,
+                    original_length,
+                    50.0,  # Neutral
+                    0.5,
+                    start_time,
+                    context=context,
+                    partial=True,
+                )
             
-            # Calculate all signals
-            perplexity, perplexity_score = self._calculate_perplexity(normalized_code)
-            ast_features, ast_score = self._extract_ast_features(code)
-            style_features, style_score = self._analyze_style_patterns(code)
+            # Repeat submissions skip tokenization and the forward pass; AST/style
+            # read the raw code (comments, docstrings) so they are always recomputed
+            cache_key = self._cache_key(normalized_code, token_surprisal)
+            cached = self._get_cached(cache_key)
+            if cached is not None:
+                detail, perplexity_score = cached
+            else:
+                detail, perplexity_score = self._calculate_perplexity_detail(normalized_code, token_surprisal)
+                if self.cache is not None:
+                    self.cache.put(cache_key, (detail, perplexity_score))
+            
+            # Heatmap lines are scored on the normalized code; report them as submission lines
+            if detail.token_surprisal is not None:
+                detail = replace(detail, token_surprisal=detail.token_surprisal.map_to_source(code))
             
-            # Weighted combined score
+            return self._build_result(
+                code,
+                normalized_code,
+                original_length,
+                detail.perplexity,
+                perplexity_score,
+                start_time,
+                context=context,
+                detail=detail,
+            )
+        
+        except ValueError as e:
+            logging.error(f"Validation error in AI detection: {e}")
+            raise CustomException(f"AI_DETECTION_VALIDATION_ERROR: {str(e)}", sys)
+        
+        except Exception as e:
+            logging.error(f"AI detection failed: {e}")
+            raise CustomException(f"AI_DETECTION_ERROR: {str(e)}", sys)
+    
+    def _cache_key(self, normalized_code: str, token_surprisal: bool = False) -> str:
+        # Heatmap details are larger, so they live under their own namespace
+        namespace = "ai+surprisal" if token_surprisal else "ai"
+        return ResultCache.make_key(namespace, self.config_fingerprint, normalized_code)
+    
+    def _get_cached(self, cache_key: str) -> Optional[Tuple[PerplexityDetail, float]]:
+        """
+        Cached (perplexity detail, perplexity score) for a normalized code, or None.
+        
+        Only the perplexity is cached under the light-normalized hash: it is
+        computed from the normalized text, while the AST and style features
+        depend on comments / docstrings that light normalization strips.
+        """
+        if self.cache is None:
+            return None
+        
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            logging.info("AI perplexity served from cache")
+        return cached
+    
+    def _build_result(
+        self,
+        code: str,
+        normalized_code: str,
+        original_length: int,
+        perplexity: float,
+        perplexity_score: float,
+        start_time: Optional[float],
+        context: Optional[AnalysisContext] = None,
+        style: Optional[Tuple[Dict[str, Any], float]] = None,
+        detail: Optional[PerplexityDetail] = None,
+        partial: bool = False,
+    ) -> DetectionResult:
+        """
+        Combine perplexity with AST/style signals into a verdict.
+        
+        A `partial` result ignores the perplexity arguments and renormalizes
+        the AST/style weights. With `start_time` None the caller times the
+        result and accounts for it (detect_batch).
+        """
+        normalized_length = len(normalized_code)
+        
+        # Calculate remaining signals
+        ast_features, ast_score = self._extract_ast_features(code, context)
+        style_features, style_score = style if style is not None else self._analyze_style_patterns(code)
+        
+        # Weighted combined score
+        if partial:
+            weighted_score = (
+                self.config.weight_ast * ast_score +
+                self.config.weight_style * style_score
+            ) / (self.config.weight_ast + self.config.weight_style)
+        else:
             weighted_score = (
                 self.config.weight_perplexity * perplexity_score +
                 self.config.weight_ast * ast_score +
                 self.config.weight_style * style_score
             )
-            
-            # Determine risk level and verdict
-            if weighted_score >= self.config.high_confidence_threshold:
-                risk_level = "HIGH"
-                is_ai_generated = True
-            elif weighted_score >= self.config.medium_confidence_threshold:
-                risk_level = "MEDIUM"
-                is_ai_generated = True
-            elif weighted_score >= self.config.low_confidence_threshold:
-                risk_level = "LOW"
-                is_ai_generated = False
+        
+        # Determine risk level and verdict
+        if weighted_score >= self.config.high_confidence_threshold:
+            risk_level = "HIGH"
+            is_ai_generated = True
+        elif weighted_score >= self.config.medium_confidence_threshold:
+            risk_level = "MEDIUM"
+            is_ai_generated = True
+        elif weighted_score >= self.config.low_confidence_threshold:
+            risk_level = "LOW"
+            is_ai_generated = False
+        else:
+            risk_level = "CLEAN"
+            is_ai_generated = False
+        
+        # Conflict detection
+        conflict_detected = (
+            not partial and
+            perplexity < self.config.conflict_perplexity_threshold and
+            ast_score < self.config.conflict_ast_threshold
+        )
+        
+        # Generate reasoning
+        reasoning_parts = []
+        if partial:
+            reasoning_parts.append("Partial result: perplexity model not loaded yet, AST/style signals only")
+        elif perplexity < self.config.perplexity_ai_threshold:
+            reasoning_parts.append(f"Very low perplexity ({perplexity:.1f}) indicates AI-like patterns")
+        elif perplexity < self.config.perplexity_human_threshold:
+            reasoning_parts.append(f"Moderate perplexity ({perplexity:.1f}) suggests some AI characteristics")
+        
+        if ast_score > 0.5:
+            reasoning_parts.append("Structural uniformity suggests AI generation")
+        if style_score > 0.5:
+            reasoning_parts.append("Style patterns consistent with AI-generated code")
+        if conflict_detected:
+            reasoning_parts.append("⚠️ Conflict: Low perplexity but human-like structure - manual review recommended")
+        
+        reasoning = "; ".join(reasoning_parts) if reasoning_parts else "Likely human-written code"
+        
+        # Recommendations
+        recommendations = []
+        if is_ai_generated:
+            if risk_level == "HIGH":
+                recommendations.append("FLAG_FOR_REVIEW: High confidence AI detection")
+            elif risk_level == "MEDIUM":
+                recommendations.append("MONITOR: Moderate AI signals detected")
             else:
-                risk_level = "CLEAN"
-                is_ai_generated = False
-            
-            # Conflict detection
-            conflict_detected = (
-                perplexity < self.config.conflict_perplexity_threshold and
-                ast_score < self.config.conflict_ast_threshold
+                recommendations.append("LOW_PRIORITY: Weak AI signals, likely acceptable")
+        
+        if conflict_detected:
+            recommendations.append("MANUAL_REVIEW: Conflicting signals require human judgment")
+        
+        if not recommendations:
+            recommendations.append("ACCEPT: No significant AI indicators detected")
+        
+        # Processing time
+        processing_time_ms = int((time.time() - start_time) * 1000) if start_time is not None else 0
+        
+        # Update metrics
+        self.total_detections += 1
+        self.total_processing_time_ms += processing_time_ms
+        if partial:
+            self.total_partial_detections += 1
+        
+        result = DetectionResult(
+            is_ai_generated=is_ai_generated,
+            confidence=weighted_score,
+            risk_level=risk_level,
+            perplexity_score=round(perplexity_score, 3),
+            ast_score=round(ast_score, 3),
+            style_score=round(style_score, 3),
+            weighted_score=round(weighted_score, 3),
+            perplexity=round(perplexity, 2),
+            ast_features=ast_features,
+            style_features=style_features,
+            conflict_detected=conflict_detected,
+            code_length=original_length,
+            normalized_length=normalized_length,
+            processing_time_ms=processing_time_ms,
+            reasoning=reasoning,
+            recommendations=recommendations,
+            window_perplexities=detail.window_perplexities if detail is not None else None,
+            token_surprisal=detail.token_surprisal if detail is not None else None,
+            partial=partial,
+        )
+        
+        # Log result
+        logging.info(
+            "AI detection complete",
+            extra={
+                "partial": partial,
+                "is_ai": is_ai_generated,
+                "confidence": round(weighted_score, 3),
+                "risk_level": risk_level,
+                "perplexity": round(perplexity, 2),
+                "processing_time_ms": processing_time_ms if start_time is not None else None,
+            }
+        )
+        
+        return result
+   
+    def _calculate_perplexity_batch(self, codes: List[str]) -> List[Tuple[PerplexityDetail, float]]:
+        """
+        Perplexity for many codes with one forward pass per length bucket.
+        
+        Inputs longer than max_tokens_for_perplexity (sliding-window mode
+        only) get their own windowed pass. Updates `last_batch_stats` with
+        padding efficiency (real tokens / padded tokens) for tuning bucket
+        boundaries.
+        """
+        results: List[Tuple[PerplexityDetail, float]] = [(PerplexityDetail(50.0), 0.5)] * len(codes)
+        
+        hashes = [hash_text(code) for code in codes]
+        encoded = self._encode(codes, hashes)
+        
+        # Empty sequences keep the neutral default
+        scorable = [i for i, ids in enumerate(encoded) if len(ids) and codes[i].strip()]
+        
+        # Serve what we can from the persistent store
+        if self.perplexity_store is not None:
+            stored = self.perplexity_store.get_many(
+                [hashes[i] for i in scorable], self.perplexity_key, self.max_scored_tokens
             )
+            for i in scorable:
+                if hashes[i] in stored:
+                    results[i] = (PerplexityDetail(stored[hashes[i]]), self._perplexity_to_score(stored[hashes[i]]))
+            scorable = [i for i in scorable if hashes[i] not in stored]
+        
+        # Long inputs (sliding-window mode): one windowed pass each
+        long_inputs = [i for i in scorable if len(encoded[i]) > self.config.max_tokens_for_perplexity]
+        if long_inputs:
+            computed_long: Dict[str, float] = {}
+            for i in long_inputs:
+                try:
+                    detail = self._window_perplexity(encoded[i])
+                except Exception as e:
+                    logging.warning(f"Windowed perplexity failed: {e}")
+                    continue
+                results[i] = (detail, self._perplexity_to_score(detail.perplexity))
+                computed_long[hashes[i]] = detail.perplexity
+            if self.perplexity_store is not None:
+                self.perplexity_store.put_many(computed_long, self.perplexity_key, self.max_scored_tokens)
+            scorable = [i for i in scorable if len(encoded[i]) <= self.config.max_tokens_for_perplexity]
+        
+        lengths = [len(encoded[i]) for i in scorable]
+        
+        buckets = bucket_by_length(
+            lengths,
+            self.config.batch_bucket_size,
+            self.config.max_batch_tokens,
+        )
+        
+        real_tokens = 0
+        padded_tokens = 0
+        
+        for bucket in buckets:
+            indices = [scorable[b] for b in bucket]
+            sequences = [encoded[i] for i in indices]
             
-            # Generate reasoning
-            reasoning_parts = []
-            if perplexity < self.config.perplexity_ai_threshold:
-                reasoning_parts.append(f"Very low perplexity ({perplexity:.1f}) indicates AI-like patterns")
-            elif perplexity < self.config.perplexity_human_threshold:
-                reasoning_parts.append(f"Moderate perplexity ({perplexity:.1f}) suggests some AI characteristics")
-            
-            if ast_score > 0.5:
-                reasoning_parts.append("Structural uniformity suggests AI generation")
-            if style_score > 0.5:
-                reasoning_parts.append("Style patterns consistent with AI-generated code")
-            if conflict_detected:
-                reasoning_parts.append("⚠️ Conflict: Low perplexity but human-like structure - manual review recommended")
-            
-            reasoning = "; ".join(reasoning_parts) if reasoning_parts else "Likely human-written code"
-            
-            # Recommendations
-            recommendations = []
-            if is_ai_generated:
-                if risk_level == "HIGH":
-                    recommendations.append("FLAG_FOR_REVIEW: High confidence AI detection")
-                elif risk_level == "MEDIUM":
-                    recommendations.append("MONITOR: Moderate AI signals detected")
-                else:
-                    recommendations.append("LOW_PRIORITY: Weak AI signals, likely acceptable")
-            
-            if conflict_detected:
-                recommendations.append("MANUAL_REVIEW: Conflicting signals require human judgment")
-            
-            if not recommendations:
-                recommendations.append("ACCEPT: No significant AI indicators detected")
-            
-            # Processing time
-            processing_time_ms = int((time.time() - start_time) * 1000)
-            
-            # Update metrics
-            self.total_detections += 1
-            self.total_processing_time_ms += processing_time_ms
+            real_tokens += sum(len(seq) for seq in sequences)
+            padded_tokens += len(sequences) * max(len(seq) for seq in sequences)
             
-            result = DetectionResult(
-                is_ai_generated=is_ai_generated,
-                confidence=weighted_score,
-                risk_level=risk_level,
-                perplexity_score=round(perplexity_score, 3),
-                ast_score=round(ast_score, 3),
-                style_score=round(style_score, 3),
-                weighted_score=round(weighted_score, 3),
-                perplexity=round(perplexity, 2),
-                ast_features=ast_features,
-                style_features=style_features,
-                conflict_detected=conflict_detected,
-                code_length=original_length,
-                normalized_length=normalized_length,
-                processing_time_ms=processing_time_ms,
-                reasoning=reasoning,
-                recommendations=recommendations
-            )
+            try:
+                input_ids, attention_mask = pad_batch(
+                    sequences, self.tokenizer.pad_token_id, self.device
+                )
+                losses = compute_sequence_losses(self.backend, input_ids, attention_mask).tolist()
+            except Exception as e:
+                logging.warning(f"Perplexity bucket failed ({len(indices)} items): {e}")
+                continue
             
-            # Log result
-            logging.info(
-                "AI detection complete",
-                extra={
-                    "is_ai": is_ai_generated,
-                    "confidence": round(weighted_score, 3),
-                    "risk_level": risk_level,
-                    "perplexity": round(perplexity, 2),
-                    "processing_time_ms": processing_time_ms,
-                }
-            )
+            computed: Dict[str, float] = {}
+            for i, loss in zip(indices, losses):
+                perplexity = self._loss_to_perplexity(loss)
+                results[i] = (PerplexityDetail(perplexity), self._perplexity_to_score(perplexity))
+                computed[hashes[i]] = perplexity
             
-            return result
+            if self.perplexity_store is not None:
+                self.perplexity_store.put_many(
+                    computed, self.perplexity_key, self.max_scored_tokens
+                )
         
-        except ValueError as e:
-            logging.error(f"Validation error in AI detection: {e}")
-            raise CustomException(f"AI_DETECTION_VALIDATION_ERROR: {str(e)}", sys)
+        padding_efficiency = round(real_tokens / padded_tokens, 3) if padded_tokens else 1.0
+        self.last_batch_stats = {
+            "num_sequences": len(scorable),
+            "num_buckets": len(buckets),
+            "real_tokens": real_tokens,
+            "padded_tokens": padded_tokens,
+            "padding_efficiency": padding_efficiency,
+        }
+        self.total_batch_real_tokens += real_tokens
+        self.total_batch_padded_tokens += padded_tokens
         
-        except Exception as e:
-            logging.error(f"AI detection failed: {e}")
-            raise CustomException(f"AI_DETECTION_ERROR: {str(e)}", sys)
-   
+        logging.info("Batch perplexity complete", extra=self.last_batch_stats)
+        
+        return results
+    
     def detect_batch(self, codes: List[str]) -> List[Optional[DetectionResult]]:
-
-        results = []
+        """
+        Detect many submissions, sharing one perplexity pass per length bucket.
+        
+        Items are not timed individually: each result's processing_time_ms is
+        the batch wall time divided by the number of results, and the batch
+        time is counted once in the metrics (see `last_batch_stats`).
+        """
+        start_time = time.time()
+        self.last_batch_stats = {}
+        results: List[Optional[DetectionResult]] = [None] * len(codes)
+        
+        # Validate and normalize; failures stay None
+        prepared: List[Tuple[int, str, str]] = []
         for idx, code in enumerate(codes):
             try:
-                result = self.detect(code)
-                results.append(result)
+                valid_code = self._validate_code(code)
+                normalized_code = self.normalizer.normalize(valid_code, "light")
+                prepared.append((idx, valid_code, normalized_code))
             except Exception as e:
                 logging.warning(f"Batch detection failed at index {idx}: {e}")
-                results.append(None)
+        
+        if not prepared:
+            return results
+        
+        # Model still loading: AST/style verdicts, never cached
+        partial = not self.model_ready
+        if partial:
+            perplexities = [(PerplexityDetail(50.0), 0.5)] * len(prepared)
+        else:
+            # Cached perplexities skip the model; AST/style are always recomputed
+            perplexities = [self._get_cached(self._cache_key(norm)) for _, _, norm in prepared]
+            missing = [i for i, cached in enumerate(perplexities) if cached is None]
+            if missing:
+                computed = self._calculate_perplexity_batch([prepared[i][2] for i in missing])
+                for i, value in zip(missing, computed):
+                    perplexities[i] = value
+                    if self.cache is not None:
+                        self.cache.put(self._cache_key(prepared[i][2]), value)
+        styles = self.analyze_style_batch([valid_code for _, valid_code, _ in prepared])
+        
+        for (idx, valid_code, normalized_code), (detail, perplexity_score), style in zip(prepared, perplexities, styles):
+            try:
+                results[idx] = self._build_result(
+                    valid_code,
+                    normalized_code,
+                    len(codes[idx]),
+                    detail.perplexity,
+                    perplexity_score,
+                    None,
+                    style=style,
+                    detail=detail,
+                    partial=partial,
+                )
+            except Exception as e:
+                logging.warning(f"Batch detection failed at index {idx}: {e}")
+        
+        built = [result for result in results if result is not None]
+        batch_time_ms = int((time.time() - start_time) * 1000)
+        self.total_processing_time_ms += batch_time_ms
+        for result in built:
+            result.processing_time_ms = round(batch_time_ms / len(built))
+        self.last_batch_stats.update({"batch_items": len(built), "batch_time_ms": batch_time_ms})
         
         return results
   
@@ -524,16 +1047,47 @@ class AICodeDetector:
             if self.total_detections > 0 else 0.0
         )
         
-        return {
+        metrics = {
+            "model_ready": self.model_ready,
             "total_detections": self.total_detections,
+            "total_partial_detections": self.total_partial_detections,
             "total_processing_time_ms": self.total_processing_time_ms,
             "avg_processing_time_ms": avg_time,
         }
+        
+        if self.batcher is not None:
+            metrics["batching"] = self.batcher.get_metrics()
+        
+        if self.cache is not None:
+            metrics["cache"] = self.cache.get_metrics()
+        
+        if self.perplexity_store is not None:
+            metrics["perplexity_store"] = self.perplexity_store.get_metrics()
+        
+        if self.token_cache is not None:
+            metrics["token_cache"] = self.token_cache.get_metrics()
+        
+        if self.total_batch_padded_tokens > 0:
+            metrics["batch_padding_efficiency"] = round(
+                self.total_batch_real_tokens / self.total_batch_padded_tokens, 3
+            )
+        
+        return metrics
     
     def reset_metrics(self):
         """Reset metrics counters."""
         self.total_detections = 0
+        self.total_partial_detections = 0
         self.total_processing_time_ms = 0
+        self.total_batch_real_tokens = 0
+        self.total_batch_padded_tokens = 0
+    
+    def close(self):
+        """Stop background workers and close the on-disk cache."""
+        if self.batcher is not None:
+            self.batcher.stop()
+        if self.perplexity_store is not None:
+            self.perplexity_store.close()
 
 
 if __name__ == "__main__":
@@ -1,14 +1,30 @@
 from __future__ import annotations
 import sys
-from typing import Optional, Dict, Any, List
+from types import MappingProxyType
+from typing import Optional, Dict, Any, List, Mapping, Tuple, Sequence, Union
 from dataclasses import dataclass, field
 
+import numpy as np
+
 from src.logger import logging
 from src.exception import CustomException
 from src.ml_core.code_detector import DetectionResult
 from src.ml_core.plagiarism_detector import PlagiarismResult
 
 
+# Risk tiers, lowest first (index = tier used by decide_batch)
+RISK_LEVELS = ("NONE", "LOW", "MEDIUM", "HIGH")
+
+# Rationale per overall tier, and the suffix added on conflicting signals
+TIER_RATIONALES = (
+    "No significant risk detected—accept submission",
+    "Low risk detected—monitoring suggested",
+    "Medium risk detected by AI or Plagiarism detector",
+    "High risk detected by AI or Plagiarism detector",
+)
+CONFLICT_SUFFIX = " | Conflict between AI and Plagiarism signals; manual review recommended."
+
+
 @dataclass
 class DecisionConfig:
     """
@@ -50,6 +66,28 @@ class DecisionConfig:
             raise ValueError(f"Invalid mode: {self.mode}")
 
 
+@dataclass(frozen=True)
+class PolicyTable:
+    """Actions of one policy mode, compiled once from DecisionConfig.policy_actions."""
+    accept: str
+    flag: str
+    monitor: str
+    block: str
+
+
+def compile_policies(config: DecisionConfig) -> Mapping[str, PolicyTable]:
+    """Read-only mode -> PolicyTable map (later edits to `config` do not leak in)."""
+    return MappingProxyType({
+        mode: PolicyTable(
+            accept=actions["accept"],
+            flag=actions["flag"],
+            monitor=actions["monitor"],
+            block=actions["block"],
+        )
+        for mode, actions in config.policy_actions.items()
+    })
+
+
 @dataclass
 class DecisionResult:
 
@@ -59,42 +97,92 @@ class DecisionResult:
     details: Dict[str, Any] = field(default_factory=dict)
 
 
+@dataclass
+class BatchDecision:
+    """Column-wise decide() output for N submissions (one array entry per row)."""
+    action: np.ndarray  # str
+    rationale: np.ndarray  # str
+    combined_confidence: np.ndarray  # float64
+    ai_risk: np.ndarray  # str, one of RISK_LEVELS
+    plag_risk: np.ndarray  # str, one of RISK_LEVELS
+    conflict: np.ndarray  # bool
+
+    def __len__(self) -> int:
+        return len(self.action)
+
+    def to_records(self) -> List[Dict[str, Any]]:
+        return [
+            {
+                "action": str(self.action[i]),
+                "rationale": str(self.rationale[i]),
+                "combined_confidence": float(self.combined_confidence[i]),
+                "ai_risk": str(self.ai_risk[i]),
+                "plag_risk": str(self.plag_risk[i]),
+                "conflict": bool(self.conflict[i]),
+            }
+            for i in range(len(self))
+        ]
+
+
 class DecisionEngine:
+    """
+    Policy-aware verdicts from AI and plagiarism confidences.
+
+    Thresholds and per-mode policy tables are compiled once at construction
+    and never mutated afterwards, so a single engine can serve concurrent
+    requests in different modes: the mode is an argument of decide(), not
+    engine state.
+    """
 
     def __init__(self, config: Optional[DecisionConfig] = None):
         self.config = config or DecisionConfig()
         self.config.validate()
+
+        # Immutable snapshot used on the hot path
+        self._policies = compile_policies(self.config)
+        self._ai_thresholds: Tuple[float, float] = (self.config.ai_high_threshold, self.config.ai_medium_threshold)
+        self._plag_thresholds: Tuple[float, float] = (self.config.plag_high_threshold, self.config.plag_medium_threshold)
+        self.default_mode = self.config.mode
+
         logging.info(f"DecisionEngine initialized with mode: {self.config.mode}")
 
+    @property
+    def modes(self) -> Tuple[str, ...]:
+        return tuple(self._policies)
+
+    def policy(self, mode: Optional[str] = None) -> PolicyTable:
+        try:
+            return self._policies[mode or self.default_mode]
+        except KeyError:
+            raise ValueError(f"Invalid mode: {mode}") from None
+
+    @staticmethod
+    def _risk_level(conf: float, thresholds: Tuple[float, float]) -> str:
+        high, medium = thresholds
+        if conf >= high:
+            return "HIGH"
+        elif conf >= medium:
+            return "MEDIUM"
+        elif conf > 0:
+            return "LOW"
+        return "NONE"
+
     def decide(
         self,
         ai_result: Optional[DetectionResult],
         plag_result: Optional[PlagiarismResult],
+        mode: Optional[str] = None,
     ) -> DecisionResult:
+        """Decide under `mode` (defaults to the configured mode)."""
+        policy = self.policy(mode)
 
         # Extract scores or defaults
         ai_conf = ai_result.confidence if ai_result else 0.0
         plag_conf = plag_result.confidence if plag_result else 0.0
 
-        # Determine risk levels for AI
-        if ai_conf >= self.config.ai_high_threshold:
-            ai_risk = "HIGH"
-        elif ai_conf >= self.config.ai_medium_threshold:
-            ai_risk = "MEDIUM"
-        elif ai_conf > 0:
-            ai_risk = "LOW"
-        else:
-            ai_risk = "NONE"
-
-        # Determine risk levels for Plagiarism
-        if plag_conf >= self.config.plag_high_threshold:
-            plag_risk = "HIGH"
-        elif plag_conf >= self.config.plag_medium_threshold:
-            plag_risk = "MEDIUM"
-        elif plag_conf > 0:
-            plag_risk = "LOW"
-        else:
-            plag_risk = "NONE"
+        # Determine risk levels
+        ai_risk = self._risk_level(ai_conf, self._ai_thresholds)
+        plag_risk = self._risk_level(plag_conf, self._plag_thresholds)
 
         logging.debug(f"AI risk: {ai_risk} (conf={ai_conf}), Plag risk: {plag_risk} (conf={plag_conf})")
 
@@ -105,17 +193,17 @@ class DecisionEngine:
         # else accept
 
         if ai_risk == "HIGH" or plag_risk == "HIGH":
-            action = self.config.policy_actions[self.config.mode]["block"]
-            rationale = "High risk detected by AI or Plagiarism detector"
+            action = policy.block
+            rationale = TIER_RATIONALES[3]
         elif ai_risk == "MEDIUM" or plag_risk == "MEDIUM":
-            action = self.config.policy_actions[self.config.mode]["flag"]
-            rationale = "Medium risk detected by AI or Plagiarism detector"
+            action = policy.flag
+            rationale = TIER_RATIONALES[2]
         elif ai_risk == "LOW" or plag_risk == "LOW":
-            action = self.config.policy_actions[self.config.mode]["monitor"]
-            rationale = "Low risk detected—monitoring suggested"
+            action = policy.monitor
+            rationale = TIER_RATIONALES[1]
         else:
-            action = self.config.policy_actions[self.config.mode]["accept"]
-            rationale = "No significant risk detected—accept submission"
+            action = policy.accept
+            rationale = TIER_RATIONALES[0]
 
         # Build combined confidence as max of two signals weighted average
         combined_confidence = 0.5 * ai_conf + 0.5 * plag_conf
@@ -127,14 +215,15 @@ class DecisionEngine:
             "plag_confidence": plag_conf,
             "plag_risk": plag_risk,
             "ai_verdict": getattr(ai_result, 'risk_level', None) if ai_result else None,
+            "ai_partial": getattr(ai_result, 'partial', False) if ai_result else False,
             "plag_verdict": getattr(plag_result, 'risk_level', None) if plag_result else None,
         }
 
         # Provide hints if conflict detected
         if ai_risk != "NONE" and plag_risk != "NONE" and ai_risk != plag_risk:
-            rationale += " | Conflict between AI and Plagiarism signals; manual review recommended."
-            if action != self.config.policy_actions[self.config.mode]["block"]:
-                action = self.config.policy_actions[self.config.mode]["flag"]
+            rationale += CONFLICT_SUFFIX
+            if action != policy.block:
+                action = policy.flag
 
         return DecisionResult(
             action=action,
@@ -143,6 +232,75 @@ class DecisionEngine:
             details=details,
         )
 
+    @staticmethod
+    def _risk_tiers(conf: np.ndarray, thresholds: Tuple[float, float]) -> np.ndarray:
+        """Vectorized _risk_level as tier indices into RISK_LEVELS."""
+        high, medium = thresholds
+        return np.select([conf >= high, conf >= medium, conf > 0], [3, 2, 1], default=0)
+
+    def decide_batch(
+        self,
+        ai_conf: np.ndarray,
+        plag_conf: np.ndarray,
+        modes: Union[str, Sequence[str], np.ndarray, None] = None,
+    ) -> BatchDecision:
+        """
+        decide() for N submissions at once, over stored confidences.
+
+        `modes` is one mode for every row or a per-row sequence (None = the
+        configured mode). Pass 0.0 where decide() would get a None result.
+        Results match decide() row for row, so stored verdicts can be
+        re-adjudicated after a threshold change without re-running detectors.
+        """
+        ai_conf = np.asarray(ai_conf, dtype=np.float64)
+        plag_conf = np.asarray(plag_conf, dtype=np.float64)
+        if ai_conf.shape != plag_conf.shape or ai_conf.ndim != 1:
+            raise ValueError(f"ai_conf and plag_conf must be 1-D of equal length, got {ai_conf.shape} and {plag_conf.shape}")
+
+        # Per-row mode index into the compiled policy tables (the configured
+        # mode for an empty batch, e.g. replaying an empty score log)
+        if modes is None or isinstance(modes, str) or (len(ai_conf) == 0 and len(modes) == 0):
+            mode_names = [modes if isinstance(modes, str) and modes else self.default_mode]
+            self.policy(mode_names[0])
+            mode_idx = np.zeros(len(ai_conf), dtype=np.intp)
+        else:
+            mode_names, mode_idx = np.unique(np.asarray(modes, dtype=str), return_inverse=True)
+            if len(mode_idx) != len(ai_conf):
+                raise ValueError(f"modes has {len(mode_idx)} entries for {len(ai_conf)} rows")
+            mode_names = [str(name) for name in mode_names]
+            for name in mode_names:
+                self.policy(name)
+
+        # Action vocabulary and (mode, tier) -> action id table
+        tables = [self._policies[name] for name in mode_names]
+        vocabulary = sorted({a for t in tables for a in (t.accept, t.monitor, t.flag, t.block)})
+        action_ids = {action: i for i, action in enumerate(vocabulary)}
+        table = np.array(
+            [[action_ids[a] for a in (t.accept, t.monitor, t.flag, t.block)] for t in tables],
+            dtype=np.intp,
+        )
+
+        ai_tier = self._risk_tiers(ai_conf, self._ai_thresholds)
+        plag_tier = self._risk_tiers(plag_conf, self._plag_thresholds)
+        tier = np.maximum(ai_tier, plag_tier)
+
+        action = table[mode_idx, tier]
+        conflict = (ai_tier != 0) & (plag_tier != 0) & (ai_tier != plag_tier)
+        block, flag = table[mode_idx, 3], table[mode_idx, 2]
+        action = np.where(conflict & (action != block), flag, action)
+
+        rationales = np.array(list(TIER_RATIONALES) + [r + CONFLICT_SUFFIX for r in TIER_RATIONALES])
+        levels = np.array(RISK_LEVELS)
+
+        return BatchDecision(
+            action=np.array(vocabulary)[action],
+            rationale=rationales[tier + 4 * conflict],
+            combined_confidence=0.5 * ai_conf + 0.5 * plag_conf,
+            ai_risk=levels[ai_tier],
+            plag_risk=levels[plag_tier],
+            conflict=conflict,
+        )
+
 
 if __name__ == "__main__":
     import random
@@ -184,8 +342,8 @@ if __name__ == "__main__":
         recommendations=["INVESTIGATE"]
     )
 
-    engine = DecisionEngine(DecisionConfig(mode="coursework"))
-    decision = engine.decide(ai_mock, plag_mock)
+    engine = DecisionEngine()
+    decision = engine.decide(ai_mock, plag_mock, mode="coursework")
 
     print(f"Action: {decision.action}")
     print(f"Rationale: {decision.rationale}")
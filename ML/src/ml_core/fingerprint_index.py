@@ -0,0 +1,111 @@
+from __future__ import annotations
+import re
+import zlib
+from collections import Counter, defaultdict
+from typing import List, Dict, Set, Tuple
+
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def tokenize_code(code: str) -> List[str]:
+    """
+    Split normalized code into a lowercased token stream.
+
+    Lowercasing the medium-normalized tokens gives the same stream as the
+    aggressive level (which only strips whitespace and lowercases), so one
+    index covers both levels.
+    """
+    return [tok.lower() for tok in _TOKEN_RE.findall(code)]
+
+
+def kgram_hashes(tokens: List[str], k: int) -> List[int]:
+    """Deterministic 32-bit hashes of every k-gram of the token stream."""
+    if not tokens:
+        return []
+    if len(tokens) < k:
+        # Short inputs still get a single fingerprint
+        return [zlib.crc32("\x1f".join(tokens).encode('utf-8'))]
+
+    return [
+        zlib.crc32("\x1f".join(tokens[i:i + k]).encode('utf-8'))
+        for i in range(len(tokens) - k + 1)
+    ]
+
+
+def winnow(hashes: List[int], window: int) -> Set[int]:
+    """
+    Winnowing fingerprint selection.
+
+    Keeps the minimum hash of every window of `window` consecutive
+    k-grams, which guarantees that any shared run of window + k - 1
+    tokens produces at least one shared fingerprint.
+    """
+    if len(hashes) <= window:
+        return {min(hashes)} if hashes else set()
+
+    fingerprints: Set[int] = set()
+    for start in range(len(hashes) - window + 1):
+        fingerprints.add(min(hashes[start:start + window]))
+
+    return fingerprints
+
+
+class FingerprintIndex:
+    """
+    Inverted index fingerprint -> pattern ids for candidate retrieval.
+
+    Candidates are ranked by the number of fingerprints they share with
+    the query, so the exact (difflib) similarity only runs on the top-K.
+    Fingerprints shared by more than `max_posting_ratio` of the corpus
+    (boilerplate like `for v0 in range(`) are skipped at query time to keep
+    lookups cheap on large corpora.
+    """
+
+    MIN_STOP_POSTINGS = 50
+
+    def __init__(self, k: int = 5, window: int = 4, max_posting_ratio: float = 0.1):
+        if k < 1 or window < 1:
+            raise ValueError(f"k and window must be >= 1, got k={k}, window={window}")
+
+        self.k = k
+        self.window = window
+        self.max_posting_ratio = max_posting_ratio
+        self._postings: Dict[int, List[int]] = defaultdict(list)
+        self._num_fingerprints: Dict[int, int] = {}
+
+    def fingerprints(self, code: str) -> Set[int]:
+        return self.fingerprints_from_tokens(tokenize_code(code))
+
+    def fingerprints_from_tokens(self, tokens: List[str]) -> Set[int]:
+        return winnow(kgram_hashes(tokens, self.k), self.window)
+
+    def add(self, pattern_id: int, code: str):
+        self.add_tokens(pattern_id, tokenize_code(code))
+
+    def add_tokens(self, pattern_id: int, tokens: List[str]):
+        fps = self.fingerprints_from_tokens(tokens)
+        for fp in fps:
+            self._postings[fp].append(pattern_id)
+        self._num_fingerprints[pattern_id] = len(fps)
+
+    def query(self, code: str, top_k: int) -> List[Tuple[int, int]]:
+        """Return up to `top_k` (pattern_id, shared_fingerprints), best first."""
+        max_postings = max(self.MIN_STOP_POSTINGS, int(self.max_posting_ratio * len(self)))
+
+        counts: Counter = Counter()
+        for fp in self.fingerprints(code):
+            postings = self._postings.get(fp)
+            if postings and len(postings) <= max_postings:
+                counts.update(postings)
+
+        return counts.most_common(top_k)
+
+    def __len__(self) -> int:
+        return len(self._num_fingerprints)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "num_patterns": len(self._num_fingerprints),
+            "num_fingerprints": len(self._postings),
+        }
@@ -0,0 +1,315 @@
+from __future__ import annotations
+import os
+import sys
+import time
+import argparse
+from typing import Optional, Union
+
+import torch
+import torch.nn.functional as F
+from transformers import PreTrainedModel
+
+from src.logger import logging
+from src.exception import CustomException
+
+
+BACKENDS = ("eager", "compile", "torchscript", "onnx")
+
+# Exported graphs live next to the weights under MODELS_ROOT
+EXPORT_FILENAMES = {
+    "torchscript": "perplexity.torchscript.pt",
+    "onnx": "perplexity.onnx",
+}
+
+# Target tokens per LM head chunk: 256 x 50257 float32 logits is ~51 MB
+LOSS_CHUNK_TOKENS = 256
+
+
+def shifted_token_losses(logits: torch.Tensor, input_ids: torch.Tensor) -> torch.Tensor:
+    """Next-token cross-entropy per position, (batch, seq_len - 1): entry j scores token j + 1."""
+    shift_logits = logits[:, :-1, :].float()
+    shift_labels = input_ids[:, 1:]
+
+    return F.cross_entropy(
+        shift_logits.reshape(-1, shift_logits.size(-1)),
+        shift_labels.reshape(-1),
+        reduction="none",
+    ).view(shift_labels.shape)
+
+
+def _autocast(device: torch.device, dtype: Optional[torch.dtype]):
+    return torch.autocast(device_type=device.type, dtype=dtype, enabled=dtype is not None)
+
+
+def chunked_token_losses(
+    hidden_states: torch.Tensor,
+    lm_head: torch.nn.Module,
+    input_ids: torch.Tensor,
+    attention_mask: torch.Tensor,
+    chunk_tokens: int,
+    autocast_dtype: Optional[torch.dtype] = None,
+) -> torch.Tensor:
+    """
+    Same per-token losses as shifted_token_losses, from the final hidden states.
+
+    Only unpadded targets go through the LM head, `chunk_tokens` rows at a
+    time, so at most [chunk_tokens, vocab] logits exist at once whatever
+    the batch size. Padded positions are left at 0 (callers mask them).
+    With `autocast_dtype` the LM head runs under autocast; the
+    cross-entropy is always float32.
+    """
+    shift_labels = input_ids[:, 1:]
+    scored = attention_mask[:, 1:].bool()
+
+    positions = hidden_states[:, :-1][scored]
+    labels = shift_labels[scored]
+    losses = torch.empty(labels.shape, dtype=torch.float32, device=hidden_states.device)
+    for start in range(0, labels.numel(), chunk_tokens):
+        end = start + chunk_tokens
+        with _autocast(hidden_states.device, autocast_dtype):
+            logits = lm_head(positions[start:end])
+        logits = logits.float()
+        losses[start:end] = F.cross_entropy(logits, labels[start:end], reduction="none")
+
+    token_losses = torch.zeros(shift_labels.shape, dtype=torch.float32, device=hidden_states.device)
+    token_losses[scored] = losses
+    return token_losses
+
+
+class TokenLossModule(torch.nn.Module):
+    """
+    Causal LM whose output is per-token losses instead of logits.
+
+    This is the graph that gets compiled / traced / exported, so the
+    [batch, seq_len, vocab] logits stay inside the runtime and only
+    (batch, seq_len - 1) losses come back. With `chunk_tokens` > 0 the full
+    logits are never built (see chunked_token_losses); exports use 0, as
+    the chunk loop depends on the input shape and cannot be traced.
+
+    A model carrying `autocast_dtype` (set by the loader's "bf16" mode)
+    runs its forward pass under torch.autocast with float32 weights; the
+    losses are computed outside it, in float32.
+    """
+
+    def __init__(self, model: PreTrainedModel, chunk_tokens: int = LOSS_CHUNK_TOKENS):
+        super().__init__()
+        self.model = model
+        self.chunk_tokens = chunk_tokens
+        self.autocast_dtype: Optional[torch.dtype] = getattr(model, "autocast_dtype", None)
+
+    def forward(self, input_ids: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+        if self.chunk_tokens > 0:
+            with _autocast(input_ids.device, self.autocast_dtype):
+                hidden_states = self.model.base_model(
+                    input_ids=input_ids,
+                    attention_mask=attention_mask,
+                    use_cache=False,
+                    return_dict=False,
+                )[0]
+            return chunked_token_losses(
+                hidden_states,
+                self.model.get_output_embeddings(),
+                input_ids,
+                attention_mask,
+                self.chunk_tokens,
+                self.autocast_dtype,
+            )
+
+        with _autocast(input_ids.device, self.autocast_dtype):
+            logits = self.model(
+                input_ids=input_ids,
+                attention_mask=attention_mask,
+                use_cache=False,
+                return_dict=False,
+            )[0]
+        return shifted_token_losses(logits, input_ids)
+
+
+class InferenceBackend:
+    """Runs the perplexity model: right-padded batch in, per-token losses out."""
+
+    name = "base"
+
+    def token_losses(self, input_ids: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+        raise NotImplementedError
+
+
+class EagerBackend(InferenceBackend):
+    """Plain PyTorch eager execution (the default)."""
+
+    name = "eager"
+
+    def __init__(self, model: PreTrainedModel, chunk_tokens: int = LOSS_CHUNK_TOKENS):
+        self.module = TokenLossModule(model, chunk_tokens)
+
+    def token_losses(self, input_ids: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+        with torch.no_grad():
+            return self.module(input_ids, attention_mask)
+
+
+class CompiledBackend(EagerBackend):
+    """torch.compile with dynamic shapes; compiles on the first batch."""
+
+    name = "compile"
+
+    def __init__(self, model: PreTrainedModel, chunk_tokens: int = LOSS_CHUNK_TOKENS):
+        self.module = torch.compile(TokenLossModule(model, chunk_tokens).eval(), dynamic=True)
+
+
+class TorchScriptBackend(EagerBackend):
+    """Traced TorchScript graph written by `export`."""
+
+    name = "torchscript"
+
+    def __init__(self, path: str, device: torch.device):
+        self.module = torch.jit.load(path, map_location=device).eval()
+
+
+class OnnxBackend(InferenceBackend):
+    """ONNX Runtime session (CPU execution provider) on the graph written by `export`."""
+
+    name = "onnx"
+
+    def __init__(self, path: str, device: torch.device):
+        if device.type != "cpu":
+            raise ValueError(f"The onnx backend runs on the CPU execution provider, got device {device}")
+
+        # Optional dependency, only needed for this backend
+        import onnxruntime as ort
+
+        self.session = ort.InferenceSession(path, providers=["CPUExecutionProvider"])
+
+    def token_losses(self, input_ids: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+        (token_losses,) = self.session.run(
+            ["token_losses"],
+            {
+                "input_ids": input_ids.cpu().numpy(),
+                "attention_mask": attention_mask.cpu().numpy(),
+            },
+        )
+        return torch.from_numpy(token_losses)
+
+
+def export_path(export_dir: str, backend: str) -> str:
+    return os.path.join(export_dir, EXPORT_FILENAMES[backend])
+
+
+def create_backend(
+    name: str,
+    model: PreTrainedModel,
+    device: torch.device,
+    export_dir: Optional[str] = None,
+    loss_chunk_tokens: int = LOSS_CHUNK_TOKENS,
+) -> InferenceBackend:
+    """
+    Build the named backend; torchscript / onnx load their exported graph from `export_dir`.
+
+    `loss_chunk_tokens` applies to eager / compile (0 = full logits).
+    """
+    try:
+        if name == "eager":
+            backend: InferenceBackend = EagerBackend(model, loss_chunk_tokens)
+        elif name == "compile":
+            backend = CompiledBackend(model, loss_chunk_tokens)
+        elif name in EXPORT_FILENAMES:
+            path = export_path(export_dir or "", name)
+            if not os.path.isfile(path):
+                raise FileNotFoundError(
+                    f"{path} not found; run `python -m src.ml_core.inference_backend export --format {name}`"
+                )
+            backend = TorchScriptBackend(path, device) if name == "torchscript" else OnnxBackend(path, device)
+        else:
+            raise ValueError(f"Unknown inference backend: {name} (expected one of {BACKENDS})")
+
+        logging.info(f"Inference backend ready: {name}")
+        return backend
+
+    except Exception as e:
+        logging.error(f"Failed to create inference backend {name}: {e}")
+        raise CustomException(f"INFERENCE_BACKEND_ERROR: {str(e)}", sys)
+
+
+def export_backend(
+    model: PreTrainedModel,
+    name: str,
+    export_dir: str,
+    device: torch.device,
+) -> str:
+    """Trace / export TokenLossModule for `name` (torchscript | onnx) into `export_dir`."""
+    try:
+        start_time = time.time()
+        path = export_path(export_dir, name)
+        module = TokenLossModule(model, chunk_tokens=0).eval()
+
+        # Two rows, one padded, so the mask path is part of the graph
+        input_ids = torch.randint(0, model.config.vocab_size, (2, 16), device=device)
+        attention_mask = torch.ones_like(input_ids)
+        attention_mask[1, 10:] = 0
+
+        with torch.no_grad():
+            if name == "torchscript":
+                torch.jit.trace(module, (input_ids, attention_mask), check_trace=False).save(path)
+            elif name == "onnx":
+                torch.onnx.export(
+                    module,
+                    (input_ids, attention_mask),
+                    path,
+                    input_names=["input_ids", "attention_mask"],
+                    output_names=["token_losses"],
+                    dynamic_axes={
+                        "input_ids": {0: "batch", 1: "sequence"},
+                        "attention_mask": {0: "batch", 1: "sequence"},
+                        "token_losses": {0: "batch", 1: "targets"},
+                    },
+                    opset_version=17,
+                    dynamo=False,
+                )
+            else:
+                raise ValueError(f"Backend {name} has nothing to export (expected one of {tuple(EXPORT_FILENAMES)})")
+
+        logging.info(
+            f"Exported {name} graph to {path} in {time.time() - start_time:.1f}s",
+            extra={"backend": name, "path": path},
+        )
+        return path
+
+    except Exception as e:
+        logging.error(f"Export failed: {e}")
+        raise CustomException(f"INFERENCE_EXPORT_ERROR: {str(e)}", sys)
+
+
+def as_backend(model: Union[PreTrainedModel, InferenceBackend]) -> InferenceBackend:
+    # Duck-typed: backends built by `python -m` of this module are not the imported classes
+    return model if hasattr(model, "token_losses") else EagerBackend(model)
+
+
+def main(argv=None):
+    # Imported here: model_loader depends on this module through perplexity_batcher
+    from src.ml_core.model_loader import ModelLoaderConfig, load_model_and_tokenizer, compute_probe_losses
+
+    parser = argparse.ArgumentParser(description="Export the perplexity graph next to the model weights.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export")
+    export_parser.add_argument("--format", choices=tuple(EXPORT_FILENAMES), required=True)
+    export_parser.add_argument("--models-root", default=None, help="Model directory (default: MODELS_ROOT)")
+    args = parser.parse_args(argv)
+
+    config = ModelLoaderConfig.from_env()
+    if args.models_root:
+        config.models_root = args.models_root
+    config.quantization = "none"
+
+    model, tokenizer, device = load_model_and_tokenizer(config)
+    path = export_backend(model, args.format, config.models_root, device)
+
+    # Same probe losses through the exported graph as through eager
+    reference = compute_probe_losses(model, tokenizer, device)
+    exported = compute_probe_losses(create_backend(args.format, model, device, config.models_root), tokenizer, device)
+    max_diff = max(abs(a - b) for a, b in zip(reference, exported))
+
+    print(f"Exported {args.format} graph: {path}")
+    print(f"Max probe loss difference vs eager: {max_diff:.2e}")
+
+
+if __name__ == "__main__":
+    main()
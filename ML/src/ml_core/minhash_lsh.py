@@ -0,0 +1,188 @@
+from __future__ import annotations
+from collections import defaultdict
+from typing import List, Dict, Set, Tuple, Optional
+
+import numpy as np
+
+from src.ml_core.fingerprint_index import tokenize_code, kgram_hashes
+
+
+# Prime just above 2**32; with a < 2**32 and 32-bit shingles, a * x fits in uint64
+_PRIME_32 = np.uint64(4294967311)
+_EMPTY = np.iinfo(np.uint64).max
+
+
+class MinHasher:
+    """
+    Vectorized MinHash signatures over token k-gram shingles.
+
+    Uses `num_perm` universal hash functions h(x) = (a*x + b) mod p.
+    `sign_batch` signs many documents in one NumPy pass over a
+    concatenated shingle buffer with offset arrays.
+    """
+
+    def __init__(
+        self,
+        num_perm: int = 128,
+        k: int = 5,
+        seed: int = 1,
+        chunk_bytes: int = 64 * 1024 * 1024,
+    ):
+        if num_perm < 1:
+            raise ValueError(f"num_perm must be >= 1, got {num_perm}")
+
+        self.num_perm = num_perm
+        self.k = k
+        # Shingles hashed per pass: the (num_perm x shingles) uint64 matrix stays within chunk_bytes
+        self.chunk_shingles = max(1, chunk_bytes // (8 * num_perm))
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 2**32, size=(num_perm, 1), dtype=np.uint64)
+        self._b = rng.integers(0, int(_PRIME_32), size=(num_perm, 1), dtype=np.uint64)
+
+    def shingles(self, tokens: List[str]) -> np.ndarray:
+        return np.unique(np.asarray(kgram_hashes(tokens, self.k), dtype=np.uint64))
+
+    def sign(self, code: str) -> np.ndarray:
+        return self.sign_batch([code])[0]
+
+    def sign_batch(self, codes: List[str], chunk_shingles: Optional[int] = None) -> np.ndarray:
+        """
+        Signatures for many documents as a (len(codes), num_perm) uint64 array.
+
+        Documents with no shingles get an all-max signature and are never
+        reported as similar.
+        """
+        return self.sign_tokens_batch([tokenize_code(code) for code in codes], chunk_shingles)
+
+    def _hash(self, shingles: np.ndarray) -> np.ndarray:
+        """(num_perm, len(shingles)) permuted hashes, computed in place."""
+        hashed = self._a * shingles[None, :]
+        hashed %= _PRIME_32
+        hashed += self._b
+        hashed %= _PRIME_32
+        return hashed
+
+    def sign_tokens_batch(
+        self,
+        token_lists: List[List[str]],
+        chunk_shingles: Optional[int] = None,
+    ) -> np.ndarray:
+        """sign_batch over already-tokenized documents (`chunk_shingles` defaults to self.chunk_shingles)."""
+        chunk_shingles = chunk_shingles or self.chunk_shingles
+        signatures = np.full((len(token_lists), self.num_perm), _EMPTY, dtype=np.uint64)
+        shingle_sets = [self.shingles(tokens) for tokens in token_lists]
+
+        # Process documents in chunks so the (num_perm x shingles) matrix stays bounded
+        start = 0
+        while start < len(token_lists):
+            if len(shingle_sets[start]) > chunk_shingles:
+                # A document larger than a chunk is signed slice by slice
+                for offset in range(0, len(shingle_sets[start]), chunk_shingles):
+                    part = self._hash(shingle_sets[start][offset:offset + chunk_shingles]).min(axis=1)
+                    np.minimum(signatures[start], part, out=signatures[start])
+                start += 1
+                continue
+
+            end = start
+            total = 0
+            while end < len(token_lists) and total + len(shingle_sets[end]) <= chunk_shingles:
+                total += len(shingle_sets[end])
+                end += 1
+
+            docs = [i for i in range(start, end) if len(shingle_sets[i]) > 0]
+            if docs:
+                buffer = np.concatenate([shingle_sets[i] for i in docs])
+                lengths = np.array([len(shingle_sets[i]) for i in docs])
+                offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+
+                signatures[docs] = np.minimum.reduceat(self._hash(buffer), offsets, axis=1).T
+
+            start = end
+
+        return signatures
+
+
+def estimate_jaccard(sig1: np.ndarray, sig2: np.ndarray) -> float:
+    """Fraction of agreeing MinHash slots (unbiased Jaccard estimate)."""
+    if sig1[0] == _EMPTY or sig2[0] == _EMPTY:
+        return 0.0
+    return float(np.mean(sig1 == sig2))
+
+
+class LSHIndex:
+    """
+    Banded LSH tables over MinHash signatures.
+
+    Each signature is split into `bands` bands of `rows` slots; documents
+    that agree on every slot of at least one band become candidates.
+    The similarity threshold is roughly (1 / bands) ** (1 / rows).
+    """
+
+    def __init__(self, bands: int = 32, rows: int = 4):
+        if bands < 1 or rows < 1:
+            raise ValueError(f"bands and rows must be >= 1, got bands={bands}, rows={rows}")
+
+        self.bands = bands
+        self.rows = rows
+        self._tables: List[Dict[bytes, List[int]]] = [defaultdict(list) for _ in range(bands)]
+        self._signatures: Dict[int, np.ndarray] = {}
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [
+            signature[band * self.rows:(band + 1) * self.rows].tobytes()
+            for band in range(self.bands)
+        ]
+
+    def insert(self, doc_id: int, signature: np.ndarray):
+        if len(signature) < self.bands * self.rows:
+            raise ValueError(
+                f"Signature length {len(signature)} < bands x rows ({self.bands * self.rows})"
+            )
+        if signature[0] == _EMPTY:
+            return
+
+        self._signatures[doc_id] = signature
+        for table, key in zip(self._tables, self._band_keys(signature)):
+            table[key].append(doc_id)
+
+    def insert_batch(self, signatures: np.ndarray, start_id: int = 0):
+        for offset, signature in enumerate(signatures):
+            self.insert(start_id + offset, signature)
+
+    def candidates(self, signature: np.ndarray) -> Set[int]:
+        if signature[0] == _EMPTY:
+            return set()
+
+        found: Set[int] = set()
+        for table, key in zip(self._tables, self._band_keys(signature)):
+            found.update(table.get(key, ()))
+        return found
+
+    def query(self, signature: np.ndarray, top_k: Optional[int] = None) -> List[Tuple[int, float]]:
+        """Candidates ranked by estimated Jaccard, best first."""
+        ranked = sorted(
+            ((doc_id, estimate_jaccard(signature, self._signatures[doc_id]))
+             for doc_id in self.candidates(signature)),
+            key=lambda item: item[1],
+            reverse=True,
+        )
+        return ranked[:top_k] if top_k else ranked
+
+    def candidate_pairs(self) -> Set[Tuple[int, int]]:
+        """All (i, j) with i < j sharing at least one band bucket."""
+        pairs: Set[Tuple[int, int]] = set()
+        for table in self._tables:
+            for bucket in table.values():
+                if len(bucket) < 2:
+                    continue
+                ordered = sorted(bucket)
+                for x in range(len(ordered)):
+                    for y in range(x + 1, len(ordered)):
+                        pairs.add((ordered[x], ordered[y]))
+        return pairs
+
+    def signature(self, doc_id: int) -> Optional[np.ndarray]:
+        return self._signatures.get(doc_id)
+
+    def __len__(self) -> int:
+        return len(self._signatures)
@@ -2,20 +2,40 @@ from __future__ import annotations
 import sys
 import os
 import time
-from typing import Tuple,Optional
-from dataclasses import dataclass
+import math
+import json
+from typing import Tuple,Optional,List,Dict
+from dataclasses import dataclass, replace
 
 import torch  # type: ignore
 from transformers import (  # type: ignore
     AutoConfig, AutoTokenizer, AutoModelForCausalLM,
     PreTrainedModel, PreTrainedTokenizerBase,
 )
+from transformers.pytorch_utils import Conv1D  # type: ignore
 
 # Import the already-configured logging and exception
 from src.logger import logging   
 from src.exception import CustomException
+from src.ml_core.perplexity_batcher import compute_sequence_losses, pad_batch
 
 
+QUANTIZATION_MODES = ("none", "dynamic_int8", "bf16")
+
+
+# Fixed code snippets scored at load time (one batched forward pass)
+VALIDATION_PROBES: Tuple[str, ...] = (
+    "def add(a, b):\n    return a + b\n",
+    "for i in range(10):\n    print(i)\n",
+    "import os\n\npath = os.path.join(os.getcwd(), 'data')\nprint(path)\n",
+    "class Stack:\n    def __init__(self):\n        self.items = []\n\n    def push(self, item):\n        self.items.append(item)\n",
+    "def factorial(n):\n    if n <= 1:\n        return 1\n    return n * factorial(n - 1)\n",
+    "with open('input.txt') as f:\n    lines = [line.strip() for line in f]\n",
+)
+
+# Known-good loss of every probe, per torch dtype, stored next to the weights
+VALIDATION_REFERENCE_FILE = "validation_reference.json"
+
 
 @dataclass
 class ModelLoaderConfig:
@@ -26,7 +46,20 @@ class ModelLoaderConfig:
     low_cpu_mem_usage: bool = True
     use_fast_tokenizer: bool = True
     validate_on_load: bool = True
-    max_validation_tokens: int = 50
+    
+    # Each probe's loss must stay within this relative distance of its
+    # reference in VALIDATION_REFERENCE_FILE (recorded with --record-reference)
+    validation_tolerance: float = 0.03
+    require_validation_reference: bool = False
+    
+    # Fallback without a reference only: accepted mean loss (nats/token).
+    # A random or corrupted model lands near ln(vocab_size) (~10.8 for GPT-2).
+    validation_loss_range: Tuple[float, float] = (0.5, 5.0)
+    
+    # CPU inference precision: "none" (float32), "dynamic_int8" (int8
+    # weights for every Linear/Conv1D projection) or "bf16" (autocast)
+    quantization: str = "none"
+    max_quantization_drift: float = 0.05  # warn above this relative perplexity drift vs float32
     
     @classmethod
     def from_env(cls) -> ModelLoaderConfig:
@@ -35,7 +68,21 @@ class ModelLoaderConfig:
             models_root=os.getenv("MODELS_ROOT", r"E:\project\ML\models"),
             device_preference=os.getenv("MODEL_DEVICE", None),
             torch_dtype=os.getenv("TORCH_DTYPE", "auto"),
+            validate_on_load=os.getenv("VALIDATE_ON_LOAD", "true").lower() == "true",
+            validation_tolerance=float(os.getenv("VALIDATION_TOLERANCE", 0.03)),
+            require_validation_reference=os.getenv("REQUIRE_VALIDATION_REFERENCE", "false").lower() == "true",
+            validation_loss_range=(
+                float(os.getenv("VALIDATION_LOSS_MIN", 0.5)),
+                float(os.getenv("VALIDATION_LOSS_MAX", 5.0)),
+            ),
+            quantization=os.getenv("MODEL_QUANTIZATION", "none"),
         )
+    
+    def validate(self):
+        if self.quantization not in QUANTIZATION_MODES:
+            raise ValueError(f"quantization must be one of {QUANTIZATION_MODES}, got {self.quantization}")
+        if self.validation_tolerance <= 0:
+            raise ValueError(f"validation_tolerance must be > 0, got {self.validation_tolerance}")
 
 
 # device selection 
@@ -213,64 +260,319 @@ def _load_model(
         raise CustomException(f"MODEL_LOAD_ERROR: {str(e)}", sys)
 
 
-def _validate_model(
+@dataclass
+class ValidationReport:
+    """Per-probe losses from load-time validation."""
+    probe_losses: List[float]
+    mean_loss: float
+    inference_time_ms: int
+    max_relative_drift: Optional[float] = None  # vs the stored reference, if any
+
+
+def compute_probe_losses(
     model: PreTrainedModel,
     tokenizer: PreTrainedTokenizerBase,
     device: torch.device,
-    max_tokens: int = 50
-) -> bool:
+    probes: Tuple[str, ...] = VALIDATION_PROBES,
+) -> List[float]:
+    """Mean next-token loss of each probe, all probes in one padded forward pass."""
+    pad_token_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else tokenizer.eos_token_id
+    sequences = tokenizer(list(probes), add_special_tokens=True)["input_ids"]
+    input_ids, attention_mask = pad_batch(sequences, pad_token_id, device)
+    return compute_sequence_losses(model, input_ids, attention_mask).tolist()
+
+
+def _model_dtype(model: PreTrainedModel) -> str:
+    return str(next(model.parameters()).dtype).replace("torch.", "")
+
+
+def _probe_label(index: int) -> str:
+    return f"probe {index} ({VALIDATION_PROBES[index].splitlines()[0]!r})"
+
+
+def load_validation_reference(model_dir: str, dtype: str) -> Optional[Dict[str, float]]:
+    """Reference loss per probe text for `dtype`, or None if none was recorded."""
+    path = os.path.join(model_dir, VALIDATION_REFERENCE_FILE)
+    if not os.path.isfile(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f).get(dtype)
+
+
+def record_validation_reference(
+    model: PreTrainedModel,
+    tokenizer: PreTrainedTokenizerBase,
+    device: torch.device,
+    model_dir: str,
+) -> Dict[str, float]:
+    """
+    Score VALIDATION_PROBES on a known-good model and store the losses.
+
+    References are kept per dtype (float32 and float16 weights score
+    slightly differently); entries for other dtypes are left untouched.
+    """
+    try:
+        dtype = _model_dtype(model)
+        reference = dict(zip(VALIDATION_PROBES, compute_probe_losses(model, tokenizer, device)))
+        
+        path = os.path.join(model_dir, VALIDATION_REFERENCE_FILE)
+        stored = {}
+        if os.path.isfile(path):
+            with open(path, encoding="utf-8") as f:
+                stored = json.load(f)
+        stored[dtype] = reference
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(stored, f, indent=2)
+        
+        logging.info(
+            f"Recorded {len(reference)} {dtype} validation reference losses in {path}",
+            extra={"probe_losses": [round(loss, 4) for loss in reference.values()]}
+        )
+        return reference
     
+    except Exception as e:
+        logging.error(f"Failed to record validation reference: {e}")
+        raise CustomException(f"VALIDATION_REFERENCE_ERROR: {str(e)}", sys)
+
+
+def _check_against_reference(
+    probe_losses: List[float],
+    reference: Dict[str, float],
+    tolerance: float,
+) -> float:
+    """Largest relative drift from the reference; raises naming every probe outside `tolerance`."""
+    failures = []
+    max_drift = 0.0
+    for index, (probe, loss) in enumerate(zip(VALIDATION_PROBES, probe_losses)):
+        expected = reference.get(probe)
+        if expected is None:
+            failures.append(f"{_probe_label(index)} has no reference loss; re-record the reference")
+            continue
+        drift = abs(loss - expected) / expected
+        max_drift = max(max_drift, drift)
+        if drift > tolerance:
+            failures.append(
+                f"{_probe_label(index)} loss {loss:.4f} vs reference {expected:.4f} "
+                f"({drift:.1%} > {tolerance:.1%})"
+            )
+    if failures:
+        raise RuntimeError("; ".join(failures))
+    return max_drift
+
+
+def _validate_model(
+    model: PreTrainedModel,
+    tokenizer: PreTrainedTokenizerBase,
+    device: torch.device,
+    reference: Optional[Dict[str, float]] = None,
+    tolerance: float = 0.03,
+    loss_range: Tuple[float, float] = (0.5, 5.0),
+    require_reference: bool = False,
+) -> ValidationReport:
+    """
+    Score VALIDATION_PROBES and check each loss against its reference.
+
+    One forward pass instead of token-by-token generation. Every probe
+    must stay within `tolerance` (relative) of its recorded loss, so a
+    single broken probe is not averaged away. Without a reference only the
+    mean loss is checked against the coarse `loss_range`.
+    """
     try:
         logging.info("Running model validation...")
         
-        test_input = "def hello():"
+        start_time = time.time()
+        probe_losses = compute_probe_losses(model, tokenizer, device)
+        inference_time = time.time() - start_time
         
-        with torch.inference_mode():
-            # Encode
-            inputs = tokenizer(
-                test_input,
-                return_tensors="pt",
-                add_special_tokens=True
-            ).to(device)
-            
-            # Forward pass
-            start_time = time.time()
-            outputs = model.generate(
-                **inputs,
-                max_new_tokens=max_tokens,
-                do_sample=False,
-                pad_token_id=tokenizer.eos_token_id
+        mean_loss = sum(probe_losses) / len(probe_losses)
+        
+        for index, loss in enumerate(probe_losses):
+            if not math.isfinite(loss):
+                raise RuntimeError(f"{_probe_label(index)} loss is {loss}")
+        
+        max_drift = None
+        if reference is not None:
+            max_drift = _check_against_reference(probe_losses, reference, tolerance)
+            summary = f"max drift {max_drift:.2%} from reference"
+        elif require_reference:
+            raise RuntimeError(
+                f"No {_model_dtype(model)} validation reference; record one with "
+                f"`python -m src.ml_core.model_loader --record-reference`"
             )
-            inference_time = time.time() - start_time
-            
-            # Decode
-            generated_text = tokenizer.decode(outputs[0], skip_special_tokens=True)
-            
-            if not generated_text:
-                raise RuntimeError("Model generated empty output")
-            
-            logging.info(
-                f"Model validation passed",
-                extra={
-                    "input_length": len(test_input),
-                    "output_length": len(generated_text),
-                    "inference_time_ms": int(inference_time * 1000),
-                    "generated_sample": generated_text[:100]  # First 100 chars
-                }
+        else:
+            low, high = loss_range
+            if not low <= mean_loss <= high:
+                raise RuntimeError(
+                    f"Mean probe loss {mean_loss:.3f} outside fallback range [{low}, {high}]"
+                )
+            logging.warning(
+                f"No {_model_dtype(model)} validation reference; only the mean probe loss was "
+                f"range-checked. Record one with `python -m src.ml_core.model_loader --record-reference`"
             )
-            
-            return True
+            summary = "no reference"
+        
+        logging.info(
+            f"Model validation passed: mean probe loss {mean_loss:.3f}, {summary}, "
+            f"in {int(inference_time * 1000)} ms",
+            extra={
+                "num_probes": len(probe_losses),
+                "mean_loss": round(mean_loss, 4),
+                "probe_losses": [round(loss, 4) for loss in probe_losses],
+                "max_relative_drift": max_drift,
+                "inference_time_ms": int(inference_time * 1000),
+            }
+        )
+        
+        return ValidationReport(
+            probe_losses=probe_losses,
+            mean_loss=mean_loss,
+            inference_time_ms=int(inference_time * 1000),
+            max_relative_drift=max_drift,
+        )
     
     except Exception as e:
         logging.error(f"Model validation failed: {e}")
         raise CustomException(f"MODEL_VALIDATION_ERROR: {str(e)}", sys)
 
+def _conv1d_to_linear(model: PreTrainedModel) -> int:
+    """
+    Swap GPT-2 style Conv1D projections for equivalent nn.Linear layers.
+
+    Conv1D stores its weight as (in, out); dynamic quantization only knows
+    nn.Linear, so without this only the LM head would be quantized.
+    """
+    replaced = 0
+    for parent in list(model.modules()):
+        for name, child in list(parent.named_children()):
+            if isinstance(child, Conv1D):
+                in_features, out_features = child.weight.shape
+                linear = torch.nn.Linear(in_features, out_features, device=child.weight.device)
+                linear.weight = torch.nn.Parameter(child.weight.detach().t().contiguous())
+                linear.bias = torch.nn.Parameter(child.bias.detach())
+                setattr(parent, name, linear)
+                replaced += 1
+    return replaced
+
+
+def _apply_quantization(
+    model: PreTrainedModel,
+    quantization: str,
+    device: torch.device,
+) -> PreTrainedModel:
+    """
+    Return `model` converted to the requested inference precision (in place where possible).
+
+    "bf16" keeps the float32 weights and marks the model for bfloat16
+    autocast: the inference backends run the forward pass under
+    torch.autocast and compute the losses in float32.
+    """
+    if quantization == "none":
+        return model
+    
+    if device.type != "cpu":
+        raise ValueError(f"{quantization} quantization targets CPU inference, got device {device}")
+    
+    if quantization == "dynamic_int8":
+        converted = _conv1d_to_linear(model)
+        model = torch.ao.quantization.quantize_dynamic(
+            model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True
+        )
+        logging.info("Applied dynamic int8 quantization", extra={"conv1d_converted": converted})
+    
+    elif quantization == "bf16":
+        model.autocast_dtype = torch.bfloat16
+        logging.info("Enabled bfloat16 autocast (float32 weights)")
+    
+    # Part of the model id, so cached perplexities never mix precisions
+    model.quantization = quantization
+    return model
+
+
+def _perplexity_verdict(perplexity: float, ai_threshold: float, human_threshold: float) -> str:
+    """Perplexity-only verdict band under the AI detector thresholds."""
+    if perplexity < ai_threshold:
+        return "ai"
+    if perplexity > human_threshold:
+        return "human"
+    return "uncertain"
+
+
+def _quantize_with_drift_check(
+    model: PreTrainedModel,
+    tokenizer: PreTrainedTokenizerBase,
+    device: torch.device,
+    config: ModelLoaderConfig,
+) -> PreTrainedModel:
+    """
+    Quantize and compare probe perplexities against the float32 model.
+
+    The drift is logged (and warned about above max_quantization_drift)
+    with the verdict agreement: the share of probes whose perplexity
+    verdict under the AI detector thresholds is unchanged. Neither blocks
+    loading.
+    """
+    # Imported here: code_detector imports this module
+    from src.ml_core.code_detector import AIDetectorConfig
+    
+    try:
+        detector_config = AIDetectorConfig.from_env()
+        reference = compute_probe_losses(model, tokenizer, device)
+        
+        start_time = time.time()
+        model = _apply_quantization(model, config.quantization, device)
+        quantize_time = time.time() - start_time
+        
+        quantized = compute_probe_losses(model, tokenizer, device)
+        
+        drifts = [
+            abs(math.exp(q) - math.exp(r)) / math.exp(r)
+            for r, q in zip(reference, quantized)
+        ]
+        max_drift = max(drifts)
+        
+        verdicts = [
+            (
+                _perplexity_verdict(math.exp(r), detector_config.perplexity_ai_threshold, detector_config.perplexity_human_threshold),
+                _perplexity_verdict(math.exp(q), detector_config.perplexity_ai_threshold, detector_config.perplexity_human_threshold),
+            )
+            for r, q in zip(reference, quantized)
+        ]
+        agreement = sum(r == q for r, q in verdicts) / len(verdicts)
+        
+        extra = {
+            "quantization": config.quantization,
+            "reference_perplexities": [round(math.exp(r), 3) for r in reference],
+            "quantized_perplexities": [round(math.exp(q), 3) for q in quantized],
+            "max_relative_drift": round(max_drift, 4),
+            "mean_relative_drift": round(sum(drifts) / len(drifts), 4),
+            "verdict_agreement": round(agreement, 3),
+            "reference_verdicts": [r for r, _ in verdicts],
+            "quantized_verdicts": [q for _, q in verdicts],
+            "quantize_time_ms": int(quantize_time * 1000),
+        }
+        summary = (
+            f"{config.quantization}: max relative perplexity drift {max_drift:.4f}, "
+            f"verdict agreement {agreement:.3f} vs float32"
+        )
+        if max_drift > config.max_quantization_drift:
+            logging.warning(f"Quantization drift above threshold ({summary})", extra=extra)
+        else:
+            logging.info(f"Quantization drift check passed ({summary})", extra=extra)
+        
+        return model
+    
+    except Exception as e:
+        logging.error(f"Quantization failed: {e}")
+        raise CustomException(f"MODEL_QUANTIZATION_ERROR: {str(e)}", sys)
+
+
 def load_model_and_tokenizer(
     config: Optional[ModelLoaderConfig] = None
 ) -> Tuple[PreTrainedModel, PreTrainedTokenizerBase, torch.device]:
     
     if config is None:
         config = ModelLoaderConfig.from_env()
+    config.validate()
     
     start_time = time.time()
     
@@ -281,6 +583,7 @@ def load_model_and_tokenizer(
                 "models_root": config.models_root,
                 "device_preference": config.device_preference,
                 "torch_dtype": config.torch_dtype,
+                "quantization": config.quantization,
             }
         )
         
@@ -304,9 +607,21 @@ def load_model_and_tokenizer(
             config.low_cpu_mem_usage
         )
         
-        # 6. Optional validation
+        # 6. Optional validation of the checkpoint as loaded
         if config.validate_on_load:
-            _validate_model(model, tokenizer, device, config.max_validation_tokens)
+            _validate_model(
+                model,
+                tokenizer,
+                device,
+                reference=load_validation_reference(model_dir, _model_dtype(model)),
+                tolerance=config.validation_tolerance,
+                loss_range=config.validation_loss_range,
+                require_reference=config.require_validation_reference,
+            )
+        
+        # 7. Optional quantization (drift-checked against float32)
+        if config.quantization != "none":
+            model = _quantize_with_drift_check(model, tokenizer, device, config)
         
         total_time = time.time() - start_time
         
@@ -369,8 +684,24 @@ def clear_model_cache():
 
 
 if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--record-reference",
+        action="store_true",
+        help=f"store this (known-good) model's probe losses in {VALIDATION_REFERENCE_FILE}",
+    )
+    args = parser.parse_args()
+
     try:
 
+        if args.record_reference:
+            config = replace(ModelLoaderConfig.from_env(), validate_on_load=False, quantization="none")
+            model, tokenizer, device = load_model_and_tokenizer(config)
+            record_validation_reference(model, tokenizer, device, _validate_model_directory(config.models_root))
+            sys.exit(0)
+
         model, tokenizer, device = load_model_and_tokenizer()
 
         test_code = "def add(a, b):"
@@ -0,0 +1,336 @@
+from __future__ import annotations
+import sys
+import time
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Optional, List, Tuple, Dict, Any, Sequence, Union
+from dataclasses import dataclass
+
+import numpy as np
+import torch
+from transformers import PreTrainedModel, PreTrainedTokenizerBase
+
+from src.logger import logging
+from src.exception import CustomException
+from src.ml_core.inference_backend import InferenceBackend, as_backend
+
+
+@dataclass
+class BatchSchedulerConfig:
+    """Configuration for perplexity micro-batching."""
+    max_batch_size: int = 8
+    max_wait_ms: float = 5.0
+    max_tokens: int = 1024
+
+    def validate(self):
+        if self.max_batch_size < 1:
+            raise ValueError(f"max_batch_size must be >= 1, got {self.max_batch_size}")
+        if self.max_wait_ms < 0:
+            raise ValueError(f"max_wait_ms must be >= 0, got {self.max_wait_ms}")
+
+
+def compute_token_losses(
+    model: Union[PreTrainedModel, InferenceBackend],
+    input_ids: torch.Tensor,
+    attention_mask: torch.Tensor,
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    """
+    Per-token next-token cross-entropy of a right-padded batch.
+
+    Returns (token_losses, target_mask), both (batch, seq_len - 1):
+    position j holds the loss of predicting token j + 1, and the mask is
+    1.0 where that target is a real (non-padded) token. A plain model runs
+    through the eager backend.
+    """
+    token_losses = as_backend(model).token_losses(input_ids, attention_mask).to(attention_mask.device)
+    shift_mask = attention_mask[:, 1:].to(token_losses.dtype)
+
+    return token_losses, shift_mask
+
+
+def compute_sequence_losses(
+    model: Union[PreTrainedModel, InferenceBackend],
+    input_ids: torch.Tensor,
+    attention_mask: torch.Tensor,
+) -> torch.Tensor:
+    """
+    Mean next-token cross-entropy per row of a right-padded batch.
+
+    Matches the HF `labels=input_ids` loss of each row run on its own:
+    logits are shifted by one, padded targets are masked out and the
+    sum is divided by the number of real targets in that row.
+    """
+    token_losses, shift_mask = compute_token_losses(model, input_ids, attention_mask)
+    return (token_losses * shift_mask).sum(dim=1) / shift_mask.sum(dim=1)
+
+
+def plan_windows(num_tokens: int, window: int, stride: int) -> List[Tuple[int, int, int]]:
+    """
+    Strided sliding windows over a token sequence as (begin, end, target_start).
+
+    Window k covers tokens [k * stride, k * stride + window); only tokens
+    from `target_start` (the previous window's end) on are scored, so every
+    token is predicted exactly once and the overlap serves as context.
+    A sequence that fits in one window yields [(0, num_tokens, 0)].
+    """
+    windows: List[Tuple[int, int, int]] = []
+    begin, prev_end = 0, 0
+    while True:
+        end = min(begin + window, num_tokens)
+        windows.append((begin, end, prev_end))
+        if end >= num_tokens:
+            return windows
+        prev_end = end
+        begin += stride
+
+
+def compute_window_token_losses(
+    model: Union[PreTrainedModel, InferenceBackend],
+    input_ids: Union[List[int], np.ndarray],
+    windows: List[Tuple[int, int, int]],
+    pad_token_id: int,
+    device: torch.device,
+) -> np.ndarray:
+    """
+    Loss of every token of `input_ids` from one forward pass over all windows.
+
+    Returns a float32 array aligned with `input_ids`; entry t is the loss of
+    predicting token t from its window's context, NaN where no window scores
+    it (token 0, or tokens outside the windows). Positions before a window's
+    `target_start` only provide context.
+    """
+    batch_ids, attention_mask = pad_batch(
+        [input_ids[begin:end] for begin, end, _ in windows], pad_token_id, device
+    )
+    token_losses, target_mask = compute_token_losses(model, batch_ids, attention_mask)
+
+    # Shifted position j predicts token begin + j + 1
+    offsets = torch.arange(1, target_mask.size(1) + 1, device=target_mask.device)
+    begins = torch.tensor([begin for begin, _, _ in windows], device=target_mask.device)
+    context = torch.tensor([start - begin for begin, _, start in windows], device=target_mask.device)
+    scored = (target_mask > 0) & (offsets[None, :] >= context[:, None])
+    positions = (begins[:, None] + offsets[None, :])[scored]
+
+    losses = np.full(len(input_ids), np.nan, dtype=np.float32)
+    losses[positions.cpu().numpy()] = token_losses[scored].cpu().numpy()
+    return losses
+
+
+def summarize_windows(
+    token_losses: np.ndarray,
+    windows: List[Tuple[int, int, int]],
+) -> Tuple[List[float], List[int]]:
+    """
+    Summed target NLL and target count per window from compute_window_token_losses output.
+
+    The aggregate loss over the sequence is sum(nll) / sum(counts).
+    """
+    nll_sums, counts = [], []
+    for _, end, start in windows:
+        window = token_losses[start:end]
+        scored = window[~np.isnan(window)]
+        nll_sums.append(float(scored.astype(np.float64).sum()))
+        counts.append(int(scored.size))
+    return nll_sums, counts
+
+
+def pad_batch(
+    sequences: Sequence[Union[List[int], np.ndarray]],
+    pad_token_id: int,
+    device: torch.device,
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    """
+    Right-pad token id sequences into (input_ids, attention_mask) tensors.
+
+    Rows are copied once into a single int64 numpy buffer which torch then
+    wraps without copying (no per-row tensor construction).
+    """
+    lengths = np.fromiter((len(seq) for seq in sequences), dtype=np.int64, count=len(sequences))
+    max_len = int(lengths.max())
+    input_ids = np.full((len(sequences), max_len), pad_token_id, dtype=np.int64)
+
+    for row, seq in enumerate(sequences):
+        input_ids[row, :lengths[row]] = seq
+
+    attention_mask = (np.arange(max_len)[None, :] < lengths[:, None]).astype(np.int64)
+
+    return torch.from_numpy(input_ids).to(device), torch.from_numpy(attention_mask).to(device)
+
+
+def bucket_by_length(
+    lengths: List[int],
+    max_batch_size: int,
+    max_batch_tokens: int,
+) -> List[List[int]]:
+    """
+    Group sequence indices into length-sorted buckets.
+
+    Indices are sorted by token length so each bucket pads to a similar
+    length; a bucket closes when it reaches `max_batch_size` rows or its
+    padded size (rows x longest) would exceed `max_batch_tokens`.
+    """
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    buckets: List[List[int]] = []
+    current: List[int] = []
+
+    for idx in order:
+        # Sorted ascending, so the incoming sequence is the bucket's longest
+        padded_size = (len(current) + 1) * lengths[idx]
+        if current and (len(current) >= max_batch_size or padded_size > max_batch_tokens):
+            buckets.append(current)
+            current = []
+        current.append(idx)
+
+    if current:
+        buckets.append(current)
+
+    return buckets
+
+
+class PerplexityBatcher:
+    """
+    Micro-batching front for the perplexity model.
+
+    Callers submit token id lists from any thread; a single worker thread
+    drains the queue into batches bounded by `max_batch_size` and
+    `max_wait_ms`, runs one padded forward pass and resolves each
+    caller's future with its own sequence loss.
+    """
+
+    def __init__(
+        self,
+        model: Union[PreTrainedModel, InferenceBackend],
+        tokenizer: PreTrainedTokenizerBase,
+        device: torch.device,
+        config: Optional[BatchSchedulerConfig] = None,
+    ):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.device = device
+        self.config = config or BatchSchedulerConfig()
+        self.config.validate()
+
+        self._queue: "queue.Queue[Optional[Tuple[List[int], Future]]]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._running = False
+
+        # Metrics
+        self.total_batches = 0
+        self.total_sequences = 0
+        self.max_observed_batch = 0
+
+    def start(self):
+        """Start the worker thread (idempotent)."""
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+            self._worker = threading.Thread(
+                target=self._run,
+                name="perplexity-batcher",
+                daemon=True,
+            )
+            self._worker.start()
+            logging.info(
+                "Perplexity batcher started",
+                extra={
+                    "max_batch_size": self.config.max_batch_size,
+                    "max_wait_ms": self.config.max_wait_ms,
+                }
+            )
+
+    def stop(self, timeout: Optional[float] = 5.0):
+        """Stop the worker thread after it drains pending requests."""
+        with self._lock:
+            if not self._running:
+                return
+            self._running = False
+            self._queue.put(None)
+            worker = self._worker
+            self._worker = None
+
+        if worker is not None:
+            worker.join(timeout=timeout)
+        logging.info("Perplexity batcher stopped")
+
+    def submit(self, input_ids: Union[List[int], np.ndarray]) -> Future:
+        """Queue one tokenized sequence; the future resolves to its loss."""
+        if len(input_ids) == 0:
+            raise ValueError("Cannot score an empty token sequence")
+
+        self.start()
+        future: Future = Future()
+        self._queue.put((input_ids[:self.config.max_tokens], future))
+        return future
+
+    def compute_loss(self, input_ids: Union[List[int], np.ndarray], timeout: Optional[float] = None) -> float:
+        """Blocking helper: submit and wait for the sequence loss."""
+        return self.submit(input_ids).result(timeout=timeout)
+
+    def _collect_batch(self, first: Tuple[List[int], Future]) -> List[Tuple[List[int], Future]]:
+        batch = [first]
+        deadline = time.monotonic() + self.config.max_wait_ms / 1000.0
+
+        while len(batch) < self.config.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+
+            if item is None:
+                # Re-post the stop sentinel so the main loop exits after this batch
+                self._queue.put(None)
+                break
+            batch.append(item)
+
+        return batch
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+
+            batch = self._collect_batch(item)
+            self._process_batch(batch)
+
+    def _process_batch(self, batch: List[Tuple[List[int], Future]]):
+        sequences = [seq for seq, _ in batch]
+        futures = [fut for _, fut in batch]
+
+        try:
+            input_ids, attention_mask = pad_batch(
+                sequences, self.tokenizer.pad_token_id, self.device
+            )
+            losses = compute_sequence_losses(self.model, input_ids, attention_mask).tolist()
+
+            for fut, loss in zip(futures, losses):
+                fut.set_result(loss)
+
+        except Exception as e:
+            logging.error(f"Perplexity batch failed: {e}")
+            error = CustomException(f"PERPLEXITY_BATCH_ERROR: {str(e)}", sys)
+            for fut in futures:
+                if not fut.done():
+                    fut.set_exception(error)
+
+        self.total_batches += 1
+        self.total_sequences += len(batch)
+        self.max_observed_batch = max(self.max_observed_batch, len(batch))
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get batching metrics."""
+        avg_batch = (
+            round(self.total_sequences / self.total_batches, 2)
+            if self.total_batches > 0 else 0.0
+        )
+
+        return {
+            "total_batches": self.total_batches,
+            "total_sequences": self.total_sequences,
+            "avg_batch_size": avg_batch,
+            "max_observed_batch": self.max_observed_batch,
+        }
@@ -0,0 +1,135 @@
+from __future__ import annotations
+import os
+import sys
+import time
+import sqlite3
+import threading
+from typing import Optional, Dict, List, Any
+
+from src.logger import logging
+from src.exception import CustomException
+
+
+class PerplexityStore:
+    """
+    Disk-backed (SQLite) perplexity cache that survives restarts.
+
+    Rows are keyed on (normalized_hash, model_id, max_tokens), so a model
+    swap or a different truncation length never reuses stale values.
+    Only perplexity is stored; scores are re-derived from the current
+    thresholds on read.
+    """
+
+    DB_FILENAME = "perplexity_cache.sqlite3"
+
+    def __init__(self, cache_dir: str):
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            self.db_path = os.path.join(os.path.abspath(cache_dir), self.DB_FILENAME)
+
+            self._lock = threading.Lock()
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS perplexity (
+                    normalized_hash TEXT NOT NULL,
+                    model_id TEXT NOT NULL,
+                    max_tokens INTEGER NOT NULL,
+                    perplexity REAL NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (normalized_hash, model_id, max_tokens)
+                )
+                """
+            )
+            self._conn.commit()
+
+            # Metrics
+            self.hits = 0
+            self.misses = 0
+            self.writes = 0
+
+            logging.info(
+                "Perplexity store opened",
+                extra={"db_path": self.db_path, "entries": len(self)}
+            )
+
+        except Exception as e:
+            logging.error(f"Failed to open perplexity store: {e}")
+            raise CustomException(f"PERPLEXITY_STORE_ERROR: {str(e)}", sys)
+
+    def get(self, normalized_hash: str, model_id: str, max_tokens: int) -> Optional[float]:
+        return self.get_many([normalized_hash], model_id, max_tokens).get(normalized_hash)
+
+    def get_many(
+        self,
+        normalized_hashes: List[str],
+        model_id: str,
+        max_tokens: int,
+    ) -> Dict[str, float]:
+        """Look up many hashes in one query; missing hashes are absent from the result."""
+        unique = list(dict.fromkeys(normalized_hashes))
+        if not unique:
+            return {}
+
+        found: Dict[str, float] = {}
+        try:
+            with self._lock:
+                # Chunk to stay under SQLite's bound-parameter limit
+                for start in range(0, len(unique), 500):
+                    chunk = unique[start:start + 500]
+                    placeholders = ",".join("?" * len(chunk))
+                    rows = self._conn.execute(
+                        f"SELECT normalized_hash, perplexity FROM perplexity "
+                        f"WHERE model_id = ? AND max_tokens = ? AND normalized_hash IN ({placeholders})",
+                        (model_id, max_tokens, *chunk),
+                    ).fetchall()
+                    found.update(rows)
+        except sqlite3.Error as e:
+            logging.warning(f"Perplexity store read failed: {e}")
+            return {}
+
+        self.hits += len(found)
+        self.misses += len(unique) - len(found)
+        return found
+
+    def put(self, normalized_hash: str, model_id: str, max_tokens: int, perplexity: float):
+        self.put_many({normalized_hash: perplexity}, model_id, max_tokens)
+
+    def put_many(self, values: Dict[str, float], model_id: str, max_tokens: int):
+        if not values:
+            return
+
+        now = time.time()
+        try:
+            with self._lock:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO perplexity "
+                    "(normalized_hash, model_id, max_tokens, perplexity, created_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    [(h, model_id, max_tokens, float(p), now) for h, p in values.items()],
+                )
+                self._conn.commit()
+            self.writes += len(values)
+        except sqlite3.Error as e:
+            # Cache writes must never fail a detection
+            logging.warning(f"Perplexity store write failed: {e}")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM perplexity").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+        logging.info("Perplexity store closed")
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get store metrics."""
+        return {
+            "db_path": self.db_path,
+            "hits": self.hits,
+            "misses": self.misses,
+            "writes": self.writes,
+        }
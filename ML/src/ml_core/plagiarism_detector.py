@@ -5,12 +5,16 @@ import hashlib
 import time
 import difflib
 from typing import Optional, List, Dict, Tuple, Any
-from dataclasses import dataclass, field, asdict
+from dataclasses import dataclass, field, asdict, replace
 from functools import lru_cache
 
 from src.logger import logging
 from src.exception import CustomException
-from src.components.normalization import Normalizer
+from src.components.normalization import Normalizer, NormalizedForms
+from src.components.analysis_context import AnalysisContext
+from src.ml_core.result_cache import ResultCache, config_fingerprint, hash_text
+from src.ml_core.fingerprint_index import FingerprintIndex, tokenize_code
+from src.ml_core.minhash_lsh import MinHasher, LSHIndex, estimate_jaccard
 
 
 @dataclass
@@ -93,10 +97,23 @@ class PlagiarismDetectorConfig:
     max_code_length: int = 50000
     max_patterns_to_check: int = 100
     
+    # Candidate retrieval: "fingerprint" (winnowing), "minhash" (MinHash + LSH) or "none"
+    candidate_generator: str = "fingerprint"
+    fingerprint_k: int = 5  # tokens per k-gram (fingerprints and MinHash shingles)
+    fingerprint_window: int = 4  # winnowing window (in k-grams)
+    candidate_top_k: int = 20  # patterns passed on to difflib
+    
+    # MinHash + LSH (bands x rows must not exceed num_perm)
+    minhash_num_perm: int = 128
+    minhash_bands: int = 32
+    minhash_rows: int = 4
+    near_duplicate_threshold: float = 0.8  # estimated Jaccard for find_near_duplicates
+    
     # Performance
     enable_early_termination: bool = True  # Stop at first exact match
     enable_caching: bool = True
     cache_size: int = 500
+    cache_ttl_seconds: Optional[float] = None  # None = no expiry
     
     @classmethod
     def from_env(cls) -> PlagiarismDetectorConfig:
@@ -105,7 +122,27 @@ class PlagiarismDetectorConfig:
         return cls(
             high_similarity_threshold=float(os.getenv("PLAG_HIGH_THRESHOLD", 0.95)),
             medium_similarity_threshold=float(os.getenv("PLAG_MEDIUM_THRESHOLD", 0.85)),
+            candidate_generator=os.getenv("PLAG_CANDIDATE_GENERATOR", "fingerprint"),
+            enable_caching=os.getenv("PLAG_ENABLE_CACHING", "true").lower() == "true",
+            cache_size=int(os.getenv("PLAG_CACHE_SIZE", 500)),
+            cache_ttl_seconds=float(os.environ["PLAG_CACHE_TTL_SECONDS"]) if os.getenv("PLAG_CACHE_TTL_SECONDS") else None,
         )
+    
+    def validate(self):
+        """Validate config consistency."""
+        if self.candidate_generator not in ("fingerprint", "minhash", "none"):
+            raise ValueError(f"Invalid candidate_generator: {self.candidate_generator}")
+        
+        if self.minhash_bands * self.minhash_rows > self.minhash_num_perm:
+            raise ValueError(
+                f"minhash_bands x minhash_rows ({self.minhash_bands * self.minhash_rows}) "
+                f"exceeds minhash_num_perm ({self.minhash_num_perm})"
+            )
+        
+        if self.cache_size < 1:
+            raise ValueError(f"cache_size must be >= 1, got {self.cache_size}")
+        if self.cache_ttl_seconds is not None and self.cache_ttl_seconds <= 0:
+            raise ValueError(f"cache_ttl_seconds must be > 0 or None, got {self.cache_ttl_seconds}")
 
 
 @dataclass
@@ -119,17 +156,25 @@ class AlgorithmPattern:
     hash_medium: str = ""
     hash_aggressive: str = ""
     
+    # Precomputed once by compute_hashes; read by every detection path
+    normalized: Dict[str, str] = field(default_factory=dict, repr=False)
+    tokens: List[str] = field(default_factory=list, repr=False)
+    ast_dump: Optional[str] = field(default=None, repr=False)
+    
     def compute_hashes(self, normalizer: Normalizer):
-        """Precompute normalized hashes."""
-        self.hash_light = self._hash_code(
-            normalizer.normalize(self.code, "light")
-        )
-        self.hash_medium = self._hash_code(
-            normalizer.normalize(self.code, "medium")
-        )
-        self.hash_aggressive = self._hash_code(
-            normalizer.normalize(self.code, "aggressive")
-        )
+        """Precompute normalized texts, hashes, token stream and AST dump."""
+        self.normalized = normalizer.normalize_all(self.code).as_dict()
+        
+        self.hash_light = self._hash_code(self.normalized["light"])
+        self.hash_medium = self._hash_code(self.normalized["medium"])
+        self.hash_aggressive = self._hash_code(self.normalized["aggressive"])
+        
+        self.tokens = tokenize_code(self.normalized["medium"])
+        
+        try:
+            self.ast_dump = ast.dump(ast.parse(self.code))
+        except SyntaxError:
+            self.ast_dump = None
     
     @staticmethod
     def _hash_code(code: str) -> str:
@@ -202,19 +247,36 @@ def fibonacci(n):
 
 class PlagiarismDetector:
     
+    # Exact-match precedence and confidence per normalization level
+    EXACT_MATCH_LEVELS = (
+        ("aggressive", 1.0),
+        ("medium", 1.0),
+        ("light", 0.95),  # Slightly lower confidence for light match
+    )
+    
     def __init__(
         self,
         config: Optional[PlagiarismDetectorConfig] = None,
         normalizer: Optional[Normalizer] = None,
-        patterns: Optional[List[AlgorithmPattern]] = None
+        patterns: Optional[List[AlgorithmPattern]] = None,
+        cache: Optional[ResultCache] = None
     ):
         self.config = config or PlagiarismDetectorConfig.from_env()
+        self.config.validate()
         self.normalizer = normalizer or Normalizer()
         
         # Load and preprocess patterns
         self.patterns = patterns or DEFAULT_PATTERNS
         self._preprocess_patterns()
         
+        # Result cache (may be shared with the AI detector)
+        self.cache: Optional[ResultCache] = None
+        if self.config.enable_caching:
+            self.cache = cache if cache is not None else ResultCache(
+                max_size=self.config.cache_size,
+                ttl_seconds=self.config.cache_ttl_seconds,
+            )
+        
         # Metrics
         self.total_detections = 0
         self.total_processing_time_ms = 0
@@ -232,6 +294,49 @@ class PlagiarismDetector:
         logging.info("Preprocessing pattern database...")
         for pattern in self.patterns:
             pattern.compute_hashes(self.normalizer)
+        
+        # Exact-match tables: level -> hash -> patterns (corpus order)
+        self._exact_index: Dict[str, Dict[str, List[AlgorithmPattern]]] = {
+            "light": {}, "medium": {}, "aggressive": {},
+        }
+        for pattern in self.patterns:
+            self._exact_index["light"].setdefault(pattern.hash_light, []).append(pattern)
+            self._exact_index["medium"].setdefault(pattern.hash_medium, []).append(pattern)
+            self._exact_index["aggressive"].setdefault(pattern.hash_aggressive, []).append(pattern)
+        
+        # First pattern wins on duplicate names, as the old linear lookup did
+        self._patterns_by_name: Dict[str, AlgorithmPattern] = {}
+        for pattern in self.patterns:
+            self._patterns_by_name.setdefault(pattern.name, pattern)
+        
+        # Candidate index over the medium/aggressive token stream
+        self.fingerprint_index: Optional[FingerprintIndex] = None
+        self.minhasher: Optional[MinHasher] = None
+        self.lsh_index: Optional[LSHIndex] = None
+        
+        if self.config.candidate_generator == "fingerprint":
+            self.fingerprint_index = FingerprintIndex(
+                k=self.config.fingerprint_k,
+                window=self.config.fingerprint_window,
+            )
+            for pattern_id, pattern in enumerate(self.patterns):
+                self.fingerprint_index.add_tokens(pattern_id, pattern.tokens)
+        
+        elif self.config.candidate_generator == "minhash":
+            self.minhasher = self._build_minhasher()
+            self.lsh_index = LSHIndex(
+                bands=self.config.minhash_bands,
+                rows=self.config.minhash_rows,
+            )
+            # Whole corpus signed in one vectorized pass
+            signatures = self.minhasher.sign_tokens_batch([pattern.tokens for pattern in self.patterns])
+            self.lsh_index.insert_batch(signatures)
+        
+        # Pattern set is part of the cache key: new patterns invalidate old results
+        self.patterns_fingerprint = hash_text(
+            "|".join(f"{p.name}:{p.hash_aggressive}" for p in self.patterns)
+        )[:16]
+        self.config_fingerprint = config_fingerprint(self.config, self.patterns_fingerprint)
         logging.info(f"Preprocessed {len(self.patterns)} patterns")
     
     
@@ -250,13 +355,14 @@ class PlagiarismDetector:
         ratio = min(len1, len2) / max(len1, len2)
         return self.config.length_ratio_min <= ratio <= self.config.length_ratio_max
     
-    def _check_exact_match(self, code: str) -> Optional[PlagiarismMatch]:
+    def _check_exact_match(
+        self,
+        code: str,
+        forms: Optional[NormalizedForms] = None
+    ) -> Optional[PlagiarismMatch]:
 
-        normalized = {
-            "light": self.normalizer.normalize(code, "light"),
-            "medium": self.normalizer.normalize(code, "medium"),
-            "aggressive": self.normalizer.normalize(code, "aggressive"),
-        }
+        forms = forms or self.normalizer.normalize_all(code)
+        normalized = forms.as_dict()
         
         # Compute hashes
         hashes = {
@@ -264,51 +370,109 @@ class PlagiarismDetector:
             for level, norm_code in normalized.items()
         }
         
-        # Check against patterns
-        for pattern in self.patterns:
-            # Check aggressive first (most strict)
-            if hashes["aggressive"] == pattern.hash_aggressive:
+        # Three dict lookups, most strict level first
+        for level, confidence in self.EXACT_MATCH_LEVELS:
+            matched = self._exact_index[level].get(hashes[level])
+            if matched:
+                # Earliest pattern in the corpus wins, as with the old linear scan
+                pattern = matched[0]
                 return PlagiarismMatch(
                     pattern_name=pattern.name,
                     similarity=1.0,
                     match_type="exact",
-                    normalization_level="aggressive",
+                    normalization_level=level,
                     sources=pattern.sources,
-                    confidence=1.0
-                )
-            
-            # Check medium
-            if hashes["medium"] == pattern.hash_medium:
-                return PlagiarismMatch(
-                    pattern_name=pattern.name,
-                    similarity=1.0,
-                    match_type="exact",
-                    normalization_level="medium",
-                    sources=pattern.sources,
-                    confidence=1.0
-                )
-            
-            # Check light
-            if hashes["light"] == pattern.hash_light:
-                return PlagiarismMatch(
-                    pattern_name=pattern.name,
-                    similarity=1.0,
-                    match_type="exact",
-                    normalization_level="light",
-                    sources=pattern.sources,
-                    confidence=0.95  # Slightly lower confidence for light match
+                    confidence=confidence
                 )
         
         return None
 
     
+    def _select_candidates(
+        self,
+        normalized_medium: str,
+        max_patterns: Optional[int] = None
+    ) -> List[AlgorithmPattern]:
+        """
+        Patterns worth an exact similarity check.
+
+        Small corpora are scanned in full. Larger ones are narrowed to the
+        top-K patterns by shared winnowing fingerprints, so difflib cost no
+        longer grows with the corpus.
+        """
+        top_k = self.config.candidate_top_k
+        if self.config.candidate_generator == "none" or len(self.patterns) <= top_k:
+            # Limit patterns if requested
+            return self.patterns[:max_patterns] if max_patterns else self.patterns
+        
+        if max_patterns:
+            top_k = min(top_k, max_patterns)
+        
+        if self.lsh_index is not None:
+            candidates = self.lsh_index.query(self.minhasher.sign(normalized_medium), top_k)
+        else:
+            candidates = self.fingerprint_index.query(normalized_medium, top_k)
+        
+        return [self.patterns[pattern_id] for pattern_id, _ in candidates]
+    
+    def _build_minhasher(self) -> MinHasher:
+        return MinHasher(
+            num_perm=self.config.minhash_num_perm,
+            k=self.config.fingerprint_k,
+        )
+    
+    def find_near_duplicates(
+        self,
+        codes: List[str],
+        threshold: Optional[float] = None
+    ) -> List[Tuple[int, int, float]]:
+        """
+        Near-duplicate pairs within a set of submissions via MinHash + LSH.
+        
+        All submissions are signed in one vectorized pass and bucketed into
+        banded LSH tables, so only colliding pairs are scored. Returns
+        (i, j, estimated_jaccard) with i < j, most similar first.
+        """
+        try:
+            threshold = self.config.near_duplicate_threshold if threshold is None else threshold
+            minhasher = self.minhasher or self._build_minhasher()
+            
+            normalized = [
+                self.normalizer.normalize(code, "medium") if code and code.strip() else ""
+                for code in codes
+            ]
+            signatures = minhasher.sign_batch(normalized)
+            
+            lsh = LSHIndex(bands=self.config.minhash_bands, rows=self.config.minhash_rows)
+            lsh.insert_batch(signatures)
+            
+            pairs = []
+            for i, j in lsh.candidate_pairs():
+                similarity = estimate_jaccard(signatures[i], signatures[j])
+                if similarity >= threshold:
+                    pairs.append((i, j, round(similarity, 3)))
+            
+            pairs.sort(key=lambda pair: pair[2], reverse=True)
+            
+            logging.info(
+                "Near-duplicate scan complete",
+                extra={"num_submissions": len(codes), "num_pairs": len(pairs)}
+            )
+            
+            return pairs
+        
+        except Exception as e:
+            logging.error(f"Near-duplicate scan failed: {e}")
+            raise CustomException(f"NEAR_DUPLICATE_ERROR: {str(e)}", sys)
+    
     def _calculate_similarity(self, code1: str, code2: str) -> float:
         return difflib.SequenceMatcher(None, code1, code2).ratio()
     
     def _check_similarity(
         self,
         code: str,
-        max_patterns: Optional[int] = None
+        max_patterns: Optional[int] = None,
+        forms: Optional[NormalizedForms] = None
     ) -> Tuple[List[PlagiarismMatch], Dict[str, float]]:
 
         matches = []
@@ -319,22 +483,14 @@ class PlagiarismDetector:
         }
         
         # Normalize submission at all levels
-        normalized_submission = {
-            "light": self.normalizer.normalize(code, "light"),
-            "medium": self.normalizer.normalize(code, "medium"),
-            "aggressive": self.normalizer.normalize(code, "aggressive"),
-        }
+        forms = forms or self.normalizer.normalize_all(code)
+        normalized_submission = forms.as_dict()
         
-        # Limit patterns if requested
-        patterns_to_check = self.patterns[:max_patterns] if max_patterns else self.patterns
+        patterns_to_check = self._select_candidates(normalized_submission["medium"], max_patterns)
         
         for pattern in patterns_to_check:
-            # Normalize pattern at all levels (cached in pattern object)
-            pattern_normalized = {
-                "light": self.normalizer.normalize(pattern.code, "light"),
-                "medium": self.normalizer.normalize(pattern.code, "medium"),
-                "aggressive": self.normalizer.normalize(pattern.code, "aggressive"),
-            }
+            # Pattern normalizations are precomputed in _preprocess_patterns
+            pattern_normalized = pattern.normalized
             
             # Calculate similarity at each level
             similarities = {}
@@ -388,11 +544,19 @@ class PlagiarismDetector:
         return matches, max_similarities
     
     
-    def _calculate_structural_similarity(self, code1: str, code2: str) -> float:
+    def _calculate_structural_similarity(
+        self,
+        code1: str,
+        code2: str,
+        tree2: Optional[str] = None,
+        tree1: Optional[str] = None
+    ) -> float:
 
         try:
-            tree1 = ast.dump(ast.parse(code1))
-            tree2 = ast.dump(ast.parse(code2))
+            if tree1 is None:
+                tree1 = ast.dump(ast.parse(code1))
+            if tree2 is None:
+                tree2 = ast.dump(ast.parse(code2))
             return difflib.SequenceMatcher(None, tree1, tree2).ratio()
         except SyntaxError:
             return 0.0
@@ -401,7 +565,119 @@ class PlagiarismDetector:
             return 0.0
     
     
-    def detect(self, code: str) -> PlagiarismResult:
+    def _best_match_structural_similarity(
+        self,
+        code: str,
+        best_match: Optional[PlagiarismMatch],
+        context: Optional[AnalysisContext] = None,
+    ) -> float:
+        """Structural similarity of `code` to the best match's pattern (0.0 without one)."""
+        if best_match is None:
+            return 0.0
+        pattern = self._patterns_by_name.get(best_match.pattern_name)
+        if pattern is None or pattern.ast_dump is None:
+            return 0.0
+        return self._calculate_structural_similarity(
+            code,
+            pattern.code,
+            tree2=pattern.ast_dump,
+            tree1=context.ast_dump if context is not None else None,
+        )
+    
+    def _is_early_exact(self, result: PlagiarismResult) -> bool:
+        """Exact-match early termination reports a fixed structural similarity of 1.0."""
+        return (
+            self.config.enable_early_termination and
+            result.best_match is not None and
+            result.best_match.match_type == "exact"
+        )
+    
+    def _truncate(
+        self,
+        code: str,
+        forms: Optional[NormalizedForms],
+        context: Optional[AnalysisContext],
+    ) -> Tuple[str, Optional[NormalizedForms], Optional[AnalysisContext]]:
+        """Cut `code` to max_code_length; shared forms / context are dropped if that changed it."""
+        if len(code) <= self.config.max_code_length:
+            return code, forms, context
+        return code[:self.config.max_code_length], None, None
+    
+    def _cache_key(self, code: str, forms: Optional[NormalizedForms] = None) -> str:
+        return ResultCache.make_key(
+            "plagiarism",
+            self.config_fingerprint,
+            forms.light if forms else self.normalizer.normalize(code, "light"),
+        )
+    
+    def _from_cache(
+        self,
+        cache_key: str,
+        code: str,
+        context: Optional[AnalysisContext],
+        original_length: int,
+        start_time: float,
+    ) -> Optional[PlagiarismResult]:
+        """Cached result for this submission with fresh timing, or None."""
+        cached = self.cache.get(cache_key)
+        if cached is None:
+            return None
+        
+        # The key is the light form, but the structural score reads the raw
+        # parse tree (docstrings included), so it is recomputed per submission
+        structural_similarity = cached.structural_similarity
+        if not self._is_early_exact(cached):
+            structural_similarity = round(
+                self._best_match_structural_similarity(code, cached.best_match, context), 3
+            )
+        processing_time_ms = int((time.time() - start_time) * 1000)
+        self.total_detections += 1
+        self.total_processing_time_ms += processing_time_ms
+        return replace(
+            cached,
+            structural_similarity=structural_similarity,
+            code_length=original_length,
+            processing_time_ms=processing_time_ms,
+        )
+    
+    def get_cached(self, code: str, context: Optional[AnalysisContext] = None) -> Optional[PlagiarismResult]:
+        """
+        Result for `code` from the result cache, or None.
+        
+        Lets a caller that runs detect() elsewhere (a worker process without
+        access to this cache) skip the round trip on repeat submissions.
+        """
+        if self.cache is None or not isinstance(code, str) or not code.strip():
+            return None
+        
+        start_time = time.time()
+        original_length = len(code)
+        code, forms, context = self._truncate(code, context.forms if context is not None else None, context)
+        return self._from_cache(self._cache_key(code, forms), code, context, original_length, start_time)
+    
+    def put_cached(self, code: str, result: PlagiarismResult, context: Optional[AnalysisContext] = None):
+        """Store a result computed elsewhere for `code` (see get_cached)."""
+        if self.cache is None:
+            return
+        code, forms, _ = self._truncate(code, context.forms if context is not None else None, context)
+        self.cache.put(self._cache_key(code, forms), result)
+    
+    def detect(
+        self,
+        code: str,
+        forms: Optional[NormalizedForms] = None,
+        context: Optional[AnalysisContext] = None
+    ) -> PlagiarismResult:
+        """
+        Detect plagiarism against the pattern corpus.
+        
+        `forms` may carry the submission's precomputed normalizations and
+        `context` its shared parse tree (both built once in /analyze), so
+        nothing is re-normalized or re-parsed.
+        """
+        if context is not None:
+            forms = forms or context.forms
+        
 
         start_time = time.time()
         original_length = len(code)
@@ -416,10 +692,21 @@ class PlagiarismDetector:
             
             if len(code) > self.config.max_code_length:
                 logging.warning(f"Code truncated from {len(code)} to {self.config.max_code_length}")
-                code = code[:self.config.max_code_length]
+            code, forms, context = self._truncate(code, forms, context)
+            
+            # Step 0: Repeat submissions skip the normalization and difflib scans
+            cache_key = None
+            if self.cache is not None:
+                cache_key = self._cache_key(code, forms)
+                cached = self._from_cache(cache_key, code, context, original_length, start_time)
+                if cached is not None:
+                    return cached
+            
+            # All three levels once, shared by every step below
+            forms = forms or self.normalizer.normalize_all(code)
             
             # Step 1: Check for exact match (fastest)
-            exact_match = self._check_exact_match(code)
+            exact_match = self._check_exact_match(code, forms)
             
             if exact_match and self.config.enable_early_termination:
                 # Early termination on exact match
@@ -428,11 +715,9 @@ class PlagiarismDetector:
                 self.total_processing_time_ms += processing_time_ms
                 
                 # Generate hash
-                normalized_hash = self._hash_code(
-                    self.normalizer.normalize(code, "aggressive")
-                )
+                normalized_hash = self._hash_code(forms.aggressive)
                 
-                return PlagiarismResult(
+                result = PlagiarismResult(
                     is_plagiarized=True,
                     confidence=exact_match.confidence,
                     risk_level="HIGH",
@@ -448,11 +733,17 @@ class PlagiarismDetector:
                     reasoning=f"Exact match found: {exact_match.pattern_name}",
                     recommendations=["BLOCK_AND_REPORT: Exact copy of known algorithm"]
                 )
+                
+                if self.cache is not None:
+                    self.cache.put(cache_key, result)
+                
+                return result
             
             # Step 2: Fuzzy similarity check
             similarity_matches, max_similarities = self._check_similarity(
                 code,
-                max_patterns=self.config.max_patterns_to_check
+                max_patterns=self.config.max_patterns_to_check,
+                forms=forms
             )
             
             # Combine exact match with similarity matches if exists
@@ -470,14 +761,7 @@ class PlagiarismDetector:
             )
             
             # Step 3: Structural similarity (for best match only)
-            structural_similarity = 0.0
-            if best_match:
-                pattern_code = next(
-                    (p.code for p in self.patterns if p.name == best_match.pattern_name),
-                    None
-                )
-                if pattern_code:
-                    structural_similarity = self._calculate_structural_similarity(code, pattern_code)
+            structural_similarity = self._best_match_structural_similarity(code, best_match, context)
             
             # Determine verdict and risk level
             if overall_similarity >= self.config.high_similarity_threshold:
@@ -526,9 +810,7 @@ class PlagiarismDetector:
             self.total_processing_time_ms += processing_time_ms
             
             # Generate hash
-            normalized_hash = self._hash_code(
-                self.normalizer.normalize(code, "aggressive")
-            )
+            normalized_hash = self._hash_code(forms.aggressive)
             
             # Build result
             result = PlagiarismResult(
@@ -560,6 +842,9 @@ class PlagiarismDetector:
                 }
             )
             
+            if self.cache is not None:
+                self.cache.put(cache_key, result)
+            
             return result
         
         except ValueError as e:
@@ -574,16 +859,8 @@ class PlagiarismDetector:
         
         try:
             # Normalize both at all levels
-            norm1 = {
-                "light": self.normalizer.normalize(code1, "light"),
-                "medium": self.normalizer.normalize(code1, "medium"),
-                "aggressive": self.normalizer.normalize(code1, "aggressive"),
-            }
-            norm2 = {
-                "light": self.normalizer.normalize(code2, "light"),
-                "medium": self.normalizer.normalize(code2, "medium"),
-                "aggressive": self.normalizer.normalize(code2, "aggressive"),
-            }
+            norm1 = self.normalizer.normalize_all(code1).as_dict()
+            norm2 = self.normalizer.normalize_all(code2).as_dict()
             
             # Calculate similarity at each level
             similarity_by_level = {}
@@ -632,12 +909,17 @@ class PlagiarismDetector:
             if self.total_detections > 0 else 0.0
         )
         
-        return {
+        metrics = {
             "total_detections": self.total_detections,
             "total_processing_time_ms": self.total_processing_time_ms,
             "avg_processing_time_ms": avg_time,
             "num_patterns": len(self.patterns),
         }
+        
+        if self.cache is not None:
+            metrics["cache"] = self.cache.get_metrics()
+        
+        return metrics
     
     def reset_metrics(self):
         """Reset metrics counters."""
@@ -0,0 +1,113 @@
+from __future__ import annotations
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import asdict, is_dataclass
+from typing import Optional, Any, Dict, Tuple
+
+from src.logger import logging
+
+
+def hash_text(text: str) -> str:
+    """SHA-256 hex digest of a string."""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def config_fingerprint(config: Any, *extra: str) -> str:
+    """
+    Stable short fingerprint of a detector config.
+
+    Any change to a config field (or to the extra parts, e.g. the pattern
+    set) yields a different fingerprint, so cached results computed under
+    an old config are never served.
+    """
+    payload = asdict(config) if is_dataclass(config) else dict(vars(config))
+    blob = json.dumps(payload, sort_keys=True, default=str) + "|" + "|".join(extra)
+    return hash_text(blob)[:16]
+
+
+class ResultCache:
+    """
+    Thread-safe LRU cache with optional TTL for detection results.
+
+    Keys are built from a namespace (detector name), the detector's config
+    fingerprint and the SHA-256 of the light-normalized code, so one
+    instance can be shared by several detectors.
+    """
+
+    def __init__(self, max_size: int = 500, ttl_seconds: Optional[float] = None):
+        if max_size < 1:
+            raise ValueError(f"max_size must be >= 1, got {max_size}")
+
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._store: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Metrics
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def make_key(namespace: str, fingerprint: str, normalized_code: str) -> str:
+        return f"{namespace}:{fingerprint}:{hash_text(normalized_code)}"
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._store.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            stored_at, value = entry
+            if self.ttl_seconds is not None and time.monotonic() - stored_at > self.ttl_seconds:
+                del self._store[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._store.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: str, value: Any):
+        with self._lock:
+            if key in self._store:
+                self._store.move_to_end(key)
+            self._store[key] = (time.monotonic(), value)
+
+            while len(self._store) > self.max_size:
+                self._store.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._store.clear()
+        logging.info("Result cache cleared")
+
+    def __len__(self) -> int:
+        return len(self._store)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get cache metrics."""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._store),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": round(self.hits / lookups, 3) if lookups > 0 else 0.0,
+        }
+
+    def reset_metrics(self):
+        """Reset metrics counters."""
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
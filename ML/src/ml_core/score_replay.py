@@ -0,0 +1,422 @@
+from __future__ import annotations
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+import threading
+from collections import Counter
+from dataclasses import dataclass, field, fields, replace
+from typing import Optional, Dict, Any, List, Tuple, get_args, get_origin, get_type_hints
+
+import numpy as np
+
+from src.logger import logging
+from src.exception import CustomException
+from src.ml_core.code_detector import AIDetectorConfig, DetectionResult
+from src.ml_core.plagiarism_detector import PlagiarismResult
+from src.ml_core.decision_engine import DecisionEngine, DecisionConfig
+
+
+# Columns persisted per analyzed submission (str columns are stored as unicode arrays)
+SCORE_COLUMNS: Dict[str, Any] = {
+    "submission_id": str,
+    "mode": str,
+    "timestamp": np.float64,
+    "perplexity": np.float64,
+    "ast_score": np.float64,
+    "style_score": np.float64,
+    "ai_confidence": np.float64,
+    "ai_risk_level": str,
+    "plag_confidence": np.float64,
+    "plag_similarity_light": np.float64,
+    "plag_similarity_medium": np.float64,
+    "plag_similarity_aggressive": np.float64,
+    "plag_structural_similarity": np.float64,
+    "action": str,
+    "label": np.int8,  # 1 = AI, 0 = human, -1 = unknown
+}
+
+AI_RISK_LEVELS = ("CLEAN", "LOW", "MEDIUM", "HIGH")
+
+
+def _parquet_available() -> bool:
+    try:
+        import pandas  # noqa: F401
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class ScoreLog:
+    """
+    Append-only columnar log of raw component scores.
+
+    Rows are buffered in memory and written as one NPZ (or Parquet, when
+    pandas + pyarrow are installed) chunk file per flush under `log_dir`,
+    so threshold changes can be replayed later without the model.
+
+    Files are written by a background thread (record() never does I/O, so
+    it is safe on the event loop), every `flush_interval_seconds` and as
+    soon as `flush_every` rows are buffered. At most one interval of rows
+    is lost if the process dies.
+    """
+
+    def __init__(
+        self,
+        log_dir: str,
+        flush_every: int = 1000,
+        file_format: str = "npz",
+        flush_interval_seconds: float = 10.0,
+    ):
+        if file_format not in ("npz", "parquet"):
+            raise ValueError(f"Invalid file_format: {file_format}")
+        if flush_interval_seconds <= 0:
+            raise ValueError(f"flush_interval_seconds must be > 0, got {flush_interval_seconds}")
+        if file_format == "parquet" and not _parquet_available():
+            raise ValueError("Parquet score logs need pandas and pyarrow installed")
+
+        try:
+            os.makedirs(log_dir, exist_ok=True)
+        except Exception as e:
+            raise CustomException(f"SCORE_LOG_ERROR: {str(e)}", sys)
+
+        self.log_dir = log_dir
+        self.flush_every = flush_every
+        self.file_format = file_format
+        self.flush_interval_seconds = flush_interval_seconds
+        self._rows: List[Tuple] = []
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+        # Background flusher: woken early when flush_every rows are buffered
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._flusher = threading.Thread(target=self._run, name="score-log-flusher", daemon=True)
+        self._flusher.start()
+
+        # Metrics
+        self.rows_written = 0
+        self.files_written = 0
+
+    def record(
+        self,
+        submission_id: str,
+        mode: str,
+        ai_result: Optional[DetectionResult],
+        plag_result: Optional[PlagiarismResult],
+        action: str,
+        label: int = -1,
+    ):
+        row = (
+            submission_id,
+            mode,
+            time.time(),
+            ai_result.perplexity if ai_result else np.nan,
+            ai_result.ast_score if ai_result else np.nan,
+            ai_result.style_score if ai_result else np.nan,
+            ai_result.confidence if ai_result else 0.0,
+            ai_result.risk_level if ai_result else "",
+            plag_result.confidence if plag_result else 0.0,
+            plag_result.max_similarity_light if plag_result else 0.0,
+            plag_result.max_similarity_medium if plag_result else 0.0,
+            plag_result.max_similarity_aggressive if plag_result else 0.0,
+            plag_result.structural_similarity if plag_result else 0.0,
+            action,
+            label,
+        )
+        with self._lock:
+            self._rows.append(row)
+            should_flush = len(self._rows) >= self.flush_every
+        if should_flush:
+            self._wake.set()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait(timeout=self.flush_interval_seconds)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        """Write buffered rows now (blocking; the background thread calls this)."""
+        with self._lock:
+            rows, self._rows = self._rows, []
+        if not rows:
+            return
+
+        columns = {
+            name: np.array([row[i] for row in rows], dtype=dtype)
+            for i, (name, dtype) in enumerate(SCORE_COLUMNS.items())
+        }
+        path = os.path.join(self.log_dir, f"scores-{time.time_ns()}.{self.file_format}")
+
+        try:
+            with self._write_lock:
+                if self.file_format == "parquet":
+                    import pandas as pd
+                    pd.DataFrame(columns).to_parquet(path, index=False)
+                else:
+                    np.savez_compressed(path, **columns)
+
+                self.rows_written += len(rows)
+                self.files_written += 1
+            logging.info("Score log flushed", extra={"path": path, "rows": len(rows)})
+
+        except Exception as e:
+            # Score logging must never fail a request
+            logging.warning(f"Score log flush failed: {e}")
+
+    def close(self, timeout: Optional[float] = 5.0):
+        """Stop the background thread and write what is left."""
+        self._stopped.set()
+        self._wake.set()
+        self._flusher.join(timeout=timeout)
+        self.flush()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get score log metrics."""
+        return {
+            "log_dir": self.log_dir,
+            "rows_written": self.rows_written,
+            "files_written": self.files_written,
+            "rows_buffered": len(self._rows),
+        }
+
+
+def load_scores(path: str) -> Dict[str, np.ndarray]:
+    """Load one score file or every chunk in a directory, concatenated column-wise."""
+    if os.path.isdir(path):
+        files = sorted(
+            os.path.join(path, name) for name in os.listdir(path)
+            if name.endswith((".npz", ".parquet"))
+        )
+    else:
+        files = [path]
+    if not files:
+        raise ValueError(f"No score files found at {path}")
+
+    chunks: List[Dict[str, np.ndarray]] = []
+    for file in files:
+        if file.endswith(".parquet"):
+            import pandas as pd
+            frame = pd.read_parquet(file)
+            chunks.append({name: frame[name].to_numpy() for name in SCORE_COLUMNS})
+        else:
+            with np.load(file) as data:
+                chunks.append({name: data[name] for name in SCORE_COLUMNS})
+
+    return {
+        name: np.concatenate([chunk[name] for chunk in chunks]).astype(dtype)
+        for name, dtype in SCORE_COLUMNS.items()
+    }
+
+
+def attach_labels(scores: Dict[str, np.ndarray], labels: Dict[str, int]) -> Dict[str, np.ndarray]:
+    """Copy of `scores` with `label` filled from a submission_id -> 0/1 map."""
+    merged = dict(scores)
+    merged["label"] = np.array(
+        [labels.get(sid, label) for sid, label in zip(scores["submission_id"], scores["label"])],
+        dtype=np.int8,
+    )
+    return merged
+
+
+def replay_ai_scores(scores: Dict[str, np.ndarray], config: AIDetectorConfig) -> Dict[str, np.ndarray]:
+    """
+    Vectorized re-scoring of stored components under `config`.
+
+    Mirrors AICodeDetector._perplexity_to_score and the weighting / risk
+    tiers of _build_result. Rows without an AI result (NaN perplexity)
+    keep confidence 0 and risk "".
+    """
+    perplexity = scores["perplexity"]
+    missing = np.isnan(perplexity)
+
+    span = config.perplexity_human_threshold - config.perplexity_ai_threshold
+    perplexity_score = np.clip(
+        np.select(
+            [perplexity < config.perplexity_ai_threshold, perplexity > config.perplexity_human_threshold],
+            [1.0, 0.0],
+            default=1.0 - (perplexity - config.perplexity_ai_threshold) / span,
+        ),
+        0.0, 1.0,
+    )
+
+    weighted_score = (
+        config.weight_perplexity * perplexity_score +
+        config.weight_ast * scores["ast_score"] +
+        config.weight_style * scores["style_score"]
+    )
+    tier = np.select(
+        [
+            weighted_score >= config.high_confidence_threshold,
+            weighted_score >= config.medium_confidence_threshold,
+            weighted_score >= config.low_confidence_threshold,
+        ],
+        [3, 2, 1],
+        default=0,
+    )
+
+    return {
+        "perplexity_score": np.where(missing, 0.0, perplexity_score),
+        "weighted_score": np.where(missing, 0.0, weighted_score),
+        "risk_level": np.where(missing, "", np.array(AI_RISK_LEVELS)[tier]),
+        "is_ai_generated": ~missing & (tier >= 2),
+    }
+
+
+def _transitions(before: np.ndarray, after: np.ndarray) -> Dict[str, int]:
+    changed = before != after
+    return {
+        f"{old} -> {new}": count
+        for (old, new), count in sorted(Counter(zip(before[changed].tolist(), after[changed].tolist())).items())
+    }
+
+
+def _confusion(predicted: np.ndarray, labels: np.ndarray) -> Dict[str, int]:
+    known = labels >= 0
+    predicted, truth = predicted[known], labels[known] == 1
+    return {
+        "tp": int(np.sum(predicted & truth)),
+        "fp": int(np.sum(predicted & ~truth)),
+        "tn": int(np.sum(~predicted & ~truth)),
+        "fn": int(np.sum(~predicted & truth)),
+    }
+
+
+@dataclass
+class ReplayReport:
+    """Baseline vs candidate outcome over the same stored scores."""
+    num_rows: int
+    num_labeled: int
+    risk_counts: Dict[str, Dict[str, int]]
+    action_counts: Dict[str, Dict[str, int]]
+    risk_transitions: Dict[str, int]
+    action_transitions: Dict[str, int]
+    confusion: Dict[str, Dict[str, int]] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {f.name: getattr(self, f.name) for f in fields(self)}
+
+
+def replay(
+    scores: Dict[str, np.ndarray],
+    candidate_ai: AIDetectorConfig,
+    candidate_decision: Optional[DecisionConfig] = None,
+    baseline_ai: Optional[AIDetectorConfig] = None,
+    baseline_decision: Optional[DecisionConfig] = None,
+) -> ReplayReport:
+    """
+    Re-decide stored submissions under a candidate config.
+
+    Both sides are recomputed from the same stored (rounded) components, so
+    differences come only from the configs. Plagiarism confidences are used
+    as stored; only DecisionConfig thresholds apply to them. The AI
+    baseline defaults to the deployed config (AIDetectorConfig.from_env()).
+    """
+    baseline_ai = baseline_ai or AIDetectorConfig.from_env()
+    baseline_engine = DecisionEngine(baseline_decision or DecisionConfig())
+    candidate_engine = DecisionEngine(candidate_decision or DecisionConfig())
+
+    outcomes = {}
+    for side, ai_config, engine in (
+        ("baseline", baseline_ai, baseline_engine),
+        ("candidate", candidate_ai, candidate_engine),
+    ):
+        ai = replay_ai_scores(scores, ai_config)
+        decisions = engine.decide_batch(ai["weighted_score"], scores["plag_confidence"], scores["mode"])
+        outcomes[side] = (ai, decisions)
+
+    (base_ai, base_dec), (cand_ai, cand_dec) = outcomes["baseline"], outcomes["candidate"]
+    labels = scores["label"]
+
+    report = ReplayReport(
+        num_rows=len(labels),
+        num_labeled=int(np.sum(labels >= 0)),
+        risk_counts={
+            "baseline": dict(Counter(base_ai["risk_level"].tolist())),
+            "candidate": dict(Counter(cand_ai["risk_level"].tolist())),
+        },
+        action_counts={
+            "baseline": dict(Counter(base_dec.action.tolist())),
+            "candidate": dict(Counter(cand_dec.action.tolist())),
+        },
+        risk_transitions=_transitions(base_ai["risk_level"], cand_ai["risk_level"]),
+        action_transitions=_transitions(base_dec.action, cand_dec.action),
+    )
+
+    if report.num_labeled:
+        baseline = _confusion(base_ai["is_ai_generated"], labels)
+        candidate = _confusion(cand_ai["is_ai_generated"], labels)
+        report.confusion = {
+            "baseline": baseline,
+            "candidate": candidate,
+            "delta": {key: candidate[key] - baseline[key] for key in baseline},
+        }
+
+    logging.info(
+        "Score replay complete",
+        extra={"rows": report.num_rows, "changed_actions": sum(report.action_transitions.values())}
+    )
+
+    return report
+
+
+def _parse_override(name: str, annotation: Any, value: str) -> Any:
+    """Convert a CLI string to a field's annotated type; Optional fields also accept "none"."""
+    args = get_args(annotation)
+    if type(None) in args:
+        if value.lower() in ("none", "null", ""):
+            return None
+        annotation = next(arg for arg in args if arg is not type(None))
+
+    if annotation is bool:
+        return value.lower() == "true"
+    if get_origin(annotation) is not None or not callable(annotation):
+        raise ValueError(f"Config field {name} ({annotation}) cannot be overridden from the command line")
+    return annotation(value)
+
+
+def _apply_overrides(config, overrides: List[str]):
+    """Apply `name=value` overrides, converting to each field's annotated type."""
+    hints = get_type_hints(type(config))
+    changes = {}
+    for item in overrides:
+        name, _, value = item.partition("=")
+        if name not in hints:
+            raise ValueError(f"Unknown config field: {name}")
+        changes[name] = _parse_override(name, hints[name], value)
+    updated = replace(config, **changes)
+    updated.validate()
+    return updated
+
+
+def _load_label_csv(path: str) -> Dict[str, int]:
+    with open(path, newline="") as f:
+        return {row["submission_id"]: int(row["label"]) for row in csv.DictReader(f)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay stored detection scores under new thresholds.")
+    parser.add_argument("scores", help="Score file or directory of score chunks")
+    parser.add_argument("--ai", nargs="*", default=[], help="AIDetectorConfig overrides, e.g. weight_ast=0.3")
+    parser.add_argument("--decision", nargs="*", default=[], help="DecisionConfig overrides")
+    parser.add_argument("--labels", help="CSV with submission_id,label (1 = AI, 0 = human)")
+    args = parser.parse_args()
+
+    try:
+        scores = load_scores(args.scores)
+        if args.labels:
+            scores = attach_labels(scores, _load_label_csv(args.labels))
+
+        report = replay(
+            scores,
+            candidate_ai=_apply_overrides(AIDetectorConfig.from_env(), args.ai),
+            candidate_decision=_apply_overrides(DecisionConfig(), args.decision),
+        )
+        print(json.dumps(report.to_dict(), indent=2))
+
+    except Exception as e:
+        raise CustomException(f"SCORE_REPLAY_ERROR: {str(e)}", sys)
@@ -0,0 +1,168 @@
+from __future__ import annotations
+from typing import List, Tuple
+
+import numpy as np
+
+
+# Columns of the style feature matrix (unrounded values)
+STYLE_FEATURE_COLUMNS = (
+    "comment_ratio",
+    "avg_var_length",
+    "indent_variance",
+    "has_docstrings",
+    "avg_line_length",
+    "num_lines",
+    "line_length_std",
+)
+
+# Identifiers excluded from the naming statistics
+EXCLUDED_NAMES = ("if", "for", "while", "def", "class", "return", "import")
+
+# Lookup tables indexed by code point; anything past the table is clipped onto
+# its last (False) entry. Every str.isspace() code point is <= U+3000.
+_WHITESPACE_TABLE = np.array([chr(c).isspace() for c in range(0x3001)] + [False])
+_NAME_TABLE = np.array([ch.islower() or ch.isdigit() or ch == "_" for ch in map(chr, range(128))] + [False])
+_ASCII_WORD_TABLE = np.array([ch.isalnum() or ch == "_" for ch in map(chr, range(128))] + [False])
+
+_NEWLINE = ord("\n")
+_HASH = ord("#")
+_UNDERSCORE = ord("_")
+
+_KEYWORD_WIDTH = max(len(name) for name in EXCLUDED_NAMES)
+_KEYWORDS = np.zeros((len(EXCLUDED_NAMES), _KEYWORD_WIDTH), dtype=np.uint32)
+for _row, _name in enumerate(EXCLUDED_NAMES):
+    _KEYWORDS[_row, :len(_name)] = [ord(ch) for ch in _name]
+_KEYWORD_LENGTHS = np.array([len(name) for name in EXCLUDED_NAMES])
+
+
+def _segment_sum(values: np.ndarray, segments: np.ndarray, num_segments: int) -> np.ndarray:
+    return np.bincount(segments, weights=values, minlength=num_segments)
+
+
+def _segment_mean_var(
+    values: np.ndarray,
+    segments: np.ndarray,
+    num_segments: int,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Per-segment (count, mean, population variance); empty segments give 0."""
+    counts = np.bincount(segments, minlength=num_segments).astype(np.float64)
+    safe = np.maximum(counts, 1.0)
+    means = _segment_sum(values.astype(np.float64), segments, num_segments) / safe
+    deviations = values - means[segments]
+    variances = _segment_sum(deviations * deviations, segments, num_segments) / safe
+    return counts, means, variances
+
+
+def _lookup(table: np.ndarray, buffer: np.ndarray) -> np.ndarray:
+    return table[np.minimum(buffer, len(table) - 1)]
+
+
+def _word_mask(buffer: np.ndarray) -> np.ndarray:
+    """Python `re` \\w for str patterns: alphanumeric or underscore."""
+    word = _lookup(_ASCII_WORD_TABLE, buffer)
+    non_ascii = np.unique(buffer[buffer >= 128])
+    if non_ascii.size:
+        alnum = non_ascii[[chr(c).isalnum() for c in non_ascii]]
+        word |= np.isin(buffer, alnum)
+    return word
+
+
+def style_feature_matrix(codes: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Style features for N submissions in one vectorized pass.
+
+    The codes are joined into one code-point buffer; per-line and
+    per-identifier statistics are computed with NumPy segment reductions
+    over offset arrays instead of per-line Python loops.
+
+    Returns (features, valid): a float64 matrix of shape
+    (N, len(STYLE_FEATURE_COLUMNS)) and a bool mask that is False for
+    empty or whitespace-only inputs (their rows are zero).
+    """
+    num_docs = len(codes)
+    features = np.zeros((num_docs, len(STYLE_FEATURE_COLUMNS)), dtype=np.float64)
+    valid = np.array([bool(code) and bool(code.strip()) for code in codes], dtype=bool)
+    if num_docs == 0 or not valid.any():
+        return features, valid
+
+    # One buffer; the "\n" separator keeps line and word boundaries per document
+    text = "\n".join(codes)
+    buffer = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+    doc_starts = np.cumsum([0] + [len(code) + 1 for code in codes[:-1]])
+
+    # ---- Lines -------------------------------------------------------------
+    newlines = np.flatnonzero(buffer == _NEWLINE)
+    line_starts = np.concatenate(([0], newlines + 1))
+    line_ends = np.concatenate((newlines, [len(buffer)]))
+    line_docs = np.repeat(np.arange(num_docs), [code.count("\n") + 1 for code in codes])
+
+    # First non-whitespace position of each line (== line.lstrip() start)
+    non_ws = np.flatnonzero(~_lookup(_WHITESPACE_TABLE, buffer))
+    first_idx = np.searchsorted(non_ws, line_starts)
+    first_pos = non_ws[np.minimum(first_idx, max(len(non_ws) - 1, 0))] if len(non_ws) else line_ends
+    has_content = (first_idx < len(non_ws)) & (first_pos < line_ends)
+
+    is_comment = has_content & (buffer[np.where(has_content, first_pos, 0)] == _HASH)
+    is_code = has_content & ~is_comment
+
+    content_docs = line_docs[has_content]
+    line_lengths = (line_ends - line_starts)[has_content]
+    num_lines, avg_line_length, line_length_var = _segment_mean_var(line_lengths, content_docs, num_docs)
+    comment_lines = np.bincount(line_docs[is_comment], minlength=num_docs)
+
+    indents = (first_pos - line_starts)[is_code]
+    indent_counts, _, indent_var = _segment_mean_var(indents, line_docs[is_code], num_docs)
+
+    # ---- Identifiers: maximal \w runs made only of [a-z0-9_], not starting with a digit
+    word = _word_mask(buffer)
+    prev_word = np.concatenate(([False], word[:-1]))
+    next_word = np.concatenate((word[1:], [False]))
+    run_starts = np.flatnonzero(word & ~prev_word)
+    run_ends = np.flatnonzero(word & ~next_word) + 1
+
+    allowed = _lookup(_NAME_TABLE, buffer)
+    disallowed_before = np.concatenate(([0], np.cumsum(~allowed)))
+    run_lengths = run_ends - run_starts
+    first_chars = buffer[run_starts]
+    is_name = (
+        (disallowed_before[run_ends] - disallowed_before[run_starts] == 0)
+        & ~((first_chars >= ord("0")) & (first_chars <= ord("9")))
+    )
+
+    # Drop dunder-prefixed names
+    second_chars = buffer[np.minimum(run_starts + 1, len(buffer) - 1)]
+    is_name &= ~((first_chars == _UNDERSCORE) & (second_chars == _UNDERSCORE) & (run_lengths >= 2))
+
+    # Drop the excluded keywords (fixed-width code point comparison)
+    window = run_starts[:, None] + np.arange(_KEYWORD_WIDTH)[None, :]
+    in_run = np.arange(_KEYWORD_WIDTH)[None, :] < run_lengths[:, None]
+    padded = np.where(in_run, buffer[np.minimum(window, len(buffer) - 1)], 0)
+    is_keyword = (
+        (padded[:, None, :] == _KEYWORDS[None, :, :]).all(axis=2)
+        & (run_lengths[:, None] == _KEYWORD_LENGTHS[None, :])
+    ).any(axis=1)
+    is_name &= ~is_keyword
+
+    name_docs = np.searchsorted(doc_starts, run_starts[is_name], side="right") - 1
+    name_counts = np.bincount(name_docs, minlength=num_docs).astype(np.float64)
+    name_lengths = _segment_sum(run_lengths[is_name].astype(np.float64), name_docs, num_docs)
+    avg_var_length = np.divide(name_lengths, name_counts, out=np.zeros(num_docs), where=name_counts > 0)
+
+    # ---- Docstrings: any ''' or """ run
+    triple_double = np.flatnonzero((buffer[:-2] == ord('"')) & (buffer[1:-1] == ord('"')) & (buffer[2:] == ord('"')))
+    triple_single = np.flatnonzero((buffer[:-2] == ord("'")) & (buffer[1:-1] == ord("'")) & (buffer[2:] == ord("'")))
+    docstring_docs = np.searchsorted(doc_starts, np.concatenate((triple_double, triple_single)), side="right") - 1
+    has_docstrings = np.bincount(docstring_docs, minlength=num_docs) > 0
+
+    comment_ratio = np.divide(comment_lines, num_lines, out=np.zeros(num_docs), where=num_lines > 0)
+
+    features[:, 0] = comment_ratio
+    features[:, 1] = avg_var_length
+    features[:, 2] = np.where(indent_counts > 1, indent_var, 0.0)
+    features[:, 3] = has_docstrings
+    features[:, 4] = avg_line_length
+    features[:, 5] = num_lines
+    features[:, 6] = np.sqrt(line_length_var)
+    features[~valid] = 0.0
+
+    return features, valid
@@ -0,0 +1,138 @@
+from __future__ import annotations
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any
+
+import numpy as np
+from transformers import PreTrainedTokenizerBase
+
+from src.logger import logging
+
+
+def encode_batch(
+    tokenizer: PreTrainedTokenizerBase,
+    codes: List[str],
+    max_length: int,
+) -> List[np.ndarray]:
+    """
+    Tokenize many codes in one call into read-only int32 id arrays.
+
+    With a fast tokenizer the batch is encoded in Rust across threads;
+    no tensors are built here, batches are assembled later by pad_batch.
+    """
+    encoded = tokenizer(
+        codes,
+        truncation=True,
+        max_length=max_length,
+        padding=False,
+        add_special_tokens=True,
+        return_attention_mask=False,
+    )["input_ids"]
+
+    arrays = []
+    for ids in encoded:
+        array = np.asarray(ids, dtype=np.int32)
+        array.flags.writeable = False
+        arrays.append(array)
+    return arrays
+
+
+class TokenCache:
+    """
+    Thread-safe LRU of normalized_hash -> token ids.
+
+    Ids are stored as read-only int32 arrays (half the size of Python int
+    lists, and copied straight into padded int64 batches by pad_batch).
+    One cache belongs to one detector, so the tokenizer and truncation
+    length are fixed and not part of the key.
+    """
+
+    def __init__(self, max_size: int = 2048):
+        if max_size < 1:
+            raise ValueError(f"max_size must be >= 1, got {max_size}")
+
+        self.max_size = max_size
+        self._store: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Metrics
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.tokenizer_calls = 0
+
+    def get_many(self, normalized_hashes: List[str]) -> Dict[str, np.ndarray]:
+        """Cached ids for the given hashes; missing hashes are absent from the result."""
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            for key in normalized_hashes:
+                ids = self._store.get(key)
+                if ids is None:
+                    self.misses += 1
+                    continue
+                self._store.move_to_end(key)
+                self.hits += 1
+                found[key] = ids
+        return found
+
+    def put_many(self, entries: Dict[str, np.ndarray]):
+        with self._lock:
+            for key, ids in entries.items():
+                if key in self._store:
+                    self._store.move_to_end(key)
+                self._store[key] = ids
+
+            while len(self._store) > self.max_size:
+                self._store.popitem(last=False)
+                self.evictions += 1
+
+    def encode(
+        self,
+        tokenizer: PreTrainedTokenizerBase,
+        codes: List[str],
+        normalized_hashes: List[str],
+        max_length: int,
+    ) -> List[np.ndarray]:
+        """Token ids for `codes`, tokenizing only the cache misses in one encode_batch call."""
+        found = self.get_many(normalized_hashes)
+
+        # Distinct misses only (a batch may repeat a submission)
+        missing = {key: code for code, key in zip(codes, normalized_hashes) if key not in found}
+        if missing:
+            computed = dict(zip(missing, encode_batch(tokenizer, list(missing.values()), max_length)))
+            self.tokenizer_calls += 1
+            self.put_many(computed)
+            found.update(computed)
+
+        return [found[key] for key in normalized_hashes]
+
+    def clear(self):
+        with self._lock:
+            self._store.clear()
+        logging.info("Token cache cleared")
+
+    def __len__(self) -> int:
+        return len(self._store)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get cache metrics."""
+        lookups = self.hits + self.misses
+        with self._lock:
+            stored_tokens = sum(len(ids) for ids in self._store.values())
+        return {
+            "size": len(self._store),
+            "max_size": self.max_size,
+            "stored_tokens": stored_tokens,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "tokenizer_calls": self.tokenizer_calls,
+            "hit_rate": round(self.hits / lookups, 3) if lookups > 0 else 0.0,
+        }
+
+    def reset_metrics(self):
+        """Reset metrics counters."""
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.tokenizer_calls = 0
@@ -0,0 +1,135 @@
+from __future__ import annotations
+import re
+import base64
+from dataclasses import dataclass, replace
+from typing import Optional, List, Dict, Any, Sequence, Tuple
+
+import numpy as np
+
+
+@dataclass
+class TokenSurprisal:
+    """
+    Per-token surprisal (-log p, nats) of the scored (light-normalized) code.
+
+    `values` has one float16 entry per token, NaN where the model made no
+    prediction (the first token, or tokens past the scored budget).
+    `line_ids` maps each token to the 0-based entry of `lines` its first
+    character falls on (-1 when offsets were unavailable or the line has
+    no counterpart). `lines` are the scored code's lines until
+    map_to_source() points them at the submission (`normalized` False).
+    """
+    values: np.ndarray
+    line_ids: np.ndarray
+    lines: List[str]
+    normalized: bool = True
+
+    def map_to_source(self, source: str) -> TokenSurprisal:
+        """Copy whose line ids and texts refer to the lines of the original submission."""
+        source_lines = source.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+        line_map = align_lines(self.lines, source_lines)
+
+        line_ids = np.full(len(self.line_ids), -1, dtype=np.int32)
+        known = self.line_ids >= 0
+        line_ids[known] = line_map[self.line_ids[known]]
+        return replace(self, line_ids=line_ids, lines=source_lines, normalized=False)
+
+    def line_summary(self) -> List[Dict[str, Any]]:
+        """Mean / max surprisal per scored line with at least one predicted token."""
+        scored = ~np.isnan(self.values) & (self.line_ids >= 0)
+        if not scored.any():
+            return []
+
+        line_ids = self.line_ids[scored]
+        values = self.values[scored].astype(np.float64)
+        counts = np.bincount(line_ids, minlength=len(self.lines))
+        sums = np.bincount(line_ids, weights=values, minlength=len(self.lines))
+        maxima = np.full(len(self.lines), -np.inf)
+        np.maximum.at(maxima, line_ids, values)
+
+        return [
+            {
+                "line": int(line) + 1,
+                "text": self.lines[line],
+                "num_tokens": int(counts[line]),
+                "mean_surprisal": round(float(sums[line] / counts[line]), 3),
+                "max_surprisal": round(float(maxima[line]), 3),
+            }
+            for line in np.flatnonzero(counts)
+        ]
+
+    def most_predictable_lines(self, top_k: int = 5, min_tokens: int = 3) -> List[Dict[str, Any]]:
+        """Lines with the lowest mean surprisal (the most AI-like evidence)."""
+        lines = [line for line in self.line_summary() if line["num_tokens"] >= min_tokens]
+        return sorted(lines, key=lambda line: line["mean_surprisal"])[:top_k]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Compact JSON form: float16 values as little-endian base64, plus per-line stats."""
+        return {
+            "encoding": "float16-le-base64",
+            "num_tokens": int(len(self.values)),
+            "values": base64.b64encode(self.values.astype("<f2").tobytes()).decode("ascii"),
+            "line_numbers": "normalized" if self.normalized else "submission",
+            "lines": self.line_summary(),
+        }
+
+    @staticmethod
+    def decode_values(encoded: str) -> np.ndarray:
+        return np.frombuffer(base64.b64decode(encoded), dtype="<f2")
+
+
+def align_lines(normalized_lines: List[str], source_lines: List[str]) -> np.ndarray:
+    """
+    0-based source line of each light-normalized line (-1 for blank / unmatched).
+
+    Light normalization keeps every code line in order, so lines are matched
+    forward against the source with comments and docstrings removed the same
+    way; docstrings are blanked rather than removed, keeping source line
+    numbers. Its final strip() drops leading blank lines and the first line's
+    indentation, so the first normalized line is compared unindented.
+    """
+    source = re.sub(r"#.*$", "", "\n".join(source_lines), flags=re.MULTILINE)
+    for docstring in (r'"""[\s\S]*?"""', r"'''[\s\S]*?'''"):
+        source = re.sub(docstring, lambda match: "\n" * match.group().count("\n"), source)
+    stripped = [line.rstrip() for line in source.split("\n")]
+    line_map = np.full(len(normalized_lines), -1, dtype=np.int32)
+
+    position = 0
+    for index, line in enumerate(normalized_lines):
+        if not line.strip():
+            continue
+        for candidate in range(position, len(stripped)):
+            text = stripped[candidate].lstrip() if index == 0 else stripped[candidate]
+            if text == line:
+                line_map[index] = candidate
+                position = candidate + 1
+                break
+
+    return line_map
+
+
+def build_token_surprisal(
+    code: str,
+    token_losses: np.ndarray,
+    offsets: Optional[Sequence[Tuple[int, int]]] = None,
+) -> TokenSurprisal:
+    """
+    Attach per-token losses to the lines of `code`.
+
+    `offsets` are the tokenizer's (start, end) character spans (fast
+    tokenizers only); without them only the raw values are kept.
+    """
+    lines = code.split("\n")
+
+    if offsets is not None and len(offsets) == len(token_losses):
+        newlines = np.flatnonzero(np.frombuffer(code.encode("utf-32-le"), dtype=np.uint32) == ord("\n"))
+        starts = np.array([start for start, _ in offsets], dtype=np.int64)
+        line_ids = np.searchsorted(newlines, starts, side="left").astype(np.int32)
+    else:
+        line_ids = np.full(len(token_losses), -1, dtype=np.int32)
+
+    return TokenSurprisal(
+        values=np.asarray(token_losses, dtype=np.float16),
+        line_ids=line_ids,
+        lines=lines,
+    )